@@ -1,27 +1,42 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from pymongo.database import Database
 
-from ..database import get_db
+from ..storage import Repository, get_repository
 from .security import decode_access_token, verify_password
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
-def get_user_by_username(db: Database, username: str) -> dict | None:
-    return db["users"].find_one({"username": username})
+def get_user_by_username(repo: Repository, username: str) -> dict | None:
+    return repo.get_user_by_username(username)
 
 
-def authenticate_user(db: Database, username: str, password: str) -> dict | None:
-    user = get_user_by_username(db, username)
+def authenticate_user(repo: Repository, username: str, password: str) -> dict | None:
+    user = get_user_by_username(repo, username)
     if not user or not verify_password(password, user.get("hashed_password", "")):
         return None
     return user
 
 
+def user_from_token(repo: Repository, token: str) -> dict | None:
+    """
+    Active teacher or admin behind a bearer token, for connections that
+    cannot go through the OAuth2 header (WebSockets). None otherwise.
+    """
+    token_data = decode_access_token(token)
+    if token_data is None or token_data.username is None:
+        return None
+    user = get_user_by_username(repo, token_data.username)
+    if user is None or not user.get("is_active", True):
+        return None
+    if user.get("role") not in ["teacher", "admin"]:
+        return None
+    return user
+
+
 def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Database = Depends(get_db)
+    token: str = Depends(oauth2_scheme), repo: Repository = Depends(get_repository)
 ) -> dict:
     token_data = decode_access_token(token)
     if token_data is None or token_data.username is None:
@@ -30,7 +45,7 @@ def get_current_user(
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = get_user_by_username(db, token_data.username)
+    user = get_user_by_username(repo, token_data.username)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
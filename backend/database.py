@@ -1,5 +1,10 @@
+import logging
 import os
-from pymongo import MongoClient
+import threading
+
+from pymongo import MongoClient, monitoring
+
+from . import metrics
 
 # Default directly to your Atlas connection string and DB name.
 # You can still override via environment variables if needed.
@@ -9,17 +14,112 @@ MONGO_URL = os.getenv(
 )
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "marksdb")
 
+# Connection pool and timeout settings, all overridable per deployment.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+# Driver debug output is replaced by the command metrics below.
+logging.getLogger("pymongo").setLevel(logging.WARNING)
+
 _client: MongoClient | None = None
+_client_pid: int | None = None
+_client_lock = threading.Lock()
+
+
+class CommandLatencyListener(monitoring.CommandListener):
+    """
+    Feeds the duration of every database command into the
+    db_command_ms histogram, labelled by collection and command.
+    """
+
+    def __init__(self):
+        self._collections: dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        key = (event.request_id, event.connection_id)
+        self._collections[key] = target if isinstance(target, str) else "-"
+
+    def _record(self, event, outcome: str):
+        collection = self._collections.pop((event.request_id, event.connection_id), "-")
+        metrics.observe(
+            "db_command_ms",
+            event.duration_micros / 1000,
+            {"collection": collection, "command": event.command_name, "outcome": outcome},
+        )
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+
+def _create_client() -> MongoClient:
+    return MongoClient(
+        MONGO_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[CommandLatencyListener()],
+    )
 
 
 def get_mongo_client() -> MongoClient:
-    global _client
-    if _client is None:
-        _client = MongoClient(MONGO_URL)
+    """
+    The client of the current process. A client must not be shared across
+    fork(), so uvicorn/gunicorn workers each build their own on first use.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = _create_client()
+                _client_pid = pid
     return _client
 
 
+def _forget_client_after_fork():
+    # The parent's client (and its sockets) stays with the parent.
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client_after_fork)
+
+
 def get_db():
     client = get_mongo_client()
     return client[MONGO_DB_NAME]
 
+
+_declarative_base = None
+
+
+def __getattr__(name):
+    # Declarative base of the SQLAlchemy models in backend/models, used by
+    # the SQLite storage backend. Built on first access so that Mongo-only
+    # deployments never pay for importing SQLAlchemy.
+    global _declarative_base
+    if name == "Base":
+        if _declarative_base is None:
+            from sqlalchemy.orm import declarative_base
+
+            _declarative_base = declarative_base()
+        return _declarative_base
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,12 +1,30 @@
-from fastapi import FastAPI
+import logging
+import os
+import threading
+import time
+
+import pymongo
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from .routes import auth as auth_routes
 from .routes import admin as admin_routes
 from .routes import teacher as teacher_routes
-from .database import get_mongo_client, MONGO_DB_NAME
+from .routes import analytics as analytics_routes
+from . import metrics
+from .ocr import pool as ocr_pool
+from .auth.dependencies import require_admin
 from .auth.security import get_password_hash
+from .storage import get_repository
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for the database work done in the background at startup.
+BOOTSTRAP_TIMEOUT_SECONDS = float(os.getenv("BOOTSTRAP_TIMEOUT_SECONDS", "20"))
 
+# Filled in by the bootstrap thread, reported by /api/ready.
+_bootstrap_state: dict = {"done": False, "error": None, "duration_ms": None}
 
 app = FastAPI(title="Marks OCR System")
 
@@ -16,20 +34,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Reason code of a scan turned away by the quality check
+    expose_headers=["X-Scan-Reject-Reason", "ETag"],
 )
 
 
-@app.on_event("startup")
-def ensure_default_admin_user():
+def ensure_default_admin_user(repo):
     """
     Ensure there is at least one admin user for initial login.
     Username: abhigyan
     Password: Abhigyan@001
     """
-    client = get_mongo_client()
-    db = client[MONGO_DB_NAME]
     username = "abhigyan"
-    existing = db["users"].find_one({"username": username})
+    existing = repo.get_user_by_username(username)
     if existing:
         return
     doc = {
@@ -40,7 +57,43 @@ def ensure_default_admin_user():
         "hashed_password": get_password_hash("Abhigyan@001"),
         "is_active": True,
     }
-    db["users"].insert_one(doc)
+    repo.create_user(doc)
+
+
+def _bootstrap_database():
+    start = time.perf_counter()
+    try:
+        # pymongo.timeout bounds server selection and every operation inside
+        # it, so a slow or unreachable cluster can't keep this thread forever.
+        with pymongo.timeout(BOOTSTRAP_TIMEOUT_SECONDS):
+            repo = get_repository()
+            repo.ensure_schema()
+            ensure_default_admin_user(repo)
+        _bootstrap_state["done"] = True
+        _bootstrap_state["error"] = None
+    except Exception as e:
+        logger.error(f"Database bootstrap failed: {e}")
+        _bootstrap_state["error"] = str(e)
+    finally:
+        _bootstrap_state["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+@app.on_event("startup")
+def start_database_bootstrap():
+    # Run in the background so the server accepts requests right away,
+    # even when Atlas is slow to answer.
+    threading.Thread(target=_bootstrap_database, name="db-bootstrap", daemon=True).start()
+
+
+@app.on_event("startup")
+def start_ocr_workers():
+    if ocr_pool.OCR_PREWARM:
+        ocr_pool.warm_up()
+
+
+@app.on_event("shutdown")
+def stop_ocr_workers():
+    ocr_pool.shutdown()
 
 
 @app.get("/api/health")
@@ -48,7 +101,36 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/api/metrics")
+def metrics_report(_: dict = Depends(require_admin)):
+    """
+    In-process metrics of this worker: database command latency
+    histograms per collection and command, plus any counters. Admins
+    only, as they name collections and upload formats.
+    """
+    return {"pid": os.getpid(), **metrics.snapshot()}
+
+
+@app.get("/api/ready")
+def readiness_check():
+    """
+    Ready once the schema/indexes and the default admin are in place.
+    Unlike /api/health this depends on the database.
+    """
+    if _bootstrap_state["done"]:
+        return {"status": "ready", "bootstrap_ms": _bootstrap_state["duration_ms"]}
+    if _bootstrap_state["error"]:
+        status = "error"
+    else:
+        status = "starting"
+    return JSONResponse(
+        status_code=503,
+        content={"status": status, "detail": _bootstrap_state["error"]},
+    )
+
+
 app.include_router(auth_routes.router, prefix="/api/auth", tags=["auth"])
 app.include_router(admin_routes.router, prefix="/api/admin", tags=["admin"])
 app.include_router(teacher_routes.router, prefix="/api/teacher", tags=["teacher"])
+app.include_router(analytics_routes.router, prefix="/api/analytics", tags=["analytics"])
 
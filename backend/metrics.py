@@ -0,0 +1,77 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Upper bounds (milliseconds) of the latency histogram buckets.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_lock = threading.Lock()
+_histograms: dict[str, dict[tuple, dict]] = defaultdict(dict)
+_counters: dict[str, dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+
+
+def _key(labels: dict | None) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+
+def observe(name: str, value: float, labels: dict | None = None) -> None:
+    """
+    Record one observation (in milliseconds) in the named histogram.
+    """
+    key = _key(labels)
+    index = bisect_left(LATENCY_BUCKETS_MS, value)
+    with _lock:
+        series = _histograms[name].get(key)
+        if series is None:
+            series = {
+                "count": 0,
+                "sum": 0.0,
+                "max": 0.0,
+                "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+            _histograms[name][key] = series
+        series["count"] += 1
+        series["sum"] += value
+        series["max"] = max(series["max"], value)
+        series["buckets"][index] += 1
+
+
+def increment(name: str, labels: dict | None = None, amount: float = 1) -> None:
+    with _lock:
+        _counters[name][_key(labels)] += amount
+
+
+def snapshot() -> dict:
+    """
+    Copy of every metric, shaped for JSON output.
+    Histogram buckets are cumulative, keyed by their upper bound.
+    """
+    bounds = [str(b) for b in LATENCY_BUCKETS_MS] + ["+Inf"]
+    with _lock:
+        histograms = {
+            name: [
+                {
+                    "labels": dict(key),
+                    "count": s["count"],
+                    "sum": round(s["sum"], 3),
+                    "avg": round(s["sum"] / s["count"], 3) if s["count"] else 0.0,
+                    "max": round(s["max"], 3),
+                    "buckets": dict(
+                        zip(bounds, [sum(s["buckets"][: i + 1]) for i in range(len(bounds))])
+                    ),
+                }
+                for key, s in series.items()
+            ]
+            for name, series in _histograms.items()
+        }
+        counters = {
+            name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+            for name, series in _counters.items()
+        }
+    return {"histograms": histograms, "counters": counters}
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,56 @@
+import sys
+
+from .database import get_mongo_client, MONGO_DB_NAME
+from .services.marks import MARKS_INDEX_KEYS, ensure_marks_indexes
+
+
+def find_duplicate_groups(db) -> list[dict]:
+    """
+    Groups of marks documents that share (exam, student, question_label).
+    Each group lists its _ids oldest first.
+    """
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {
+            "$group": {
+                "_id": {key: f"${key}" for key, _ in MARKS_INDEX_KEYS},
+                "ids": {"$push": "$_id"},
+                "count": {"$sum": 1},
+            }
+        },
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    return list(db["marks"].aggregate(pipeline, allowDiskUse=True))
+
+
+def main():
+    """
+    One-off migration to the upsert-based marks store.
+    Removes duplicate (exam, student, question_label) documents left behind
+    by the old delete/insert write path, keeping the most recently inserted
+    one, then creates the unique compound index.
+
+    Usage: python -m backend.migrate_marks [--dry-run]
+    """
+    dry_run = "--dry-run" in sys.argv[1:]
+    client = get_mongo_client()
+    db = client[MONGO_DB_NAME]
+
+    groups = find_duplicate_groups(db)
+    stale_ids = [oid for group in groups for oid in group["ids"][:-1]]
+    print(f"Found {len(groups)} duplicated keys, {len(stale_ids)} stale documents.")
+
+    if dry_run:
+        print("Dry run, nothing changed.")
+        return
+
+    if stale_ids:
+        result = db["marks"].delete_many({"_id": {"$in": stale_ids}})
+        print(f"Deleted {result.deleted_count} stale documents.")
+
+    ensure_marks_indexes(db)
+    print("Unique marks index is in place.")
+
+
+if __name__ == "__main__":
+    main()
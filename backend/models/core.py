@@ -1,4 +1,16 @@
-from sqlalchemy import Column, Date, ForeignKey, Integer, String
+from sqlalchemy import (
+    JSON,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import relationship
 
 from ..database import Base
@@ -47,8 +59,62 @@ class Exam(Base):
     marks = relationship("Mark", back_populates="exam", cascade="all, delete-orphan")
 
 
+class SheetTemplate(Base):
+    __tablename__ = "sheet_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, nullable=False)
+    width = Column(Float, nullable=False)
+    height = Column(Float, nullable=False)
+    # Layout as stored by the Mongo backend: lists of cell / fiducial dicts
+    cells = Column(JSON, nullable=False)
+    fiducials = Column(JSON, nullable=False, default=list)
+    roll_number = Column(JSON, nullable=True)
+
+
+class Workbook(Base):
+    __tablename__ = "workbooks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner = Column(String(50), nullable=False)
+    content = Column(LargeBinary, nullable=False)
+    etag = Column(String(40), nullable=False)
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+
+class ScanFingerprint(Base):
+    __tablename__ = "scan_fingerprints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(100), nullable=False)
+    # Per-cell hashes (hex, None for empty cells) and the OCR result
+    cells = Column(JSON, nullable=False)
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+
+class ScanFingerprintKey(Base):
+    """One row per index key of a fingerprint (see services.scan_dedup)."""
+
+    __tablename__ = "scan_fingerprint_keys"
+    __table_args__ = (Index("ix_scan_fingerprint_keys_scope_key", "scope", "key"),)
+
+    id = Column(Integer, primary_key=True)
+    fingerprint_id = Column(
+        Integer, ForeignKey("scan_fingerprints.id", ondelete="CASCADE"), nullable=False
+    )
+    scope = Column(String(100), nullable=False)
+    key = Column(String(20), nullable=False)
+
+
 class Mark(Base):
     __tablename__ = "marks"
+    # Same key as the Mongo marks index; exam first so whole-exam reads use it
+    __table_args__ = (
+        UniqueConstraint(
+            "exam_id", "student_id", "question_label", name="uq_marks_exam_student_question"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
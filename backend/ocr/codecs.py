@@ -0,0 +1,89 @@
+import base64
+import io
+import os
+import time
+
+import cv2
+import numpy as np
+
+from .. import metrics
+
+# Capture formats the scanner should try, best first. Browsers fall back
+# to the next one when they cannot encode a format (e.g. WebP on Safari).
+CAPTURE_FORMATS = [
+    f.strip()
+    for f in os.getenv("SCAN_CAPTURE_FORMATS", "image/webp,image/jpeg,image/png").split(",")
+    if f.strip()
+]
+# Encoder quality (0-1) for the lossy formats
+CAPTURE_QUALITY = float(os.getenv("SCAN_CAPTURE_QUALITY", "0.85"))
+# Whether clients may send single-channel (grayscale) captures
+CAPTURE_GRAYSCALE = os.getenv("SCAN_CAPTURE_GRAYSCALE", "1") == "1"
+
+# Magic bytes -> format label used in metrics
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"BM", "bmp"),
+    (b"GIF8", "gif"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+
+
+def capture_settings() -> dict:
+    """What the server prefers to receive, as advertised to clients."""
+    return {
+        "formats": CAPTURE_FORMATS,
+        "quality": CAPTURE_QUALITY,
+        "grayscale": CAPTURE_GRAYSCALE,
+    }
+
+
+def sniff(data: bytes) -> str:
+    """Image format from the payload's first bytes, whatever the client claims."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    for signature, name in _SIGNATURES:
+        if data.startswith(signature):
+            return name
+    return "unknown"
+
+
+def payload_bytes(image_b64: str) -> bytes:
+    """Raw bytes of a base64 image, with or without a data URL header."""
+    header, _, data = image_b64.partition(",")
+    if data:
+        image_b64 = data
+    return base64.b64decode(image_b64)
+
+
+def decode(data: bytes, source: str = "scan") -> np.ndarray:
+    """
+    BGR frame of an encoded capture. cv2.imdecode reads straight from the
+    buffer (no PIL round trip). EXIF orientation is ignored, as it was
+    with PIL, so pixel coordinates match what Vision sees. Grayscale
+    captures come back as BGR too. Records the payload size and decode
+    time per format, so call it in the server process: metrics recorded
+    in an OCR worker never reach /api/metrics.
+    """
+    fmt = sniff(data)
+    start = time.perf_counter()
+    image = cv2.imdecode(
+        np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+    )
+    if image is None:
+        image = _decode_with_pil(data)
+    labels = {"source": source, "format": fmt}
+    metrics.observe("scan_decode_ms", (time.perf_counter() - start) * 1000, labels)
+    metrics.increment("scan_payloads_total", labels)
+    metrics.increment("scan_payload_bytes_total", labels, len(data))
+    return image
+
+
+def _decode_with_pil(data: bytes) -> np.ndarray:
+    # Formats OpenCV was built without; raises on data that is no image
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    return np.array(img)[:, :, ::-1].copy()  # RGB -> BGR
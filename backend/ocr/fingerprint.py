@@ -0,0 +1,165 @@
+import time
+from typing import List
+
+import cv2
+import numpy as np
+
+from .quality import small_gray
+from .regions import _lines, find_grid_regions
+from .registration import straighten
+from .shm import FrameHandle, attach_frame
+
+# Width of the grayscale copy of the grid the cells are hashed on
+FINGERPRINT_WIDTH = 768
+# Each cell is hashed on HASH_SIZE x HASH_SIZE gradients: 64 bits
+HASH_SIZE = 8
+# Share of a cell's size trimmed on each side, where the ruled lines run
+CELL_INSET = 0.1
+# A cell with fewer ink pixels than this is empty
+MIN_CELL_INK = 10
+# The band above a grid, this share of the grid's height, holds the roll
+# number and name that tell apart sheets carrying the same marks. It is
+# hashed too, in this many tiles across.
+HEADER_SHARE = 0.3
+HEADER_TILES = 6
+
+
+def _ink(gray: np.ndarray) -> np.ndarray:
+    """Handwriting only: dark strokes with the long ruled lines taken out."""
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10
+    )
+    horizontal, vertical = _lines(binary, max(gray.shape[1] // 10, 5))
+    ruling = cv2.dilate(horizontal | vertical, np.ones((3, 3), np.uint8))
+    ink = cv2.subtract(binary, ruling)
+    # Specks of noise would shift the box of the writing
+    return cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+
+
+def _dhash(ink: np.ndarray) -> int:
+    # Blur at 4x the hash size: thin strokes would otherwise alias
+    ink = cv2.resize(ink, (4 * (HASH_SIZE + 1), 4 * HASH_SIZE), interpolation=cv2.INTER_AREA)
+    ink = cv2.GaussianBlur(ink, (5, 5), 0)
+    small = cv2.resize(ink, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _cell_hash(cell: np.ndarray) -> int | None:
+    """
+    dHash of the writing in one cell, cropped to its ink and padded to a
+    square so that where in the cell it was written does not matter.
+    None for an empty cell.
+    """
+    points = cv2.findNonZero(cell)
+    if points is None or len(points) < MIN_CELL_INK:
+        return None
+    x, y, w, h = cv2.boundingRect(points)
+    side = max(w, h)
+    square = np.zeros((side, side), np.uint8)
+    top, left = (side - h) // 2, (side - w) // 2
+    square[top:top + h, left:left + w] = cell[y:y + h, x:x + w]
+    return _dhash(square)
+
+
+def _header_hashes(band: np.ndarray) -> List[int | None]:
+    """
+    dHashes of HEADER_TILES tiles across the writing of the band above a
+    grid, cropped to its ink first so the tiles follow the text, not the
+    framing. All None when nothing is written there.
+    """
+    points = cv2.findNonZero(band) if band.size else None
+    if points is None or len(points) < MIN_CELL_INK:
+        return [None] * HEADER_TILES
+    x, y, w, h = cv2.boundingRect(points)
+    if w < HEADER_TILES:
+        return [None] * HEADER_TILES
+    edges = np.linspace(x, x + w, HEADER_TILES + 1).astype(int)
+    return [_dhash(band[y:y + h, a:b]) for a, b in zip(edges, edges[1:])]
+
+
+def _hashes(ink: np.ndarray, boxes: List[tuple[float, float, float, float]]) -> List[int | None]:
+    hashes = []
+    for x, y, w, h in boxes:
+        x0, y0 = int(x + CELL_INSET * w), int(y + CELL_INSET * h)
+        x1, y1 = int(x + (1 - CELL_INSET) * w), int(y + (1 - CELL_INSET) * h)
+        hashes.append(_cell_hash(ink[max(y0, 0):y1, max(x0, 0):x1]))
+    return hashes
+
+
+def grid_fingerprint(image: np.ndarray, rows: int, cols: int) -> List[int | None]:
+    """
+    Perceptual hash of every cell of the rows x cols grid of a sheet, row
+    by row, then of HEADER_TILES tiles of the band above the grid (None
+    for empty cells, see _header_hashes). The grid is the largest ruled region of
+    the photo, or the whole photo, with no header, when none is found.
+    """
+    boxes = find_grid_regions(image, min_cells=max(2, rows * cols // 2))
+    header = 0
+    if boxes:
+        x, y, w, h = max(boxes, key=lambda b: b[2] * b[3])
+        header = min(y, int(h * HEADER_SHARE))
+        image = image[y - header:y + h, x:x + w]
+    ink = _ink(small_gray(image, FINGERPRINT_WIDTH))
+    h, w = ink.shape
+    top = round(header * h / image.shape[0])
+    cell_w, cell_h = w / cols, (h - top) / rows
+    cells = _hashes(
+        ink,
+        [(c * cell_w, top + r * cell_h, cell_w, cell_h) for r in range(rows) for c in range(cols)],
+    )
+    return cells + _header_hashes(ink[:top])
+
+
+def header_size(template: dict | None = None) -> int:
+    """
+    How many hashes at the end of a sheet's fingerprint are of its header
+    (the roll number field of a template), not of mark cells.
+    """
+    if template:
+        return 1 if template.get("roll_number") else 0
+    return HEADER_TILES
+
+
+def template_fingerprint(image: np.ndarray, template: dict) -> List[int | None] | None:
+    """
+    Perceptual hash of every cell of a template sheet, in template cell
+    order, then of its roll number field if it has one, on the
+    straightened page. None when the sheet cannot be located.
+    """
+    straightened = straighten(image, template, FINGERPRINT_WIDTH)
+    if straightened is None:
+        return None
+    page, scale = straightened
+    gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY) if page.ndim == 3 else page
+    regions = template["cells"] + ([template["roll_number"]] if template.get("roll_number") else [])
+    return _hashes(
+        _ink(gray),
+        [
+            (r["x"] * scale, r["y"] * scale, r["width"] * scale, r["height"] * scale)
+            for r in regions
+        ],
+    )
+
+
+def sheet_fingerprint(
+    image: np.ndarray, rows: int, cols: int, template: dict | None = None
+) -> List[int | None] | None:
+    """Cell hashes of a sheet read on template's layout, else as a rows x cols grid."""
+    if template:
+        return template_fingerprint(image, template)
+    return grid_fingerprint(image, rows, cols)
+
+
+def sheet_fingerprint_from_frame(
+    frame: FrameHandle | np.ndarray, rows: int, cols: int, template: dict | None = None
+) -> tuple[List[int | None] | None, float]:
+    """
+    sheet_fingerprint of a frame, read in place from shared memory when
+    called in an OCR worker, and the ms it took. The caller records the
+    time: metrics kept in a worker never reach /api/metrics.
+    """
+    start = time.perf_counter()
+    with attach_frame(frame) as image:
+        fingerprint = sheet_fingerprint(image, rows, cols, template)
+    return fingerprint, (time.perf_counter() - start) * 1000
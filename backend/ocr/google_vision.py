@@ -1,16 +1,20 @@
 import os
-from typing import List, Optional
-from google.cloud import vision
-from google.oauth2 import service_account
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from google.cloud import vision
 
 # Global client to reuse connection
-_client: Optional[vision.ImageAnnotatorClient] = None
+_client: Optional["vision.ImageAnnotatorClient"] = None
 
-def get_vision_client() -> vision.ImageAnnotatorClient:
+def get_vision_client() -> "vision.ImageAnnotatorClient":
     global _client
     if _client:
         return _client
 
+    # Imported on first use, the Vision client library is slow to load.
+    from google.cloud import vision
+
     creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
     if not creds_path or not os.path.exists(creds_path):
         # Allow default credentials if set up in environment differently
@@ -33,6 +37,8 @@ def detect_text(image_content: bytes) -> str:
     Detects text in an image using Google Cloud Vision API.
     Returns the full text annotation.
     """
+    from google.cloud import vision
+
     client = get_vision_client()
     image = vision.Image(content=image_content)
     
@@ -47,10 +53,12 @@ def detect_text(image_content: bytes) -> str:
 
     return response.full_text_annotation.text
 
-def detect_document_text(image_content: bytes) -> vision.TextAnnotation:
+def detect_document_text(image_content: bytes) -> "vision.TextAnnotation":
     """
     Returns the full structured TextAnnotation object for advanced processing.
     """
+    from google.cloud import vision
+
     client = get_vision_client()
     image = vision.Image(content=image_content)
     
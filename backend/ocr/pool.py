@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for the CPU-bound image pipeline (cv2, Tesseract).
+# 0 runs OCR on the shared threadpool as before.
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+# Start the workers at server startup instead of on the first scan.
+OCR_PREWARM = os.getenv("OCR_PREWARM", "1") == "1"
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    """
+    Runs once in each worker: load the heavy modules, locate Tesseract and
+    build the Vision client so the first scan does not pay for it.
+    """
+    import cv2
+
+    # One process per core already, don't let OpenCV spawn its own threads
+    cv2.setNumThreads(1)
+
+    from . import service
+    from .google_vision import get_vision_client
+
+    service._setup_tesseract_path()
+    try:
+        get_vision_client()
+    except Exception as e:
+        logger.warning(f"Vision client not available in OCR worker: {e}")
+
+    # Importing the grid pipeline configures its logger as well
+    from ..services import grid_excel  # noqa: F401
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def get_ocr_pool() -> ProcessPoolExecutor | None:
+    global _pool
+    if OCR_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a server process that already runs threads
+                # (the event loop, the DB pool) is not safe
+                _pool = ProcessPoolExecutor(
+                    max_workers=OCR_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+    return _pool
+
+
+def warm_up() -> None:
+    """
+    Start every worker process now. Returns immediately.
+    """
+    pool = get_ocr_pool()
+    if pool is None:
+        return
+    for _ in range(OCR_WORKERS):
+        pool.submit(_ping)
+
+
+async def run_ocr(fn, *args, **kwargs):
+    """
+    Await fn(*args, **kwargs) on the OCR process pool. fn and its
+    arguments must be picklable, so pass module-level functions.
+    """
+    pool = get_ocr_pool()
+    if pool is None:
+        return await run_in_threadpool(fn, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        fn = partial(fn, **kwargs)
+    return await loop.run_in_executor(pool, fn, *args)
+
+
+@contextmanager
+def pool_frame(image):
+    """
+    A decoded image as the frame to pass run_ocr: copied once into shared
+    memory while the pool runs, the image itself otherwise. Several calls
+    can read the same frame; fn opens it with shm.attach_frame(). The
+    segment is released when the block ends, whether the calls succeeded,
+    failed or the request was cancelled.
+    """
+    if get_ocr_pool() is None:
+        yield image
+        return
+    # numpy stays out of the server's import path until a scan comes in
+    from .shm import shared_frame
+
+    with shared_frame(image) as handle:
+        yield handle
+
+
+async def run_ocr_on_frame(fn, image, *args, **kwargs):
+    """
+    Await fn(frame, *args, **kwargs) on the OCR process pool where frame
+    is a decoded image. The pixels go through shared memory instead of
+    being pickled (see pool_frame).
+    """
+    with pool_frame(image) as frame:
+        return await run_ocr(fn, frame, *args, **kwargs)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,135 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Tesseract reads digits best at about twice the size they are photographed at
+UPSCALE = 2.0
+# Native-resolution margin kept around the ink when cropping a page
+PAGE_MARGIN = 10
+
+
+class Preprocessor:
+    """
+    Binarization for Tesseract. Full-size stages (gray, blur, threshold)
+    run at native resolution into buffers kept between calls, and only
+    the region that holds ink is upscaled.
+
+    Returned arrays may be engine buffers: they are valid until the next
+    call on the same engine. Use engine() to get the current thread's.
+    """
+
+    def __init__(self):
+        self._buffers: dict[str, np.ndarray] = {}
+
+    def _buffer(self, name: str, shape: tuple) -> np.ndarray:
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._buffers[name] = buf
+        return buf
+
+    # --- Stages ---
+
+    def gray(self, image: np.ndarray) -> np.ndarray:
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._buffer("gray", image.shape[:2]))
+
+    def blur(self, gray: np.ndarray) -> np.ndarray:
+        return cv2.GaussianBlur(gray, (5, 5), 0, dst=self._buffer("blur", gray.shape))
+
+    def adaptive_threshold(self, gray: np.ndarray) -> np.ndarray:
+        return cv2.adaptiveThreshold(
+            gray,
+            255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV,
+            11,
+            2,
+            dst=self._buffer("binary", gray.shape),
+        )
+
+    def otsu_inv(self, gray: np.ndarray) -> tuple[float, np.ndarray]:
+        """Otsu level and the inverted binary image (ink white)."""
+        return cv2.threshold(
+            gray,
+            0,
+            255,
+            cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU,
+            dst=self._buffer("binary", gray.shape),
+        )
+
+    def upscale(self, roi: np.ndarray, name: str = "upscaled") -> np.ndarray:
+        h, w = roi.shape[:2]
+        dst = self._buffer(name, (int(h * UPSCALE), int(w * UPSCALE)))
+        return cv2.resize(roi, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv2.INTER_CUBIC)
+
+    # --- Pipelines ---
+
+    def page(self, image: np.ndarray) -> np.ndarray:
+        """
+        Ink-on-black binary of a marks sheet for line-by-line OCR, cropped
+        to the ink (plus a margin) before upscaling.
+        """
+        binary = self.adaptive_threshold(self.blur(self.gray(image)))
+        x, y, w, h = cv2.boundingRect(binary)
+        if w == 0 or h == 0:
+            return self.upscale(binary)
+        x0, y0 = max(x - PAGE_MARGIN, 0), max(y - PAGE_MARGIN, 0)
+        x1 = min(x + w + PAGE_MARGIN, binary.shape[1])
+        y1 = min(y + h + PAGE_MARGIN, binary.shape[0])
+        return self.upscale(binary[y0:y1, x0:x1])
+
+    def digit_canvas(self, image: np.ndarray, padding: int = 20) -> np.ndarray | None:
+        """
+        Black-on-white upscaled digits of a single grid cell, centered on a
+        square canvas. None when the cell holds nothing but its borders.
+        Contour filters are expressed at the upscaled size, as before.
+        """
+        gray = self.gray(image)
+        level, th_inv = self.otsu_inv(gray)
+        contours, _ = cv2.findContours(th_inv, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        h_img, w_img = gray.shape[0] * UPSCALE, gray.shape[1] * UPSCALE
+        min_x, min_y, max_x, max_y = gray.shape[1], gray.shape[0], 0, 0
+        found = False
+        for c in contours:
+            # Filter out very small noise
+            if cv2.contourArea(c) * UPSCALE * UPSCALE <= 20:
+                continue
+            x, y, w, h = cv2.boundingRect(c)
+            sx, sy, sw, sh = x * UPSCALE, y * UPSCALE, w * UPSCALE, h * UPSCALE
+            # Skip grid lines and borders: touch an edge and span the cell
+            touches_edge = sx <= 3 or sy <= 3 or sx + sw >= w_img - 3 or sy + sh >= h_img - 3
+            spans_long = sw > 0.5 * w_img or sh > 0.5 * h_img
+            if touches_edge and spans_long:
+                continue
+            found = True
+            min_x, min_y = min(min_x, x), min(min_y, y)
+            max_x, max_y = max(max_x, x + w), max(max_y, y + h)
+
+        if not found:
+            return None
+
+        # Only the digits are upscaled, and binarized with the level found above
+        roi = self.upscale(gray[min_y:max_y, min_x:max_x], name="roi")
+        digits = cv2.threshold(roi, level, 255, cv2.THRESH_BINARY, dst=roi)[1]
+
+        h, w = digits.shape
+        side = max(w, h) + 2 * padding
+        canvas = self._buffer("canvas", (side, side))
+        canvas.fill(255)
+        dy, dx = side // 2 - h // 2, side // 2 - w // 2
+        canvas[dy:dy + h, dx:dx + w] = digits
+        return canvas
+
+
+_local = threading.local()
+
+
+def engine() -> Preprocessor:
+    """The calling thread's engine (buffers are not shared between threads)."""
+    if not hasattr(_local, "engine"):
+        _local.engine = Preprocessor()
+    return _local.engine
@@ -0,0 +1,163 @@
+import os
+import time
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from .. import metrics
+
+# Frames are judged on a small grayscale copy, a few milliseconds per frame
+QUALITY_WIDTH = 320
+# Size of the thumbnail compared between consecutive frames
+THUMB_SIZE = (80, 60)
+
+# Laplacian variance (on the small copy) below which an image is too blurry
+SCAN_MIN_SHARPNESS = float(os.getenv("SCAN_MIN_SHARPNESS", "60"))
+# Mean brightness (0-255) below which an image is too dark
+SCAN_MIN_BRIGHTNESS = float(os.getenv("SCAN_MIN_BRIGHTNESS", "40"))
+# Share of blown-out (>= 250) pixels above which the ink is washed away.
+# White paper alone stays well under it.
+SCAN_MAX_CLIPPED = float(os.getenv("SCAN_MAX_CLIPPED", "0.9"))
+# Reject images without ruled grid lines. Turn off for sheets without them.
+SCAN_REQUIRE_GRID = os.getenv("SCAN_REQUIRE_GRID", "1") == "1"
+
+REJECT_MESSAGES = {
+    "undecodable": "The image could not be read.",
+    "too_dark": "The image is too dark. Add light or move away from shadows.",
+    "overexposed": "The image is washed out. Avoid glare and direct light.",
+    "blurry": "The image is blurry. Hold the camera steady and focus on the sheet.",
+    "no_grid": "No marks grid found. Make sure the whole grid is in the picture.",
+    "not_registered": "The sheet could not be matched to its template. Keep the whole sheet and its corner markers in the picture.",
+}
+
+
+def decode_gray(data: bytes) -> np.ndarray | None:
+    """
+    Small grayscale copy of an encoded image. JPEGs are decoded at a
+    quarter of their size directly by libjpeg. None if undecodable.
+    """
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return None
+    return downscale(gray)
+
+
+def small_gray(image: np.ndarray, width: int = QUALITY_WIDTH) -> np.ndarray:
+    """Small grayscale copy of a decoded BGR frame."""
+    # Skip pixels first so the color conversion runs on a small image
+    step = max(image.shape[1] // (2 * width), 1)
+    sampled = image[::step, ::step]
+    if sampled.ndim == 3:
+        sampled = cv2.cvtColor(sampled, cv2.COLOR_BGR2GRAY)
+    return downscale(sampled, width)
+
+
+def downscale(gray: np.ndarray, width: int = QUALITY_WIDTH) -> np.ndarray:
+    h, w = gray.shape[:2]
+    if w <= width:
+        return gray
+    return cv2.resize(gray, (width, round(h * width / w)), interpolation=cv2.INTER_AREA)
+
+
+def sharpness(gray: np.ndarray) -> float:
+    """Variance of the Laplacian: low for blurred or shaken frames."""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def exposure(gray: np.ndarray) -> tuple[float, float]:
+    """(mean brightness, share of blown-out pixels)."""
+    return float(gray.mean()), float(np.count_nonzero(gray >= 250)) / gray.size
+
+
+def _count_runs(mask: np.ndarray) -> int:
+    # Number of separate True runs, i.e. lines a few pixels thick count once
+    padded = np.concatenate(([False], mask, [False]))
+    return int(np.count_nonzero(padded[1:] & ~padded[:-1]))
+
+
+def grid_lines(gray: np.ndarray) -> tuple[int, int]:
+    """
+    (horizontal, vertical) number of long straight ink lines, the ruling
+    of a marks grid. Strokes of handwriting are too short to count.
+    """
+    h, w = gray.shape
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10
+    )
+    horizontal = cv2.morphologyEx(
+        binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(w // 8, 1), 1))
+    )
+    vertical = cv2.morphologyEx(
+        binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(h // 8, 1)))
+    )
+    # A row (column) belongs to a line when a quarter of it is line pixels
+    rows = np.count_nonzero(horizontal, axis=1) > w // 4
+    cols = np.count_nonzero(vertical, axis=0) > h // 4
+    return _count_runs(rows), _count_runs(cols)
+
+
+def thumbnail(gray: np.ndarray) -> np.ndarray:
+    return cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def difference(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference of two thumbnails, 0-255."""
+    return float(cv2.absdiff(a, b).mean())
+
+
+@dataclass
+class QualityReport:
+    sharpness: float
+    brightness: float
+    clipped: float
+    horizontal_lines: int
+    vertical_lines: int
+    reason: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.reason is None
+
+    @property
+    def has_grid(self) -> bool:
+        return self.horizontal_lines >= 2 and self.vertical_lines >= 2
+
+
+def assess(
+    gray: np.ndarray,
+    min_sharpness: float = SCAN_MIN_SHARPNESS,
+    require_grid: bool = SCAN_REQUIRE_GRID,
+) -> QualityReport:
+    """
+    Score a small grayscale copy (see small_gray/decode_gray). The first
+    failed check gives the reason code.
+    """
+    brightness, clipped = exposure(gray)
+    report = QualityReport(sharpness(gray), brightness, clipped, *grid_lines(gray))
+    if brightness < SCAN_MIN_BRIGHTNESS:
+        report.reason = "too_dark"
+    elif clipped > SCAN_MAX_CLIPPED:
+        report.reason = "overexposed"
+    elif require_grid and not report.has_grid:
+        report.reason = "no_grid"
+    elif report.sharpness < min_sharpness:
+        # Judged after the grid: the Laplacian variance of a nearly blank
+        # page is low however sharp it is
+        report.reason = "blurry"
+    return report
+
+
+def gate(image: np.ndarray, source: str, require_grid: bool = SCAN_REQUIRE_GRID) -> QualityReport:
+    """
+    assess() a decoded frame before OCR and record the outcome under
+    scan_quality_total{source, outcome}. Every rejected image is an OCR
+    call (Vision or Tesseract) that was not made.
+    """
+    start = time.perf_counter()
+    report = assess(small_gray(image), require_grid=require_grid)
+    metrics.observe("scan_quality_ms", (time.perf_counter() - start) * 1000, {"source": source})
+    metrics.increment(
+        "scan_quality_total", {"source": source, "outcome": report.reason or "accepted"}
+    )
+    return report
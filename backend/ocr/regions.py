@@ -0,0 +1,121 @@
+import cv2
+import numpy as np
+
+from .quality import small_gray
+
+# Width of the copy the grids are searched on
+DETECT_WIDTH = 800
+# Smallest cell kept, as a share of the photo's area
+MIN_CELL_AREA = 0.0005
+# Thickest ruled line expected on the search copy, in pixels
+LINE_GAP = 6
+
+
+def _lines(binary: np.ndarray, length: int) -> tuple[np.ndarray, np.ndarray]:
+    horizontal = cv2.morphologyEx(
+        binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (length, 1))
+    )
+    vertical = cv2.morphologyEx(
+        binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, length))
+    )
+    return horizontal, vertical
+
+
+def _cells(ruling: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """
+    Boxes of the rectangular holes enclosed by ruled lines. The paper
+    around a grid is a hole as well, but shaped like a frame, and the
+    background touches the border of the photo.
+    """
+    h, w = ruling.shape
+    count, _, stats, _ = cv2.connectedComponentsWithStats(
+        cv2.bitwise_not(ruling), connectivity=4
+    )
+    cells = []
+    for x, y, bw, bh, area in stats[1:count]:
+        if x == 0 or y == 0 or x + bw == w or y + bh == h:
+            continue
+        if bw < 5 or bh < 5 or area < MIN_CELL_AREA * w * h:
+            continue
+        if area < 0.8 * bw * bh:
+            continue
+        cells.append((int(x), int(y), int(bw), int(bh)))
+    return cells
+
+
+def _group(cells: list[tuple[int, int, int, int]], gap: int) -> list[list[tuple[int, int, int, int]]]:
+    """Cells whose boxes are at most gap apart (across a line) end up together."""
+    parent = list(range(len(cells)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, (x1, y1, w1, h1) in enumerate(cells):
+        for j in range(i + 1, len(cells)):
+            x2, y2, w2, h2 = cells[j]
+            if (
+                x2 <= x1 + w1 + gap
+                and x1 <= x2 + w2 + gap
+                and y2 <= y1 + h1 + gap
+                and y1 <= y2 + h2 + gap
+            ):
+                parent[find(i)] = find(j)
+
+    groups: dict[int, list] = {}
+    for i, cell in enumerate(cells):
+        groups.setdefault(find(i), []).append(cell)
+    return list(groups.values())
+
+
+def _reading_order(boxes: list[tuple[int, int, int, int]]) -> list[tuple[int, int, int, int]]:
+    """Top to bottom in bands of overlapping rows, left to right in a band."""
+    bands: list[list[tuple[int, int, int, int]]] = []
+    for box in sorted(boxes, key=lambda b: b[1] + b[3] / 2):
+        center = box[1] + box[3] / 2
+        if bands and bands[-1][0][1] <= center <= bands[-1][0][1] + bands[-1][0][3]:
+            bands[-1].append(box)
+        else:
+            bands.append([box])
+    return [box for band in bands for box in sorted(band, key=lambda b: b[0])]
+
+
+def find_grid_regions(image: np.ndarray, min_cells: int = 2) -> list[tuple[int, int, int, int]]:
+    """
+    Bounding boxes (x, y, w, h, in image pixels) of the ruled grids in a
+    photo, in reading order. A grid is found through its cells: adjacent
+    rectangles enclosed by ruled lines, at least min_cells of them.
+    """
+    gray = small_gray(image, DETECT_WIDTH)
+    scale = image.shape[1] / gray.shape[1]
+
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 15, 10
+    )
+    # Short enough for the cell edges of a small grid, too long for digits
+    horizontal, vertical = _lines(binary, max(gray.shape[1] // 40, 5))
+    # Close the small gaps where the lines cross
+    ruling = cv2.morphologyEx(horizontal | vertical, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+
+    boxes = []
+    for group in _group(_cells(ruling), LINE_GAP):
+        if len(group) < min_cells:
+            continue
+        # The margin is kept inside the image, and the size taken from the
+        # clamped corners, so a grid near the top or left edge does not
+        # overshoot on the far side
+        x0 = max(min(x for x, _, _, _ in group) - LINE_GAP, 0)
+        y0 = max(min(y for _, y, _, _ in group) - LINE_GAP, 0)
+        x1 = min(max(x + w for x, _, w, _ in group) + LINE_GAP, gray.shape[1])
+        y1 = min(max(y + h for _, y, _, h in group) + LINE_GAP, gray.shape[0])
+        boxes.append(
+            (
+                round(x0 * scale),
+                round(y0 * scale),
+                round((x1 - x0) * scale),
+                round((y1 - y0) * scale),
+            )
+        )
+    return _reading_order(boxes)
@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+
+# Fiducials and the page outline are looked for on a copy this wide
+REGISTER_WIDTH = 1000
+# The sheet is assumed to span at least this share of the photo's width
+MIN_SHEET_SHARE = 0.3
+# Minimum share of its bounding box a fiducial blob must fill (solid square)
+MIN_FIDUCIAL_FILL = 0.8
+# The page outline must cover at least this share of the photo
+MIN_PAGE_AREA = 0.2
+
+
+def _corners(points: np.ndarray) -> np.ndarray:
+    """
+    The points nearest to the top-left, top-right, bottom-right and
+    bottom-left, in that order. Works for a sheet held roughly upright.
+    """
+    s = points.sum(axis=1)
+    d = points[:, 0] - points[:, 1]
+    return points[[np.argmin(s), np.argmax(d), np.argmax(s), np.argmin(d)]]
+
+
+def _valid_quad(quad: np.ndarray, min_area: float) -> bool:
+    return (
+        len({tuple(p) for p in quad.round(1)}) == 4
+        and cv2.isContourConvex(quad.astype(np.float32))
+        and cv2.contourArea(quad.astype(np.float32)) >= min_area
+    )
+
+
+def find_fiducials(gray: np.ndarray, min_side: float, max_side: float) -> np.ndarray:
+    """Centers of solid dark squares min_side to max_side pixels wide, as an (n, 2) array."""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    centers = []
+    for c in contours:
+        x, y, w, h = cv2.boundingRect(c)
+        if not (min_side <= max(w, h) <= max_side):
+            continue
+        if not (0.75 <= w / h <= 1.33):
+            continue
+        if cv2.contourArea(c) < MIN_FIDUCIAL_FILL * w * h:
+            continue
+        centers.append((x + w / 2, y + h / 2))
+    return np.array(centers, dtype=np.float32).reshape(-1, 2)
+
+
+def find_page(gray: np.ndarray) -> np.ndarray | None:
+    """Corners (TL, TR, BR, BL) of the largest four-sided outline, or None."""
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = MIN_PAGE_AREA * gray.shape[0] * gray.shape[1]
+    for c in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        approx = cv2.approxPolyDP(c, 0.02 * cv2.arcLength(c, True), True)
+        if len(approx) != 4:
+            continue
+        quad = _corners(approx.reshape(4, 2).astype(np.float32))
+        if _valid_quad(quad, min_area):
+            return quad
+    return None
+
+
+def register(image: np.ndarray, template: dict) -> np.ndarray | None:
+    """
+    Homography from photo pixels to template coordinates, or None when the
+    sheet cannot be located. With four fiducials in the template, the
+    printed markers are matched; otherwise the page outline is mapped to
+    the template's (0, 0, width, height) page.
+    """
+    h, w = image.shape[:2]
+    scale = min(REGISTER_WIDTH / w, 1.0)
+    small = cv2.resize(image, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    min_area = (MIN_SHEET_SHARE * gray.shape[1]) ** 2 / 4
+
+    fiducials = template.get("fiducials") or []
+    if len(fiducials) == 4:
+        target = _corners(np.array([(f["x"], f["y"]) for f in fiducials], dtype=np.float32))
+        # Marker size if the sheet filled the photo's width; it may span less
+        side = max(f["size"] for f in fiducials) / template["width"] * gray.shape[1]
+        found = find_fiducials(gray, side * MIN_SHEET_SHARE * 0.75, side * 1.5)
+        if len(found) >= 4:
+            quad = _corners(found)
+            if _valid_quad(quad, min_area):
+                return cv2.getPerspectiveTransform(quad / scale, target)
+
+    quad = find_page(gray)
+    if quad is None:
+        return None
+    tw, th = template["width"], template["height"]
+    target = np.array([(0, 0), (tw, 0), (tw, th), (0, th)], dtype=np.float32)
+    return cv2.getPerspectiveTransform(quad / scale, target)
+
+
+def straighten(image: np.ndarray, template: dict, width: int) -> tuple[np.ndarray, float] | None:
+    """
+    The sheet warped onto its template, width pixels wide, and the scale
+    from template units to its pixels. None when the sheet cannot be
+    located (see register).
+    """
+    homography = register(image, template)
+    if homography is None:
+        return None
+    scale = width / template["width"]
+    page = cv2.warpPerspective(
+        image,
+        np.diag([scale, scale, 1.0]) @ homography,
+        (width, round(template["height"] * scale)),
+        borderMode=cv2.BORDER_REPLICATE,
+    )
+    return page, scale
@@ -0,0 +1,127 @@
+import os
+import re
+from typing import List
+
+import numpy as np
+
+# Words that introduce the roll number on a sheet ("Roll No: 21045",
+# "Reg. No 1045", "Roll:21045")
+ROLL_LABEL = re.compile(
+    r"^(roll|reg|regn|regd|register|registration|enrol+(ment)?|adm|admission)(no|num|number)?(?![a-z])",
+    re.I,
+)
+# Fewer digits than this is a mark or a question number, not a roll number
+ROLL_MIN_DIGITS = int(os.getenv("ROLL_MIN_DIGITS", "3"))
+
+# (x, y, width, height) in image pixels
+Box = tuple[float, float, float, float]
+
+
+def _words(annotation) -> List[dict]:
+    """Every Vision word as {text, digit_confs, conf, x0, y0, x1, y1}."""
+    words = []
+    for page in annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    vertices = word.bounding_box.vertices
+                    if not vertices:
+                        continue
+                    xs = [v.x for v in vertices]
+                    ys = [v.y for v in vertices]
+                    conf = float(getattr(word, "confidence", 1.0))
+                    words.append({
+                        "text": "".join(symbol.text for symbol in word.symbols),
+                        "digit_confs": [
+                            float(getattr(symbol, "confidence", conf))
+                            for symbol in word.symbols
+                            if symbol.text.isdigit()
+                        ],
+                        "conf": conf,
+                        "x0": min(xs), "y0": min(ys), "x1": max(xs), "y1": max(ys),
+                    })
+    return words
+
+
+def _read(words: List[dict]) -> dict | None:
+    """Digits of words read left to right, with the box they cover."""
+    digits = "".join(ch for w in words for ch in w["text"] if ch.isdigit())
+    if len(digits) < ROLL_MIN_DIGITS:
+        return None
+    confs = [c for w in words for c in w["digit_confs"]] or [w["conf"] for w in words]
+    x0, y0 = min(w["x0"] for w in words), min(w["y0"] for w in words)
+    x1, y1 = max(w["x1"] for w in words), max(w["y1"] for w in words)
+    return {"value": digits, "confidence": round(min(confs), 3), "box": (x0, y0, x1 - x0, y1 - y0)}
+
+
+def find_labelled(annotation) -> dict | None:
+    """
+    The roll number written after a label such as "Roll No" anywhere on
+    the sheet: the digit words on the label's line, right of it, up to the
+    first wide gap. Returns {"value", "confidence", "box"} or None.
+    """
+    words = _words(annotation)
+    for label in words:
+        if not ROLL_LABEL.match(label["text"]):
+            continue
+        height = label["y1"] - label["y0"] or 1
+        middle = (label["y0"] + label["y1"]) / 2
+        line = sorted(
+            (
+                w for w in words
+                if w["y0"] <= middle <= w["y1"] and w["x1"] >= label["x0"]
+            ),
+            key=lambda w: w["x0"],
+        )
+        # Skip the label and words like "No", ":", "Number"
+        start = next(
+            (i for i, w in enumerate(line) if any(ch.isdigit() for ch in w["text"])), None
+        )
+        if start is None:
+            continue
+        run = [line[start]]
+        for w in line[start + 1:]:
+            if w["x0"] - run[-1]["x1"] > 1.5 * height or not w["text"].isdigit():
+                break
+            run.append(w)
+        found = _read(run)
+        if found:
+            return found
+    return None
+
+
+def read_in_box(annotation, box: Box) -> dict | None:
+    """Digits of the Vision words centered in box (a template's roll number field)."""
+    x, y, w, h = box
+    inside = sorted(
+        (
+            word for word in _words(annotation)
+            if x <= (word["x0"] + word["x1"]) / 2 < x + w
+            and y <= (word["y0"] + word["y1"]) / 2 < y + h
+        ),
+        key=lambda word: word["x0"],
+    )
+    return _read(inside) if inside else None
+
+
+def read_crop(crop: np.ndarray) -> dict | None:
+    """Digits-only Tesseract pass over a roll number field, when Vision is unavailable."""
+    import pytesseract
+    from pytesseract import Output
+
+    config = r"--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789"
+    d = pytesseract.image_to_data(crop, config=config, output_type=Output.DICT)
+    words = [
+        (text.strip(), float(conf))
+        for text, conf in zip(d["text"], d["conf"])
+        if text.strip() and float(conf) >= 0
+    ]
+    digits = "".join(text for text, _ in words)
+    if len(digits) < ROLL_MIN_DIGITS:
+        return None
+    h, w = crop.shape[:2]
+    return {
+        "value": digits,
+        "confidence": round(min(conf for _, conf in words) / 100, 3),
+        "box": (0, 0, w, h),
+    }
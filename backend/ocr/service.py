@@ -1,14 +1,14 @@
-import base64
-import io
 import re
 from typing import List
 
 import cv2
 import numpy as np
 import pytesseract
-from PIL import Image
 
 from ..schemas.core import MarkItem
+from . import codecs
+from .preprocess import engine
+from .shm import FrameHandle, attach_frame
 
 
 QUESTION_MARK_PATTERN = re.compile(
@@ -27,30 +27,14 @@ QUESTION_MARK_PATTERN = re.compile(
 )
 
 
-def _decode_base64_image(image_b64: str) -> np.ndarray:
-    header, _, data = image_b64.partition(",")
-    if data:
-        image_b64 = data
-    img_bytes = base64.b64decode(image_b64)
-    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    open_cv_image = np.array(img)
-    open_cv_image = open_cv_image[:, :, ::-1].copy()  # RGB to BGR
-    return open_cv_image
+def decode_base64_image(image_b64: str) -> np.ndarray:
+    """BGR frame of an uploaded scan. Runs in the server, where its metrics are reported."""
+    return codecs.decode(codecs.payload_bytes(image_b64), "ocr")
 
 
 def _preprocess_image(image: np.ndarray) -> np.ndarray:
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    thresh = cv2.adaptiveThreshold(
-        blur,
-        255,
-        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-        cv2.THRESH_BINARY_INV,
-        11,
-        2,
-    )
-    scaled = cv2.resize(thresh, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC)
-    return scaled
+    # Blur + adaptive threshold at native size, 2x upscale of the ink only
+    return engine().page(image)
 
 
 def _setup_tesseract_path():
@@ -78,10 +62,14 @@ def _setup_tesseract_path():
             return
 
 
-def run_ocr_on_base64_image(image_b64: str) -> List[MarkItem]:
+def extract_marks_from_frame(frame: FrameHandle | np.ndarray) -> List[MarkItem]:
+    """
+    Question/marks lines of a decoded scan, read in place from shared
+    memory when called in an OCR worker.
+    """
     _setup_tesseract_path()
-    image = _decode_base64_image(image_b64)
-    preprocessed = _preprocess_image(image)
+    with attach_frame(frame) as image:
+        preprocessed = _preprocess_image(image)
 
     config = "--psm 6 -c tessedit_char_whitelist=0123456789Qq()abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ:- "
     raw_text = pytesseract.image_to_string(preprocessed, config=config)
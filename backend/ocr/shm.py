@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Iterator, Tuple, Union
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class FrameHandle:
+    """
+    Picklable reference to an image in shared memory. Only the name,
+    shape and dtype cross the process boundary, never the pixels.
+    """
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+@contextmanager
+def shared_frame(image: np.ndarray) -> Iterator[FrameHandle]:
+    """
+    Copy image into a new shared memory block for the duration of the
+    block. The creator owns the segment: it is unlinked on exit, also when
+    the work failed or was cancelled.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+    try:
+        view = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+        view[...] = image
+        del view
+        yield FrameHandle(shm.name, tuple(image.shape), image.dtype.str)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+@contextmanager
+def attach_frame(frame: Union[FrameHandle, np.ndarray]) -> Iterator[np.ndarray]:
+    """
+    NumPy view on a shared frame, without copying. Plain arrays are passed
+    through, so the same code runs with or without worker processes.
+    The view (and any slice of it) must not be kept after the block.
+    """
+    if isinstance(frame, np.ndarray):
+        yield frame
+        return
+
+    shm = shared_memory.SharedMemory(name=frame.name)
+    # Bound before the try: the finally drops it even if the view fails
+    view = None
+    try:
+        view = np.ndarray(frame.shape, dtype=np.dtype(frame.dtype), buffer=shm.buf)
+        # Workers only read the frame
+        view.flags.writeable = False
+        yield view
+    finally:
+        del view
+        shm.close()
@@ -0,0 +1,208 @@
+import os
+from typing import List
+
+import numpy as np
+
+# Columns of the symbol array: center, size of the digit's own box, its
+# Vision confidence (0-1) and the digit
+X, Y, WIDTH, HEIGHT, CONF, DIGIT = range(6)
+# Digits further apart than this many digit heights are separate numbers
+SYMBOL_MERGE_GAP = float(os.getenv("SYMBOL_MERGE_GAP", "0.8"))
+# Numbers above this are too large to be one mark
+MAX_MARK = 100
+
+# (x, y, width, height) in image pixels
+Box = tuple[float, float, float, float]
+
+
+def _corners(vertices) -> tuple[list, list] | None:
+    """x and y of the four corners of a bounding polygon, None when it has none."""
+    if not vertices:
+        return None
+    xs = [v.x for v in vertices]
+    ys = [v.y for v in vertices]
+    if len(xs) != 4:
+        xs = [min(xs), max(xs), max(xs), min(xs)]
+        ys = [min(ys), min(ys), max(ys), max(ys)]
+    return xs, ys
+
+
+def symbol_array(annotation) -> np.ndarray:
+    """
+    Every digit of a Vision annotation, in one pass, as an (n, 6) float
+    array of its center, width and height (see the column indexes above),
+    confidence and value. Each digit sits in its own symbol box; only a
+    symbol without one gets an even share of its word's box.
+    """
+    xs, ys, parts, values = [], [], [], []
+    for page in annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    conf = float(getattr(word, "confidence", 1.0))
+                    word_corners = None
+                    n = len(values)
+                    for symbol in word.symbols:
+                        chars = [ch for ch in symbol.text if ch.isdigit()]
+                        if not chars:
+                            continue
+                        corners = _corners(getattr(getattr(symbol, "bounding_box", None), "vertices", None))
+                        symbol_conf = float(getattr(symbol, "confidence", conf))
+                        for i, ch in enumerate(chars):
+                            if corners is None:
+                                # Shared out below, once the word's digits are counted
+                                word_corners = (
+                                    word_corners
+                                    or _corners(word.bounding_box.vertices)
+                                    or ([0] * 4, [0] * 4)
+                                )
+                                xs.append(word_corners[0])
+                                ys.append(word_corners[1])
+                                parts.append([-1, 0])
+                            else:
+                                xs.append(corners[0])
+                                ys.append(corners[1])
+                                parts.append([i, len(chars)])
+                            values.append((symbol_conf, int(ch)))
+                    for k in range(n, len(values)):
+                        if parts[k][0] < 0:
+                            parts[k] = [k - n, len(values) - n]
+    if not values:
+        return np.zeros((0, 6))
+    xs, ys, parts = np.array(xs, dtype=float), np.array(ys, dtype=float), np.array(parts, dtype=float)
+    x0, x1, y0, y1 = xs.min(axis=1), xs.max(axis=1), ys.min(axis=1), ys.max(axis=1)
+    share = (x1 - x0) / parts[:, 1]
+    return np.column_stack((
+        x0 + (parts[:, 0] + 0.5) * share, (y0 + y1) / 2, share, y1 - y0, np.array(values, dtype=float)
+    ))
+
+
+def number_ids(symbols: np.ndarray) -> np.ndarray:
+    """
+    Which number each digit belongs to. Digits are on one line when their
+    centers are within half a digit height of each other; on a line, a gap
+    wider than SYMBOL_MERGE_GAP digit heights starts a new number.
+    """
+    n = len(symbols)
+    if not n:
+        return np.zeros(0, dtype=int)
+    # Median digit height (np.median costs more than the sort on a sheet's few digits)
+    height = float(np.sort(symbols[:, HEIGHT])[n // 2]) or 1.0
+    by_y = np.argsort(symbols[:, Y], kind="stable")
+    line = np.empty(n, dtype=int)
+    line[by_y] = np.concatenate(([0], np.cumsum(np.diff(symbols[by_y, Y]) > height / 2)))
+    order = np.lexsort((symbols[:, X], line))
+    left = symbols[order, X] - symbols[order, WIDTH] / 2
+    right = symbols[order, X] + symbols[order, WIDTH] / 2
+    starts = np.concatenate((
+        [True],
+        (np.diff(line[order]) != 0) | (left[1:] - right[:-1] > SYMBOL_MERGE_GAP * height),
+    ))
+    ids = np.empty(n, dtype=int)
+    ids[order] = np.cumsum(starts) - 1
+    return ids
+
+
+def _reading(symbols: np.ndarray, rows: np.ndarray) -> tuple[str, List[float]]:
+    rows = rows[np.argsort(symbols[rows, X], kind="stable")]
+    digits = "".join(str(int(d)) for d in symbols[rows, DIGIT])
+    return digits, [float(c) for c in symbols[rows, CONF]]
+
+
+def candidates(symbols: np.ndarray, ids: np.ndarray) -> List[dict]:
+    """
+    Every number as {'val', 'x', 'y', 'conf'} at the center of its
+    digits, to infer the grid from. A number too large to be a mark gives
+    one candidate per digit, each where that digit was written.
+    """
+    found = []
+    for number in np.unique(ids):
+        rows = np.flatnonzero(ids == number)
+        digits, confs = _reading(symbols, rows)
+        if int(digits) <= MAX_MARK:
+            found.append({
+                "val": int(digits),
+                "x": float(symbols[rows, X].mean()),
+                "y": float(symbols[rows, Y].mean()),
+                "conf": min(confs),
+            })
+        else:
+            found += [
+                {"val": int(s[DIGIT]), "x": float(s[X]), "y": float(s[Y]), "conf": float(s[CONF])}
+                for s in symbols[rows]
+            ]
+    return found
+
+
+def grid_cells(symbols: np.ndarray, bounds: Box, rows: int, cols: int) -> np.ndarray:
+    """Cell of a rows x cols grid each digit is in, those outside counted in the nearest edge cell."""
+    x, y, w, h = bounds
+    c = np.clip(((symbols[:, X] - x) / (w or 1) * cols).astype(int), 0, cols - 1)
+    r = np.clip(((symbols[:, Y] - y) / (h or 1) * rows).astype(int), 0, rows - 1)
+    return r * cols + c
+
+
+def box_cells(symbols: np.ndarray, boxes: List[Box]) -> np.ndarray:
+    """Index of the box each digit's center is in, -1 outside all of them."""
+    if not len(boxes):
+        return np.full(len(symbols), -1)
+    b = np.asarray(boxes, dtype=float)
+    inside = (
+        (symbols[:, X, None] >= b[:, 0]) & (symbols[:, X, None] < b[:, 0] + b[:, 2])
+        & (symbols[:, Y, None] >= b[:, 1]) & (symbols[:, Y, None] < b[:, 1] + b[:, 3])
+    )
+    return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+
+def read_cells(
+    symbols: np.ndarray, ids: np.ndarray, cell_of: np.ndarray, boxes: List[Box]
+) -> List[dict | None]:
+    """
+    The number written in each box, None when empty, as {'val', 'x', 'y',
+    'conf', 'digits', 'digit_confs'}. A number is the digits of one
+    number_ids group that are in the box; of several, the one nearest the
+    box's center. A number whose digits are spread over more than one
+    box also carries 'merged': (number id, its digits in the boxes, their
+    confidences), see grid_excel._merged_numbers.
+    """
+    cells: List[dict | None] = [None] * len(boxes)
+    kept = np.flatnonzero(cell_of >= 0)
+    if not len(kept):
+        return cells
+    # Groups: the digits of one number in one box, in reading order
+    order = kept[np.lexsort((symbols[kept, X], ids[kept], cell_of[kept]))]
+    cell, number = cell_of[order], ids[order]
+    starts = np.flatnonzero(np.concatenate(([True], (np.diff(cell) != 0) | (np.diff(number) != 0))))
+    counts = np.diff(np.append(starts, len(order)))
+    gx = np.add.reduceat(symbols[order, X], starts) / counts
+    gy = np.add.reduceat(symbols[order, Y], starts) / counts
+    b = np.asarray(boxes, dtype=float)[cell[starts]]
+    distance = np.hypot(gx - (b[:, 0] + b[:, 2] / 2), gy - (b[:, 1] + b[:, 3] / 2))
+    # The group nearest its box's center, one per box
+    by_cell = np.lexsort((distance, cell[starts]))
+    nearest = by_cell[np.concatenate(([True], np.diff(cell[starts][by_cell]) != 0))]
+    # Numbers with digits in more than one box
+    spread = np.bincount(number[starts]) > 1
+
+    digits = symbols[order, DIGIT].astype(int).tolist()
+    confs = symbols[order, CONF].tolist()
+    merged: dict[int, tuple] = {}
+    for g in nearest.tolist():
+        a, n = int(starts[g]), int(counts[g])
+        read = "".join(map(str, digits[a:a + n]))
+        cell_read = {
+            "val": int(read),
+            "x": float(gx[g]),
+            "y": float(gy[g]),
+            "conf": min(confs[a:a + n]),
+            "digits": read,
+            "digit_confs": confs[a:a + n],
+        }
+        number_id = int(number[a])
+        if spread[number_id]:
+            if number_id not in merged:
+                all_digits, all_confs = _reading(symbols, order[number == number_id])
+                merged[number_id] = (number_id, all_digits, tuple(all_confs))
+            cell_read["merged"] = merged[number_id]
+        cells[int(cell[a])] = cell_read
+    return cells
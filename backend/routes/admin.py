@@ -1,26 +1,29 @@
-from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException
-from pymongo.database import Database
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 
 from ..auth.dependencies import require_admin
-from ..database import get_db
 from ..schemas.core import (
     ExamCreate,
     ExamOut,
+    RosterImportResponse,
+    RosterRowError,
     StudentCreate,
     StudentOut,
     SubjectCreate,
     SubjectOut,
     TeacherCreate,
+    TemplateCreate,
+    TemplateOut,
     TeacherOut,
 )
+from ..services import roll_index, roster
+from ..storage import Repository, get_repository
 
 router = APIRouter()
 
 
 def _student_doc_to_out(doc: dict) -> StudentOut:
     return StudentOut(
-        id=str(doc["_id"]),
+        id=doc["id"],
         roll_number=doc["roll_number"],
         name=doc["name"],
         department=doc.get("department"),
@@ -31,8 +34,8 @@ def _student_doc_to_out(doc: dict) -> StudentOut:
 
 def _teacher_doc_to_out(doc: dict) -> TeacherOut:
     return TeacherOut(
-        id=str(doc["_id"]),
-        user_id=str(doc["user_id"]),
+        id=doc["id"],
+        user_id=doc["user_id"],
         name=doc["name"],
         department=doc.get("department"),
     )
@@ -40,7 +43,7 @@ def _teacher_doc_to_out(doc: dict) -> TeacherOut:
 
 def _subject_doc_to_out(doc: dict) -> SubjectOut:
     return SubjectOut(
-        id=str(doc["_id"]),
+        id=doc["id"],
         name=doc["name"],
         code=doc["code"],
     )
@@ -48,89 +51,192 @@ def _subject_doc_to_out(doc: dict) -> SubjectOut:
 
 def _exam_doc_to_out(doc: dict) -> ExamOut:
     return ExamOut(
-        id=str(doc["_id"]),
+        id=doc["id"],
         name=doc["name"],
-        subject_id=str(doc["subject_id"]),
+        subject_id=doc["subject_id"],
         max_marks=doc["max_marks"],
         date=doc["date"],
     )
 
 
+def _template_doc_to_out(doc: dict) -> TemplateOut:
+    return TemplateOut(
+        id=doc["id"],
+        name=doc["name"],
+        width=doc["width"],
+        height=doc["height"],
+        cells=doc["cells"],
+        fiducials=doc.get("fiducials") or [],
+        roll_number=doc.get("roll_number"),
+    )
+
+
+def _template_error(payload: TemplateCreate) -> str | None:
+    """Why a layout cannot be used for scanning, or None."""
+    if payload.width <= 0 or payload.height <= 0:
+        return "Template width and height must be positive"
+    if not payload.cells:
+        return "Template has no cells"
+    labels = [cell.label for cell in payload.cells]
+    if len(set(labels)) != len(labels):
+        return "Cell labels must be unique"
+    for cell in payload.cells:
+        if cell.width <= 0 or cell.height <= 0:
+            return f"Cell {cell.label} has no area"
+        if cell.x < 0 or cell.y < 0 or cell.x + cell.width > payload.width or cell.y + cell.height > payload.height:
+            return f"Cell {cell.label} is outside the page"
+        if cell.max_marks is not None and cell.max_marks < 0:
+            return f"Cell {cell.label} has a negative max_marks"
+    region = payload.roll_number
+    if region and (
+        region.width <= 0 or region.height <= 0
+        or region.x < 0 or region.y < 0
+        or region.x + region.width > payload.width or region.y + region.height > payload.height
+    ):
+        return "The roll number field must be inside the page"
+    if len(payload.fiducials) not in (0, 4):
+        return "Give four fiducial markers (one near each corner) or none"
+    for marker in payload.fiducials:
+        half = marker.size / 2
+        if marker.size <= 0 or (
+            marker.x - half < 0 or marker.y - half < 0
+            or marker.x + half > payload.width or marker.y + half > payload.height
+        ):
+            return "Fiducial markers must have a positive size and lie inside the page"
+    return None
+
+
 @router.post("/students", response_model=StudentOut)
 def create_student(
     payload: StudentCreate,
     _: dict = Depends(require_admin),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
 ):
-    existing = db["students"].find_one({"roll_number": payload.roll_number})
+    existing = repo.get_student_by_roll_number(payload.roll_number)
     if existing:
         raise HTTPException(status_code=400, detail="Student with this roll number exists")
-    doc = payload.dict()
-    result = db["students"].insert_one(doc)
-    doc["_id"] = result.inserted_id
-    return _student_doc_to_out(doc)
+    student = repo.create_student(payload.dict())
+    roll_index.invalidate()
+    return _student_doc_to_out(student)
+
+
+@router.post("/students/import", response_model=RosterImportResponse)
+def import_students(
+    file: UploadFile = File(...),
+    _: dict = Depends(require_admin),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Add every student of a CSV or XLSX roster. The first row names the
+    columns: roll_number and name, optionally department, year, section.
+    Rows that cannot be added are listed in errors, the others are kept.
+    """
+    try:
+        report = roster.import_roster(repo, roster.read_roster(file.file))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    finally:
+        # Rows of the chunks before a bad one may have been inserted
+        roll_index.invalidate()
+    return RosterImportResponse(
+        rows=report["rows"],
+        inserted=report["inserted"],
+        errors=[RosterRowError(**e) for e in report["errors"]],
+        seconds=report["seconds"],
+        rows_per_second=report["rows_per_second"],
+    )
 
 
 @router.get("/students", response_model=list[StudentOut])
 def list_students(
     _: dict = Depends(require_admin),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
 ):
-    return [_student_doc_to_out(d) for d in db["students"].find()]
+    return [_student_doc_to_out(d) for d in repo.list_students()]
 
 
 @router.post("/teachers", response_model=TeacherOut)
 def create_teacher(
     payload: TeacherCreate,
     _: dict = Depends(require_admin),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
 ):
+    if not repo.valid_id(payload.user_id):
+        raise HTTPException(status_code=400, detail="Invalid user ID")
     doc = {
         "name": payload.name,
         "department": payload.department,
-        "user_id": ObjectId(payload.user_id),
+        "user_id": payload.user_id,
     }
-    result = db["teachers"].insert_one(doc)
-    doc["_id"] = result.inserted_id
-    return _teacher_doc_to_out(doc)
+    return _teacher_doc_to_out(repo.create_teacher(doc))
 
 
 @router.post("/subjects", response_model=SubjectOut)
 def create_subject(
     payload: SubjectCreate,
     _: dict = Depends(require_admin),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
 ):
-    existing = db["subjects"].find_one({"code": payload.code})
+    existing = repo.get_subject_by_code(payload.code)
     if existing:
         raise HTTPException(status_code=400, detail="Subject with this code exists")
-    doc = payload.dict()
-    result = db["subjects"].insert_one(doc)
-    doc["_id"] = result.inserted_id
-    return _subject_doc_to_out(doc)
+    return _subject_doc_to_out(repo.create_subject(payload.dict()))
 
 
 @router.post("/exams", response_model=ExamOut)
 def create_exam(
     payload: ExamCreate,
     _: dict = Depends(require_admin),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
 ):
+    if not repo.valid_id(payload.subject_id):
+        raise HTTPException(status_code=400, detail="Invalid subject ID")
     doc = {
         "name": payload.name,
-        "subject_id": ObjectId(payload.subject_id),
+        "subject_id": payload.subject_id,
         "max_marks": payload.max_marks,
         "date": payload.date,
     }
-    result = db["exams"].insert_one(doc)
-    doc["_id"] = result.inserted_id
-    return _exam_doc_to_out(doc)
+    return _exam_doc_to_out(repo.create_exam(doc))
 
 
 @router.get("/exams", response_model=list[ExamOut])
 def list_exams(
     _: dict = Depends(require_admin),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
 ):
-    return [_exam_doc_to_out(d) for d in db["exams"].find()]
+    return [_exam_doc_to_out(d) for d in repo.list_exams()]
+
 
+
+@router.post("/templates", response_model=TemplateOut)
+def create_template(
+    payload: TemplateCreate,
+    _: dict = Depends(require_admin),
+    repo: Repository = Depends(get_repository),
+):
+    error = _template_error(payload)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+    if repo.get_template_by_name(payload.name):
+        raise HTTPException(status_code=400, detail="Template with this name exists")
+    return _template_doc_to_out(repo.create_template(payload.dict()))
+
+
+@router.get("/templates", response_model=list[TemplateOut])
+def list_templates(
+    _: dict = Depends(require_admin),
+    repo: Repository = Depends(get_repository),
+):
+    return [_template_doc_to_out(d) for d in repo.list_templates()]
+
+
+@router.delete("/templates/{template_id}")
+def delete_template(
+    template_id: str,
+    _: dict = Depends(require_admin),
+    repo: Repository = Depends(get_repository),
+):
+    if not repo.delete_template(template_id):
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"status": "ok"}
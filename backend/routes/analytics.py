@@ -0,0 +1,200 @@
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from ..auth.dependencies import require_teacher
+from ..schemas.analytics import (
+    DistributionOut,
+    ExamSummaryOut,
+    ExamTotalsOut,
+    HistogramBin,
+    QuestionStatsOut,
+    QuestionSummary,
+    StudentRankOut,
+    StudentTotalOut,
+    TotalsCheckOut,
+)
+from ..services import exports
+from ..storage import Repository, get_repository
+
+router = APIRouter()
+
+PERCENTILES = (25, 50, 75, 90)
+
+
+def _get_exam_or_404(repo: Repository, exam_id: str) -> dict:
+    if not repo.valid_id(exam_id):
+        raise HTTPException(status_code=400, detail="Invalid exam ID")
+    exam = repo.get_exam(exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return exam
+
+
+def _summary_doc_to_out(exam_id: str, doc: dict | None) -> ExamSummaryOut:
+    doc = doc or {}
+    students = doc.get("students", 0)
+    mean = doc.get("total_sum", 0) / students if students else 0.0
+    variance = doc.get("total_sq_sum", 0) / students - mean * mean if students else 0.0
+    questions = [
+        QuestionSummary(
+            question_label=q["label"],
+            count=q["count"],
+            average=q["sum"] / q["count"] if q["count"] else 0.0,
+        )
+        for q in doc.get("questions", {}).values()
+        if q.get("count")
+    ]
+    return ExamSummaryOut(
+        exam_id=exam_id,
+        students=students,
+        average_total=mean,
+        std_dev_total=math.sqrt(max(variance, 0.0)),
+        questions=sorted(questions, key=lambda q: q.question_label),
+    )
+
+
+@router.get("/exams/{exam_id}/summary", response_model=ExamSummaryOut)
+def exam_summary(
+    exam_id: str,
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    With Mongo this is a single document maintained on every marks write,
+    so the cost does not grow with the number of marks.
+    """
+    exam = _get_exam_or_404(repo, exam_id)
+    return _summary_doc_to_out(exam["id"], repo.exam_summary(exam["id"]))
+
+
+@router.post("/exams/{exam_id}/summary/rebuild", response_model=ExamSummaryOut)
+def rebuild_summary(
+    exam_id: str,
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    exam = _get_exam_or_404(repo, exam_id)
+    return _summary_doc_to_out(exam["id"], repo.rebuild_exam_summary(exam["id"]))
+
+
+@router.get("/exams/{exam_id}/totals", response_model=ExamTotalsOut)
+def exam_totals(
+    exam_id: str,
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Precomputed total of every student in the exam, highest first.
+    """
+    exam = _get_exam_or_404(repo, exam_id)
+    version, totals = repo.exam_totals(exam["id"])
+    return ExamTotalsOut(
+        exam_id=exam["id"],
+        version=version,
+        totals=[StudentTotalOut(**t) for t in totals],
+    )
+
+
+@router.post("/exams/{exam_id}/totals/check", response_model=TotalsCheckOut)
+def check_totals(
+    exam_id: str,
+    repair: bool = Query(False, description="Rebuild the totals if they are inconsistent"),
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    exam = _get_exam_or_404(repo, exam_id)
+    report = repo.check_exam_totals(exam["id"], repair=repair)
+    return TotalsCheckOut(exam_id=exam["id"], **report)
+
+
+@router.get("/exams/{exam_id}/rankings", response_model=list[StudentRankOut])
+def exam_rankings(
+    exam_id: str,
+    limit: int = Query(0, ge=0, description="Top N students, 0 for all"),
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    exam = _get_exam_or_404(repo, exam_id)
+    max_marks = exam.get("max_marks") or 0
+    return [
+        StudentRankOut(
+            **d,
+            percentage=d["total"] * 100.0 / max_marks if max_marks else None,
+        )
+        for d in repo.exam_rankings(exam["id"], limit=limit)
+    ]
+
+
+@router.get("/exams/{exam_id}/questions", response_model=list[QuestionStatsOut])
+def exam_question_stats(
+    exam_id: str,
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    exam = _get_exam_or_404(repo, exam_id)
+    return [QuestionStatsOut(**d) for d in repo.exam_question_stats(exam["id"])]
+
+
+@router.get("/exams/{exam_id}/distribution", response_model=DistributionOut)
+def exam_distribution(
+    exam_id: str,
+    bins: int = Query(10, ge=1, le=100),
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Percentiles (nearest rank) and a histogram of student totals,
+    computed by the storage backend.
+    """
+    exam = _get_exam_or_404(repo, exam_id)
+    max_marks = exam.get("max_marks") or 1
+    width = max_marks / bins
+    # Bins are [lower, upper); the last boundary is nudged so a full
+    # score lands in the top bin.
+    boundaries = [i * width for i in range(bins)] + [max_marks + 1e-9]
+    stats = repo.exam_distribution(exam["id"], boundaries, PERCENTILES)
+
+    return DistributionOut(
+        exam_id=exam["id"],
+        students=stats["students"],
+        percentiles={f"p{p}": value for p, value in stats["percentiles"].items()},
+        histogram=[
+            HistogramBin(
+                lower=boundaries[i],
+                upper=min(boundaries[i + 1], max_marks),
+                count=count,
+            )
+            for i, count in enumerate(stats["histogram"])
+        ],
+    )
+
+
+@router.get("/exams/{exam_id}/export")
+def export_marks(
+    exam_id: str,
+    fmt: str = Query("csv", alias="format", description="csv, parquet or arrow"),
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Every mark of the exam, one row per (student, question), streamed in
+    chunks straight from the database cursor. Parquet and Arrow need
+    pyarrow on the server.
+    """
+    exam = _get_exam_or_404(repo, exam_id)
+    if fmt not in exports.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"format must be one of {', '.join(exports.EXPORT_FORMATS)}",
+        )
+    if fmt in exports.ARROW_FORMATS and not exports.arrow_available():
+        raise HTTPException(status_code=501, detail=f"{fmt} export needs pyarrow on the server")
+
+    chunks = repo.iter_exam_marks(exam["id"], exports.EXPORT_CHUNK_SIZE)
+    return StreamingResponse(
+        exports.export_stream(chunks, fmt),
+        media_type=exports.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="marks_{exam["id"]}.{fmt}"'},
+    )
@@ -1,21 +1,19 @@
 from datetime import timedelta
 
-from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from pymongo.database import Database
 
 from ..auth.dependencies import authenticate_user, get_current_active_user, require_admin
 from ..auth.security import create_access_token, get_password_hash
-from ..database import get_db
 from ..schemas.auth import Token, UserCreate, UserOut
+from ..storage import Repository, get_repository
 
 router = APIRouter()
 
 
 def _user_doc_to_out(doc: dict) -> UserOut:
     return UserOut(
-        id=str(doc["_id"]),
+        id=doc["id"],
         username=doc["username"],
         full_name=doc.get("full_name"),
         email=doc["email"],
@@ -27,12 +25,10 @@ def _user_doc_to_out(doc: dict) -> UserOut:
 @router.post("/register", response_model=UserOut)
 def register_user(
     payload: UserCreate,
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
     _: dict = Depends(require_admin),
 ):
-    existing = db["users"].find_one(
-        {"$or": [{"username": payload.username}, {"email": payload.email}]}
-    )
+    existing = repo.find_user(payload.username, payload.email)
     if existing:
         raise HTTPException(status_code=400, detail="Username or email already exists")
 
@@ -44,16 +40,15 @@ def register_user(
         "hashed_password": get_password_hash(payload.password),
         "is_active": True,
     }
-    result = db["users"].insert_one(user_doc)
-    user_doc["_id"] = result.inserted_id
-    return _user_doc_to_out(user_doc)
+    return _user_doc_to_out(repo.create_user(user_doc))
 
 
 @router.post("/login", response_model=Token)
 def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Database = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    repo: Repository = Depends(get_repository),
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = authenticate_user(repo, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,18 +1,37 @@
+import asyncio
 import base64
-from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, Query, Body, UploadFile, File
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from pymongo.database import Database
 
-from ..auth.dependencies import require_teacher
-from ..database import get_db
-from ..ocr.service import run_ocr_on_base64_image
-from ..services.grid_excel import extract_grid_marks, append_marks_to_excel
+from .. import metrics
+from ..auth.dependencies import require_teacher, user_from_token
+from ..ocr.pool import pool_frame, run_ocr, run_ocr_on_frame
+from ..storage import Repository, get_repository
 from ..schemas.core import (
+    BulkRowError,
+    BulkSubmitMarksRequest,
+    BulkSubmitMarksResponse,
+    MarkFlag,
+    MarkItem,
     OCRScanResponse,
     SubmitMarksRequest,
     ExamOut,
     StudentOut,
+    TemplateOut,
 )
 
 router = APIRouter()
@@ -20,9 +39,9 @@ router = APIRouter()
 
 def _exam_doc_to_out(doc: dict) -> ExamOut:
     return ExamOut(
-        id=str(doc["_id"]),
+        id=doc["id"],
         name=doc["name"],
-        subject_id=str(doc["subject_id"]),
+        subject_id=doc["subject_id"],
         max_marks=doc["max_marks"],
         date=doc["date"],
     )
@@ -30,7 +49,7 @@ def _exam_doc_to_out(doc: dict) -> ExamOut:
 
 def _student_doc_to_out(doc: dict) -> StudentOut:
     return StudentOut(
-        id=str(doc["_id"]),
+        id=doc["id"],
         roll_number=doc["roll_number"],
         name=doc["name"],
         department=doc.get("department"),
@@ -39,29 +58,53 @@ def _student_doc_to_out(doc: dict) -> StudentOut:
     )
 
 
+def _template_doc_to_out(doc: dict) -> TemplateOut:
+    return TemplateOut(
+        id=doc["id"],
+        name=doc["name"],
+        width=doc["width"],
+        height=doc["height"],
+        cells=doc["cells"],
+        fiducials=doc.get("fiducials") or [],
+        roll_number=doc.get("roll_number"),
+    )
+
+
 @router.get("/exams", response_model=list[ExamOut])
 def list_exams_for_teacher(
     _: dict = Depends(require_teacher),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
 ):
-    return [_exam_doc_to_out(d) for d in db["exams"].find()]
+    return [_exam_doc_to_out(d) for d in repo.list_exams()]
 
 
 @router.get("/students", response_model=list[StudentOut])
 def search_students(
     search: str = Query("", description="Search by roll number or name"),
     _: dict = Depends(require_teacher),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
+):
+    return [_student_doc_to_out(d) for d in repo.list_students(search)]
+
+
+@router.get("/capture-format")
+def capture_format(_: dict = Depends(require_teacher)):
+    """
+    Image formats the scanner should send, best first, and the quality to
+    encode them at. JPEG/WebP captures are a fraction of a PNG's size and
+    are decoded straight from the buffer.
+    """
+    from ..ocr.codecs import capture_settings
+
+    return capture_settings()
+
+
+@router.get("/templates", response_model=list[TemplateOut])
+def list_templates_for_teacher(
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
 ):
-    query: dict = {}
-    if search:
-        query = {
-            "$or": [
-                {"roll_number": {"$regex": search, "$options": "i"}},
-                {"name": {"$regex": search, "$options": "i"}},
-            ]
-        }
-    return [_student_doc_to_out(d) for d in db["students"].find(query)]
+    return [_template_doc_to_out(d) for d in repo.list_templates()]
 
 
 class ScanRequest(BaseModel):
@@ -69,72 +112,619 @@ class ScanRequest(BaseModel):
 
 
 @router.post("/scan", response_model=OCRScanResponse)
-def scan_marks(
+async def scan_marks(
     payload: ScanRequest,
     _: dict = Depends(require_teacher),
 ):
-    entries = run_ocr_on_base64_image(payload.image_base64)
+    from ..ocr.service import decode_base64_image, extract_marks_from_frame
+
+    # Decoded here so the decode metrics stay in this process
+    image = await run_in_threadpool(decode_base64_image, payload.image_base64)
+    entries = await run_ocr_on_frame(extract_marks_from_frame, image)
     return OCRScanResponse(entries=entries)
 
 
 class GridScanResponse(BaseModel):
     marks: list[int]
     total: int
-    excel_file: str
+    # Whole workbook, base64 ("full" responses only)
+    excel_file: str | None = None
+    # Per-cell OCR confidence (0-1) and the cells that were read again
+    # because the first read was not confident enough
+    confidence: list[float] = []
+    retried: list[int] = []
+    # Marks under the template's question labels, for template scans
+    entries: list[MarkItem] = []
+    # Server-kept workbook ("delta" responses, or when workbook_id was sent)
+    workbook_id: str | None = None
+    etag: str | None = None
+    # Sheet row the marks were written to
+    row: int | None = None
+    # Roll number read from the sheet and the student it belongs to
+    roll_number: str | None = None
+    student: StudentOut | None = None
+    # Whether the marks were saved for that student (when exam_id was sent)
+    stored: bool | None = None
+    # Cells worth checking by hand, see services.validation
+    flags: list[MarkFlag] = []
+    # The sheet was scanned before: its earlier result, nothing appended
+    duplicate: bool | None = None
+
+
+class SheetScan(BaseModel):
+    box: list[int]  # x, y, width, height of the grid in the photo
+    marks: list[int]
+    total: int
+    confidence: list[float] = []
+    retried: list[int] = []
+    flags: list[MarkFlag] = []
+
+
+class MultiGridScanResponse(BaseModel):
+    sheets: list[SheetScan]
+    excel_file: str | None = None
+    workbook_id: str | None = None
+    etag: str | None = None
+    # Sheet row of the first sheet; the others follow
+    row: int | None = None
+
 
+def _scan_response_mode(response: str | None, accept: str | None) -> str:
+    from ..services.workbooks import RESPONSE_MODES, response_mode
 
-@router.post("/scan-grid-excel", response_model=GridScanResponse)
-def scan_grid_and_append_excel(
+    mode = response_mode(response, accept)
+    if mode is None:
+        raise HTTPException(
+            status_code=400, detail=f"response must be one of {', '.join(RESPONSE_MODES)}"
+        )
+    return mode
+
+
+async def _append_to_workbook(
+    repo: Repository,
+    owner: str,
+    mode: str,
+    rows: list[list[int]],
+    labels: list[str] | None,
+    excel_file: str | None,
+    workbook_id: str | None,
+) -> dict:
+    """
+    Write the scanned rows as the response mode asks. Returns the totals
+    and the workbook fields of the response (excel_file, workbook_id,
+    etag, row). With workbook_id the server-kept workbook is updated
+    (re-read and re-appended if another scan wrote it meanwhile);
+    otherwise excel_file, or a new workbook, is the starting point.
+    """
+    from ..services.grid_excel import append_rows_to_workbook
+    from ..services.workbooks import WORKBOOK_WRITE_ATTEMPTS, etag
+
+    if mode == "marks":
+        return {"totals": [sum(marks) for marks in rows]}
+
+    if workbook_id is None:
+        # excel_file comes as base64 string if provided
+        excel_bytes = None
+        if excel_file:
+            if "," in excel_file:
+                _, excel_file = excel_file.split(",", 1)
+            excel_bytes = base64.b64decode(excel_file)
+        totals, first_row, content = await run_in_threadpool(
+            append_rows_to_workbook, rows, excel_content=excel_bytes, labels=labels
+        )
+        result = {"totals": totals, "row": first_row}
+        if mode == "delta":
+            tag = etag(content)
+            doc = await run_in_threadpool(repo.create_workbook, owner, content, tag)
+            result.update(workbook_id=doc["id"], etag=tag)
+        else:
+            result["excel_file"] = base64.b64encode(content).decode("utf-8")
+        return result
+
+    for _ in range(WORKBOOK_WRITE_ATTEMPTS):
+        stored = await run_in_threadpool(repo.get_workbook, workbook_id)
+        if stored is None or stored["owner"] != owner:
+            raise HTTPException(status_code=404, detail="Workbook not found")
+        totals, first_row, content = await run_in_threadpool(
+            append_rows_to_workbook, rows, excel_content=stored["content"], labels=labels
+        )
+        tag = etag(content)
+        if await run_in_threadpool(repo.update_workbook, workbook_id, content, tag, stored["etag"]):
+            result = {"totals": totals, "row": first_row, "workbook_id": workbook_id, "etag": tag}
+            if mode == "full":
+                result["excel_file"] = base64.b64encode(content).decode("utf-8")
+            return result
+    raise HTTPException(status_code=409, detail="The workbook is being updated by another scan, try again")
+
+
+@router.post(
+    "/scan-grid-excel", response_model=GridScanResponse, response_model_exclude_none=True
+)
+async def scan_grid_and_append_excel(
     image_base64: str = Body(..., embed=True),
     excel_file: str | None = Body(None, embed=True),
     rows: int = Body(4, embed=True),
     cols: int = Body(2, embed=True),
+    force: bool = Body(False, embed=True),
+    template_id: str | None = Body(None, embed=True),
+    workbook_id: str | None = Body(None, embed=True),
+    exam_id: str | None = Body(None, embed=True),
+    max_marks: list[int | None] | None = Body(None, embed=True),
+    rescan: bool = Body(False, embed=True),
+    response: str | None = Query(None, description="full, delta or marks"),
+    accept: str | None = Header(None),
+    user: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Read the marks grid of one sheet and append it to the Excel file.
+    With template_id, the cells come from the registered layout instead
+    of rows/cols and are returned under their question labels.
+
+    The marks are checked against the per-question max_marks (one per
+    cell, or the template's) and the exam's max_marks: impossible values
+    are clamped, and they and other doubtful cells come back as flags
+    with alternative readings.
+
+    A sheet scanned before (for the same exam, workbook or teacher) is
+    not read nor appended again: its earlier result comes back with
+    duplicate=true. rescan=true reads it anyway.
+
+    A roll number on the sheet (after a "Roll No" label, or in the
+    template's roll number field) is looked up among the students. With
+    exam_id, the marks of a student found that way are saved for the
+    exam too, when the roll number was read confidently.
+
+    The response mode (?response= or an application/vnd.marks.<mode>+json
+    Accept type) decides what comes back: the full workbook (default),
+    only the appended row with the workbook kept server-side (delta), or
+    the marks alone without touching any workbook (marks).
+    """
+    mode = _scan_response_mode(response, accept)
+
+    _check_max_marks(max_marks, rows, cols, template_id)
+    exam = await _get_exam_or_error(repo, exam_id) if exam_id is not None else None
+    # The teacher's own scope, not the workbook's: the first delta scan
+    # has no workbook_id yet, and retakes of it must still be found
+    scope = f"exam:{exam_id}" if exam_id is not None else f"user:{user['username']}"
+    result = await _read_sheet(
+        repo, image_base64, rows, cols, template_id, force, max_marks, scope, rescan
+    )
+    labels = result.get("labels")
+    flags = _check_sheet(result, None, exam)
+
+    student, stored = await _link_student(repo, result, exam_id, flags)
+
+    if result.get("duplicate"):
+        workbook = {"totals": [sum(result["marks"])], "workbook_id": workbook_id}
+    else:
+        workbook = await _append_to_workbook(
+            repo, user["username"], mode, [result["marks"]], labels, excel_file, workbook_id
+        )
+    
+    return GridScanResponse(
+        marks=result["marks"], 
+        total=workbook["totals"][0], 
+        excel_file=workbook.get("excel_file"),
+        confidence=result["confidence"],
+        retried=result["retried"],
+        entries=[
+            MarkItem(question_label=label, marks=marks)
+            for label, marks in zip(labels or [], result["marks"])
+        ],
+        workbook_id=workbook.get("workbook_id"),
+        etag=workbook.get("etag"),
+        row=workbook.get("row"),
+        roll_number=result.get("roll_number"),
+        student=_student_doc_to_out(student) if student else None,
+        stored=stored,
+        flags=flags,
+        duplicate=result.get("duplicate"),
+    )
+
+
+async def _get_exam_or_error(repo: Repository, exam_id: str) -> dict:
+    if not repo.valid_id(exam_id):
+        raise HTTPException(status_code=400, detail="Invalid exam ID")
+    exam = await run_in_threadpool(repo.get_exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    return exam
+
+
+async def _read_sheet(
+    repo: Repository,
+    image_base64: str,
+    rows: int,
+    cols: int,
+    template_id: str | None,
+    force: bool,
+    max_marks: list[int | None] | None = None,
+    scope: str | None = None,
+    rescan: bool = False,
+    source: str = "grid",
+) -> dict:
+    """
+    Decode one sheet, check the photo and read it, on the template's
+    layout when template_id is given, else as a rows x cols grid whose
+    cells hold at most max_marks. Returns the OCR result (see
+    extract_grid_marks_from_frame / extract_template_marks_from_frame);
+    anything that stops the read is raised as an HTTPException.
+
+    With a scope, the sheet's fingerprint is looked up first: the result
+    of an earlier scan of the same sheet in that scope is returned with
+    "duplicate": True and no OCR (unless rescan). Read sheets are added.
+    """
+    from ..ocr import quality
+    from ..ocr.fingerprint import header_size, sheet_fingerprint_from_frame
+    from ..services import scan_dedup
+    from ..services.grid_excel import (
+        decode_scan,
+        extract_grid_marks_from_frame,
+        extract_template_marks_from_frame,
+    )
+
+    template = None
+    if template_id:
+        template = await run_in_threadpool(repo.get_template, template_id)
+        if template is None:
+            raise HTTPException(status_code=404, detail="Template not found")
+
+    try:
+        # Decode once here; workers read the pixels from shared memory
+        img_bytes, image = await run_in_threadpool(decode_scan, image_base64, source)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"OCR Warning: {str(e)}")
+
+    # Turn away blurry, badly lit or grid-less photos before paying for OCR.
+    # force=true skips the check (e.g. sheets without ruled lines).
+    if not force:
+        # Template forms are located through their markers, ruled or not
+        report = await run_in_threadpool(quality.gate, image, source, template is None)
+        if not report.ok:
+            raise HTTPException(
+                status_code=422,
+                detail=quality.REJECT_MESSAGES[report.reason],
+                headers={"X-Scan-Reject-Reason": report.reason},
+            )
+
+    # One shared-memory copy of the pixels for the fingerprint and the OCR
+    with pool_frame(image) as frame:
+        fingerprint = None
+        if scope is not None and scan_dedup.SCAN_DEDUP:
+            # Layouts are kept apart: the same cells mean nothing across them
+            scope = f"{scope}:{template_id or f'{rows}x{cols}'}"
+            fingerprint, elapsed_ms = await run_ocr(
+                sheet_fingerprint_from_frame, frame, rows, cols, template
+            )
+            metrics.observe("scan_fingerprint_ms", elapsed_ms)
+            if fingerprint is not None and not rescan:
+                cached = await run_in_threadpool(
+                    scan_dedup.lookup, repo, scope, fingerprint, header_size(template)
+                )
+                if cached is not None:
+                    if not template:
+                        cached["max_marks"] = max_marks
+                    return {**cached, "duplicate": True}
+
+        # Use provided rows/cols
+        try:
+            if template:
+                result = await run_ocr(extract_template_marks_from_frame, frame, template)
+            else:
+                result = await run_ocr(
+                    extract_grid_marks_from_frame,
+                    frame,
+                    img_bytes,
+                    rows=rows,
+                    cols=cols,
+                    max_marks=max_marks,
+                )
+        except Exception as e:
+            if "Tesseract" in str(e):
+                 raise HTTPException(status_code=500, detail="Server Error: Tesseract OCR is not installed. Please install Tesseract-OCR to use scanning.")
+            raise HTTPException(status_code=500, detail=f"OCR Warning: {str(e)}")
+
+    if result is None:
+        raise HTTPException(
+            status_code=422,
+            detail=quality.REJECT_MESSAGES["not_registered"],
+            headers={"X-Scan-Reject-Reason": "not_registered"},
+        )
+    if fingerprint is not None:
+        await run_in_threadpool(
+            scan_dedup.remember, repo, scope, fingerprint, result, header_size(template)
+        )
+    return result
+
+
+def _entries(result: dict, labels: list[str] | None = None) -> list[MarkItem]:
+    """The marks under their question labels: the template's, labels, else Q1, Q2..."""
+    labels = result.get("labels") or labels or [f"Q{i + 1}" for i in range(len(result["marks"]))]
+    return [MarkItem(question_label=l, marks=m) for l, m in zip(labels, result["marks"])]
+
+
+def _check_max_marks(
+    max_marks: list[int | None] | None, rows: int, cols: int, template_id: str | None
+) -> None:
+    if max_marks is None:
+        return
+    if template_id:
+        raise HTTPException(
+            status_code=400, detail="max_marks comes from the template, do not send it"
+        )
+    if len(max_marks) != rows * cols:
+        raise HTTPException(status_code=400, detail=f"Give {rows * cols} max_marks, one per cell")
+    if any(limit is not None and limit < 0 for limit in max_marks):
+        raise HTTPException(status_code=400, detail="max_marks cannot be negative")
+
+
+def _check_sheet(result: dict, labels: list[str] | None, exam: dict | None) -> list[MarkFlag]:
+    """
+    Flags of services.validation for one sheet, against its per-question
+    max_marks and the exam's. Impossible marks are clamped in result.
+    """
+    from ..services.grid_excel import OCR_MIN_CONFIDENCE
+    from ..services.validation import check_marks
+
+    flags = check_marks(
+        result,
+        [entry.question_label for entry in _entries(result, labels)],
+        result.get("max_marks"),
+        exam.get("max_marks") if exam else None,
+        OCR_MIN_CONFIDENCE,
+    )
+    return [MarkFlag(**flag) for flag in flags]
+
+
+def _blocking(flags: list[MarkFlag]) -> list[MarkFlag]:
+    """Flags that make the marks impossible to save for the exam."""
+    from ..services.validation import BLOCKING_REASONS
+
+    return [flag for flag in flags if flag.reason in BLOCKING_REASONS]
+
+
+async def _link_student(
+    repo: Repository, result: dict, exam_id: str | None, flags: list[MarkFlag]
+) -> tuple[dict | None, bool | None]:
+    """
+    The student whose roll number was read on the sheet, and whether the
+    marks were saved for them (None when no exam_id was given). Marks are
+    only saved when the roll number was read with OCR_MIN_CONFIDENCE, a
+    misread one could belong to another student, and when no flag makes
+    them impossible for the exam.
+    """
+    from ..services import roll_index
+    from ..services.grid_excel import OCR_MIN_CONFIDENCE
+
+    roll = result.get("roll_number")
+    student = await run_in_threadpool(roll_index.lookup, repo, roll) if roll else None
+    if exam_id is None:
+        return student, None
+    if student is None or (result.get("roll_confidence") or 0.0) < OCR_MIN_CONFIDENCE:
+        return student, False
+    if _blocking(flags):
+        return student, False
+
+    report = await run_in_threadpool(
+        repo.bulk_upsert_marks, exam_id, [(0, student["id"], _entries(result))]
+    )
+    return student, not report["errors"]
+
+
+class ScanToMarksResponse(BaseModel):
+    status: str = "ok"
+    student_id: str
+    roll_number: str | None = None
+    total: int
+    # Number of marks written
+    saved: int
+    # Questions whose marks were read with low confidence, worth a look
+    uncertain: list[str] = []
+    # Cells worth checking by hand, see services.validation
+    flags: list[MarkFlag] = []
+    # The sheet was scanned before: its earlier result was saved again
+    duplicate: bool | None = None
+
+
+@router.post("/scan-marks", response_model=ScanToMarksResponse, response_model_exclude_none=True)
+async def scan_to_marks(
+    image_base64: str = Body(..., embed=True),
+    exam_id: str = Body(..., embed=True),
+    student_id: str | None = Body(None, embed=True),
+    template_id: str | None = Body(None, embed=True),
+    rows: int = Body(4, embed=True),
+    cols: int = Body(2, embed=True),
+    labels: list[str] | None = Body(None, embed=True),
+    max_marks: list[int | None] | None = Body(None, embed=True),
+    force: bool = Body(False, embed=True),
+    rescan: bool = Body(False, embed=True),
     _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
 ):
-    # excel_file comes as base64 string if provided
-    excel_bytes = None
-    if excel_file:
-        if "," in excel_file:
-            _, excel_file = excel_file.split(",", 1)
-        excel_bytes = base64.b64decode(excel_file)
-
-    # Use provided rows/cols
+    """
+    One sheet straight into the marks of an exam, with no workbook and
+    no second request: the sheet is read (on template_id's layout, or as
+    a rows x cols grid whose cells are named by labels, default Q1, Q2...),
+    checked against the per-question max_marks (the template's, or one
+    per cell) and the exam's max_marks, and upserted for the student.
+    The student is student_id, or the one whose roll number is written
+    on the sheet. Marks above their question's maximum are clamped and
+    flagged; nothing is saved when the total is above the exam's (422).
+    A sheet already scanned for the exam is not read again (duplicate,
+    unless rescan): its earlier result is saved.
+    """
+    from ..services import roll_index
+    from ..services.grid_excel import OCR_MIN_CONFIDENCE
+
+    exam = await _get_exam_or_error(repo, exam_id)
+    if labels is not None and not template_id:
+        if len(labels) != rows * cols:
+            raise HTTPException(status_code=400, detail=f"Give {rows * cols} labels, one per cell")
+        if len(set(labels)) != len(labels):
+            raise HTTPException(status_code=400, detail="Labels must be unique")
+    _check_max_marks(max_marks, rows, cols, template_id)
+    student = None
+    if student_id is not None:
+        if not repo.valid_id(student_id):
+            raise HTTPException(status_code=400, detail="Invalid student ID")
+        student = await run_in_threadpool(repo.get_student, student_id)
+        if not student:
+            raise HTTPException(status_code=404, detail="Student not found")
+
+    # A sheet scanned for another student is never theirs, whatever it looks like
+    scope = f"exam:{exam['id']}" + (f":student:{student['id']}" if student else "")
+    result = await _read_sheet(
+        repo, image_base64, rows, cols, template_id, force, max_marks, scope, rescan
+    )
+
+    roll = result.get("roll_number")
+    if student is None:
+        if not roll:
+            raise HTTPException(
+                status_code=422, detail="No roll number found on the sheet, send student_id"
+            )
+        if (result.get("roll_confidence") or 0.0) < OCR_MIN_CONFIDENCE:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Roll number {roll} could not be read with confidence, send student_id",
+            )
+        student = await run_in_threadpool(roll_index.lookup, repo, roll)
+        if student is None:
+            raise HTTPException(status_code=422, detail=f"No student with roll number {roll}")
+
+    labels = None if template_id else labels
+    flags = _check_sheet(result, labels, exam)
+    blocking = _blocking(flags)
+    if blocking:
+        raise HTTPException(status_code=422, detail="; ".join(flag.detail for flag in blocking))
+    entries = _entries(result, labels)
+
+    report = await run_in_threadpool(
+        repo.bulk_upsert_marks, exam["id"], [(0, student["id"], entries)]
+    )
+    if report["errors"]:
+        raise HTTPException(
+            status_code=500, detail=f"Marks could not be saved: {report['errors'][0]}"
+        )
+
+    return ScanToMarksResponse(
+        student_id=student["id"],
+        roll_number=student.get("roll_number"),
+        total=sum(entry.marks for entry in entries),
+        saved=len(entries),
+        uncertain=[
+            entry.question_label
+            for entry, conf in zip(entries, result["confidence"])
+            if conf < OCR_MIN_CONFIDENCE
+        ],
+        flags=flags,
+        duplicate=result.get("duplicate"),
+    )
+
+
+@router.post(
+    "/scan-multi-grid-excel",
+    response_model=MultiGridScanResponse,
+    response_model_exclude_none=True,
+)
+async def scan_multi_grid_and_append_excel(
+    image_base64: str = Body(..., embed=True),
+    excel_file: str | None = Body(None, embed=True),
+    rows: int = Body(4, embed=True),
+    cols: int = Body(2, embed=True),
+    force: bool = Body(False, embed=True),
+    workbook_id: str | None = Body(None, embed=True),
+    response: str | None = Query(None, description="full, delta or marks"),
+    accept: str | None = Header(None),
+    user: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Several answer sheets in one photo: every rows x cols grid found is
+    read from a single Vision call and appended as its own Excel row,
+    in reading order (top to bottom, left to right). Response modes as
+    for /scan-grid-excel.
+    """
+    from ..ocr import quality
+    from ..services.grid_excel import decode_scan, extract_multi_grid_marks_from_frame
+
+    mode = _scan_response_mode(response, accept)
+
     try:
-        marks = extract_grid_marks(image_base64, rows=rows, cols=cols)
+        img_bytes, image = await run_in_threadpool(decode_scan, image_base64, "multi_grid")
     except Exception as e:
-        if "Tesseract" in str(e):
-             raise HTTPException(status_code=500, detail="Server Error: Tesseract OCR is not installed. Please install Tesseract-OCR to use scanning.")
         raise HTTPException(status_code=500, detail=f"OCR Warning: {str(e)}")
 
-    total, updated_excel_bytes = append_marks_to_excel(marks, excel_content=excel_bytes)
-    
-    updated_excel_b64 = base64.b64encode(updated_excel_bytes).decode("utf-8")
-    
-    return GridScanResponse(
-        marks=marks, 
-        total=total, 
-        excel_file=updated_excel_b64
+    # Grids are looked for below, with a detector suited to small ones
+    if not force:
+        report = await run_in_threadpool(quality.gate, image, "multi_grid", False)
+        if not report.ok:
+            raise HTTPException(
+                status_code=422,
+                detail=quality.REJECT_MESSAGES[report.reason],
+                headers={"X-Scan-Reject-Reason": report.reason},
+            )
+
+    try:
+        sheets = await run_ocr_on_frame(
+            extract_multi_grid_marks_from_frame, image, img_bytes, rows=rows, cols=cols
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"OCR Warning: {str(e)}")
+    if not sheets:
+        raise HTTPException(
+            status_code=422,
+            detail=quality.REJECT_MESSAGES["no_grid"],
+            headers={"X-Scan-Reject-Reason": "no_grid"},
+        )
+
+    # Clamps impossible marks before they are written
+    sheet_flags = [_check_sheet(s, None, None) for s in sheets]
+    workbook = await _append_to_workbook(
+        repo, user["username"], mode, [s["marks"] for s in sheets], None, excel_file, workbook_id
     )
 
+    return MultiGridScanResponse(
+        sheets=[
+            SheetScan(
+                box=s["box"],
+                marks=s["marks"],
+                total=total,
+                confidence=s["confidence"],
+                retried=s["retried"],
+                flags=flags,
+            )
+            for s, flags, total in zip(sheets, sheet_flags, workbook["totals"])
+        ],
+        excel_file=workbook.get("excel_file"),
+        workbook_id=workbook.get("workbook_id"),
+        etag=workbook.get("etag"),
+        row=workbook.get("row"),
+    )
 
-@router.post("/scan-crop-excel", response_model=GridScanResponse)
-def scan_crop_and_append_excel(
+
+@router.post(
+    "/scan-crop-excel", response_model=GridScanResponse, response_model_exclude_none=True
+)
+async def scan_crop_and_append_excel(
     image_base64: str = Body(..., embed=True),
     excel_file: str | None = Body(None, embed=True),
-    _: dict = Depends(require_teacher),
+    workbook_id: str | None = Body(None, embed=True),
+    response: str | None = Query(None, description="full, delta or marks"),
+    accept: str | None = Header(None),
+    user: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
 ):
-    # excel_file comes as base64 string if provided
-    excel_bytes = None
-    if excel_file:
-        if "," in excel_file:
-            _, excel_file = excel_file.split(",", 1)
-        excel_bytes = base64.b64decode(excel_file)
-
-    from ..services.grid_excel import extract_single_mark
+    from ..services.grid_excel import decode_scan, extract_single_mark_from_frame
+
+    mode = _scan_response_mode(response, accept)
     
     # Run OCR on single crop
     try:
-        mark = extract_single_mark(image_base64)
+        # Decoded here so the decode metrics stay in this process
+        img_bytes, image = await run_in_threadpool(decode_scan, image_base64, "crop")
+        mark = await run_ocr_on_frame(extract_single_mark_from_frame, image, img_bytes)
     except Exception as e:
          raise HTTPException(status_code=500, detail=f"OCR Error: {str(e)}")
 
@@ -142,51 +732,192 @@ def scan_crop_and_append_excel(
     # Note: If existing logic blindly sums, it works: sum([mark]) = mark
     marks_list = [mark]
     
-    total, updated_excel_bytes = append_marks_to_excel(marks_list, excel_content=excel_bytes)
-    
-    updated_excel_b64 = base64.b64encode(updated_excel_bytes).decode("utf-8")
+    workbook = await _append_to_workbook(
+        repo, user["username"], mode, [marks_list], None, excel_file, workbook_id
+    )
     
     return GridScanResponse(
         marks=marks_list, 
-        total=total, 
-        excel_file=updated_excel_b64
+        total=workbook["totals"][0], 
+        excel_file=workbook.get("excel_file"),
+        workbook_id=workbook.get("workbook_id"),
+        etag=workbook.get("etag"),
+        row=workbook.get("row"),
     )
 
 
+@router.get("/workbooks/{workbook_id}")
+def download_workbook(
+    workbook_id: str,
+    if_none_match: str | None = Header(None),
+    user: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    The server-kept workbook of delta scans. Send the last ETag in
+    If-None-Match to get a bodyless 304 while nothing was appended.
+    """
+    from ..services.workbooks import XLSX_MEDIA_TYPE
+
+    doc = repo.get_workbook(workbook_id)
+    if doc is None or doc["owner"] != user["username"]:
+        raise HTTPException(status_code=404, detail="Workbook not found")
+    headers = {"ETag": doc["etag"], "Cache-Control": "private, no-cache"}
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or doc["etag"] in tags:
+            return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = 'attachment; filename="marks.xlsx"'
+    return Response(content=doc["content"], media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+
+@router.websocket("/live-scan")
+async def live_scan(
+    websocket: WebSocket,
+    token: str = Query(""),
+    rows: int = Query(4, ge=1, le=10),
+    cols: int = Query(2, ge=1, le=6),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Live scanning from a camera. The client sends frames as binary JPEG
+    messages and gets a {"type": "status"} message back for each one.
+    Full OCR runs once per sheet, on the sharpest of the frames it was
+    held still for, and its {"type": "result"} message is pushed as soon
+    as it is ready. Browsers cannot set headers here, so the access
+    token comes as the token query parameter.
+    """
+    user = await run_in_threadpool(user_from_token, repo, token)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    from ..services.grid_excel import decode_image_bytes, extract_grid_marks_from_frame
+    from ..services.live_scan import LiveScanSession, measure
+
+    session = LiveScanSession(rows, cols)
+    send_lock = asyncio.Lock()
+    scans: set[asyncio.Task] = set()
+
+    async def send(message: dict) -> None:
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def scan(sheet: int, data: bytes) -> None:
+        ok = False
+        try:
+            image = await run_in_threadpool(decode_image_bytes, data, "live")
+            result = await run_ocr_on_frame(
+                extract_grid_marks_from_frame, image, data, rows=rows, cols=cols
+            )
+            ok = True
+            metrics.increment("live_scan_ocr_total", {"outcome": "ok"})
+            # The fields the HTTP grid scan exposes, not the internal ones
+            await send({
+                "type": "result",
+                "sheet": sheet,
+                "marks": result["marks"],
+                "total": sum(result["marks"]),
+                "confidence": result["confidence"],
+                "retried": result["retried"],
+                "roll_number": result.get("roll_number"),
+            })
+        except Exception as e:
+            metrics.increment("live_scan_ocr_total", {"outcome": "error"})
+            await send({"type": "error", "sheet": sheet, "detail": f"OCR Error: {str(e)}"})
+        finally:
+            session.finish(sheet, ok)
+
+    try:
+        while True:
+            data = await websocket.receive_bytes()
+            # Only the image work leaves the loop: the session is changed
+            # here alone, never at the same time as finish() or take_scan()
+            measured = await run_in_threadpool(measure, data)
+            frame_status = session.observe(data, measured)
+            accepted = "true" if frame_status["accepted"] else "false"
+            metrics.increment("live_scan_frames_total", {"accepted": accepted})
+            await send({"type": "status", **frame_status})
+
+            ready = session.take_scan()
+            if ready is not None:
+                task = asyncio.create_task(scan(*ready))
+                scans.add(task)
+                task.add_done_callback(scans.discard)
+    except (WebSocketDisconnect, KeyError):
+        # KeyError: a text message where a frame was expected
+        pass
+    finally:
+        for task in scans:
+            task.cancel()
+
+
 
 @router.post("/submit-marks")
 def submit_marks(
     payload: SubmitMarksRequest,
     _: dict = Depends(require_teacher),
-    db: Database = Depends(get_db),
+    repo: Repository = Depends(get_repository),
 ):
-    try:
-        student_oid = ObjectId(payload.student_id)
-        exam_oid = ObjectId(payload.exam_id)
-    except Exception:
+    if not repo.valid_id(payload.student_id) or not repo.valid_id(payload.exam_id):
         raise HTTPException(status_code=400, detail="Invalid student or exam ID")
 
-    student = db["students"].find_one({"_id": student_oid})
+    student = repo.get_student(payload.student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    exam = db["exams"].find_one({"_id": exam_oid})
+    exam = repo.get_exam(payload.exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
 
-    db["marks"].delete_many({"student_id": student_oid, "exam_id": exam_oid})
-
-    if payload.entries:
-        db["marks"].insert_many(
-            [
-                {
-                    "student_id": student_oid,
-                    "exam_id": exam_oid,
-                    "question_label": entry.question_label,
-                    "marks": entry.marks,
-                }
-                for entry in payload.entries
-            ]
-        )
+    repo.replace_student_marks(payload.student_id, payload.exam_id, payload.entries)
 
     return {"status": "ok"}
 
+
+@router.post("/submit-marks/bulk", response_model=BulkSubmitMarksResponse)
+def submit_marks_bulk(
+    payload: BulkSubmitMarksRequest,
+    _: dict = Depends(require_teacher),
+    repo: Repository = Depends(get_repository),
+):
+    if not repo.valid_id(payload.exam_id):
+        raise HTTPException(status_code=400, detail="Invalid exam ID")
+    if not repo.get_exam(payload.exam_id):
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    errors: list[BulkRowError] = []
+    candidates = []
+    for index, row in enumerate(payload.rows):
+        if repo.valid_id(row.student_id):
+            candidates.append(index)
+        else:
+            errors.append(
+                BulkRowError(index=index, student_id=row.student_id, detail="Invalid student ID")
+            )
+
+    # One round trip to validate every student in the payload
+    known = repo.existing_student_ids([payload.rows[i].student_id for i in candidates])
+
+    rows = []
+    for index in candidates:
+        row = payload.rows[index]
+        if row.student_id not in known:
+            errors.append(
+                BulkRowError(index=index, student_id=row.student_id, detail="Student not found")
+            )
+        else:
+            rows.append((index, row.student_id, row.entries))
+
+    result = repo.bulk_upsert_marks(payload.exam_id, rows)
+    for index, detail in result["errors"].items():
+        errors.append(
+            BulkRowError(index=index, student_id=payload.rows[index].student_id, detail=detail)
+        )
+
+    return BulkSubmitMarksResponse(
+        matched=result["matched"],
+        upserted=result["upserted"],
+        modified=result["modified"],
+        errors=sorted(errors, key=lambda e: e.index),
+    )
@@ -0,0 +1,69 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class QuestionSummary(BaseModel):
+    question_label: str
+    count: int
+    average: float
+
+
+class ExamSummaryOut(BaseModel):
+    exam_id: str
+    students: int
+    average_total: float
+    std_dev_total: float
+    questions: List[QuestionSummary]
+
+
+class StudentRankOut(BaseModel):
+    rank: int
+    student_id: str
+    roll_number: Optional[str] = None
+    name: Optional[str] = None
+    total: int
+    percentage: Optional[float] = None
+
+
+class QuestionStatsOut(BaseModel):
+    question_label: str
+    count: int
+    average: float
+    min: int
+    max: int
+    std_dev: float
+
+
+class HistogramBin(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+
+class DistributionOut(BaseModel):
+    exam_id: str
+    students: int
+    percentiles: Dict[str, float]
+    histogram: List[HistogramBin]
+
+
+class StudentTotalOut(BaseModel):
+    student_id: str
+    total: int
+    questions: int
+
+
+class ExamTotalsOut(BaseModel):
+    exam_id: str
+    version: int
+    totals: List[StudentTotalOut]
+
+
+class TotalsCheckOut(BaseModel):
+    exam_id: str
+    checked: int
+    missing: int
+    stale: int
+    mismatched: int
+    repaired: bool
@@ -23,6 +23,20 @@ class StudentOut(StudentBase):
         orm_mode = True
 
 
+class RosterRowError(BaseModel):
+    row: int  # line in the CSV / row in the sheet, header is row 1
+    roll_number: Optional[str] = None
+    detail: str
+
+
+class RosterImportResponse(BaseModel):
+    rows: int = 0
+    inserted: int = 0
+    errors: List[RosterRowError] = []
+    seconds: float = 0.0
+    rows_per_second: float = 0.0
+
+
 class TeacherBase(BaseModel):
     name: str
     department: Optional[str] = None
@@ -74,11 +88,74 @@ class ExamOut(ExamBase):
         orm_mode = True
 
 
+class TemplateCell(BaseModel):
+    # Rectangle in template coordinates (the units of the page width/height)
+    label: str
+    x: float
+    y: float
+    width: float
+    height: float
+    max_marks: Optional[int] = None
+
+
+class TemplateFiducial(BaseModel):
+    # Center and side of a solid square marker printed on the form
+    x: float
+    y: float
+    size: float
+
+
+class TemplateRegion(BaseModel):
+    x: float
+    y: float
+    width: float
+    height: float
+
+
+class TemplateBase(BaseModel):
+    name: str
+    width: float
+    height: float
+    cells: List[TemplateCell]
+    fiducials: List[TemplateFiducial] = []
+    # Where the student writes their roll number, if the form has a field for it
+    roll_number: Optional[TemplateRegion] = None
+
+
+class TemplateCreate(TemplateBase):
+    pass
+
+
+class TemplateOut(TemplateBase):
+    id: str
+
+    class Config:
+        orm_mode = True
+
+
 class MarkItem(BaseModel):
     question_label: str
     marks: int
 
 
+class MarkAlternative(BaseModel):
+    # One mark per cell of the flag
+    marks: List[int]
+    # Share of the likelihood of all readings of the digits (0-1)
+    score: float
+
+
+class MarkFlag(BaseModel):
+    # above_question_max, split_digits, low_confidence or above_exam_max
+    reason: str
+    cells: List[int] = []
+    questions: List[str] = []
+    # Marks as read, before clamping
+    read: List[int] = []
+    detail: str
+    alternatives: List[MarkAlternative] = []
+
+
 class SubmitMarksRequest(BaseModel):
     student_id: str
     exam_id: str
@@ -88,3 +165,27 @@ class SubmitMarksRequest(BaseModel):
 class OCRScanResponse(BaseModel):
     entries: List[MarkItem]
 
+
+
+class BulkMarksRow(BaseModel):
+    student_id: str
+    entries: List[MarkItem]
+
+
+class BulkSubmitMarksRequest(BaseModel):
+    exam_id: str
+    rows: List[BulkMarksRow]
+
+
+class BulkRowError(BaseModel):
+    index: int
+    student_id: str
+    detail: str
+
+
+class BulkSubmitMarksResponse(BaseModel):
+    status: str = "ok"
+    matched: int = 0
+    upserted: int = 0
+    modified: int = 0
+    errors: List[BulkRowError] = []
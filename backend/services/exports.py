@@ -0,0 +1,112 @@
+import csv
+import io
+import os
+from typing import Iterable, Iterator, List
+
+# Marks read from the database and encoded per chunk
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+# One row per mark, ordered by student then question
+COLUMNS = ("student_id", "roll_number", "name", "question_label", "marks")
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXPORT_FORMATS = tuple(MEDIA_TYPES)
+# Formats written with pyarrow, which is an optional dependency
+ARROW_FORMATS = ("parquet", "arrow")
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def csv_stream(chunks: Iterable[List[dict]]) -> Iterator[bytes]:
+    """Header, then one encoded block of lines per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for chunk in chunks:
+        writer.writerows([row[c] for c in COLUMNS] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()  # header only, no marks
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose bytes are taken out as they are produced."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("student_id", pa.string()),
+            ("roll_number", pa.string()),
+            ("name", pa.string()),
+            ("question_label", pa.string()),
+            ("marks", pa.int32()),
+        ]
+    )
+
+
+def _batch(chunk: List[dict], schema):
+    import pyarrow as pa
+
+    return pa.record_batch([[row[c] for row in chunk] for c in COLUMNS], schema=schema)
+
+
+def arrow_stream(chunks: Iterable[List[dict]], fmt: str) -> Iterator[bytes]:
+    """
+    Parquet (one row group per chunk) or Arrow IPC stream (one record
+    batch per chunk), yielded as each chunk is written.
+    """
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    schema = _schema()
+    sink = _Drain()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = ipc.new_stream(sink, schema)
+    with writer:
+        for chunk in chunks:
+            writer.write_batch(_batch(chunk, schema))
+            yield sink.take()
+    yield sink.take()  # footer / end-of-stream marker
+
+
+def export_stream(chunks: Iterable[List[dict]], fmt: str) -> Iterator[bytes]:
+    if fmt == "csv":
+        return csv_stream(chunks)
+    return arrow_stream(chunks, fmt)
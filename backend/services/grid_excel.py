@@ -1,161 +1,101 @@
-import base64
 import io
+import os
+import time
 from pathlib import Path
 from typing import List
 
 import cv2
 import numpy as np
 import pytesseract
-from PIL import Image
+from pytesseract import Output
 from openpyxl import Workbook, load_workbook
 from fastapi import HTTPException
 
+from ..ocr import codecs, preprocess, roll_number, symbols
+from ..ocr.regions import find_grid_regions
+from ..ocr.registration import straighten
+from ..ocr.shm import FrameHandle, attach_frame
+from . import xlsx_append
 
-def _decode_base64_image(image_b64: str) -> np.ndarray:
-    header, _, data = image_b64.partition(",")
-    if data:
-        image_b64 = data
-    img_bytes = base64.b64decode(image_b64)
-    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    open_cv_image = np.array(img)
-    open_cv_image = open_cv_image[:, :, ::-1].copy()  # RGB -> BGR
-    return open_cv_image
 
+# (x, y, width, height) of a grid in the image
+Bounds = tuple[float, float, float, float]
 
-def _ocr_box(image: np.ndarray) -> int:
-    # 1. Grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # 2. Upscale for better contour detection
-    scale = 2.0
-    width = int(gray.shape[1] * scale)
-    height = int(gray.shape[0] * scale)
-    dim = (width, height)
-    resized = cv2.resize(gray, dim, interpolation=cv2.INTER_CUBIC)
-
-    # 3. Threshold (Otsu) - Invert first to find white text on black background for contours
-    # But usually paper is white, text is black. 
-    # Thresholding: 
-    #   cv2.THRESH_BINARY_INV: Text becomes White, Background Black (Best for finding contours of text)
-    _, th_inv = cv2.threshold(resized, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-
-    # 4. Find Contours
-    # Use RETR_LIST to find all contours, including those inside a border
-    contours, _ = cv2.findContours(th_inv, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-
-    # 5. Filter Candidates
-    # If no contours found, it's empty
-    if not contours:
-        return 0
+# Cells read with less confidence (0-1) than this are read again on their own
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "0.8"))
+# At most this many cells are re-read per scan
+OCR_RETRY_MAX_CELLS = int(os.getenv("OCR_RETRY_MAX_CELLS", "8"))
+# Share of a cell's size trimmed on each side to drop the ruled lines
+CELL_INSET = 0.08
+# Cell crops re-read together are scaled to this height, this far apart
+RETRY_TILE_HEIGHT = 160
+RETRY_TILE_GAP = 80
+# Sheets read through a template are straightened to this width
+TEMPLATE_READ_WIDTH = 1600
 
-    # Filter out very small noise
-    valid_contours = [c for c in contours if cv2.contourArea(c) > 20]
-    
-    # Filter out likely grid lines / borders
-    # 1. Touches edge?
-    # 2. Long and thin?
-    
-    final_contours = []
-    h_img, w_img = height, width
-    
-    for c in valid_contours:
-        x, y, w, h = cv2.boundingRect(c)
-        
-        # Check if touches edge (within 3px)
-        touches_edge = (x <= 3) or (y <= 3) or (x + w >= w_img - 3) or (y + h >= h_img - 3)
-        
-        # Check if long (spans > 50% of dimension)
-        spans_long = (w > 0.5 * w_img) or (h > 0.5 * h_img)
-        
-        if touches_edge and spans_long:
-            continue # Skip border line
-            
-        final_contours.append(c)
-    
-    if not final_contours:
-        return 0
-        
-    # Find bounding box that encompasses ALL valid contours (for multi-digit support)
-    min_x, min_y = width, height
-    max_x, max_y = 0, 0
-    
-    # print(f"[DEBUG] Valid contours found: {len(final_contours)}")
-
-    for c in final_contours:
-        x, y, w, h = cv2.boundingRect(c)
-        min_x = min(min_x, x)
-        min_y = min(min_y, y)
-        max_x = max(max_x, x + w)
-        max_y = max(max_y, y + h)
-        
-    x, y = min_x, min_y
-    w = max_x - min_x
-    h = max_y - min_y
-    
-    # 6. Extract ROI and Center it
-    # Let's get a clean black-text-white-bg version of the whole image first
-    _, th_clean = cv2.threshold(resized, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    
-    # Sanity check
-    if w <= 0 or h <= 0:
-        return 0
-        
-    digit_roi = th_clean[y:y+h, x:x+w]
-    
-    # Create a square canvas to center the content
-    # Size should be max(w, h) + padding
-    side = max(w, h) + 40 # 20px padding
-    canvas = np.ones((side, side), dtype=np.uint8) * 255 # White canvas
-    
-    # Center coordinates
-    c_x = side // 2
-    c_y = side // 2
-    
-    # Top-left dict
-    dx = c_x - w // 2
-    dy = c_y - h // 2
-    
-    # Paste ROI
-    canvas[dy:dy+h, dx:dx+w] = digit_roi
-    
-    print(f"[DEBUG] Valid contours found: {len(final_contours)}")
 
-    # ...
+def decode_image_bytes(img_bytes: bytes, source: str = "grid") -> np.ndarray:
+    return codecs.decode(img_bytes, source)
 
-    # Save debug image (Removed for production, can re-enable if needed)
-    import os
-    import time
-    debug_dir = r"C:\Users\abhig\OneDrive\Desktop\marks\backend\debug_crops"
-    os.makedirs(debug_dir, exist_ok=True)
-    timestamp = int(time.time() * 1000)
-    cv2.imwrite(f"{debug_dir}/{timestamp}_debug.png", canvas)
-    
-    # Save raw crop too for comparison if possible? 
-    # Let's just save the processed canvas for now as it shows what Tesseract sees.
 
-    # 7. Final OCR
-    # ...
-    
+def decode_scan(image_b64: str, source: str = "grid") -> tuple[bytes, np.ndarray]:
+    """
+    Encoded bytes (for Vision) and the decoded BGR frame of an uploaded
+    scan, so the frame can be handed to a worker through shared memory.
+    JPEG/WebP captures go to Vision as they came, without re-encoding.
+    """
+    img_bytes = codecs.payload_bytes(image_b64)
+    return img_bytes, decode_image_bytes(img_bytes, source)
+
+
+def _ocr_box(image: np.ndarray) -> int:
+    val, _ = _ocr_box_with_confidence(image)
+    return val or 0
+
+
+def _ocr_box_with_confidence(image: np.ndarray) -> tuple[int | None, float]:
+    """
+    (value, confidence 0-1) of a single cell read by Tesseract. An empty
+    cell gives (None, 1.0): there is nothing to misread.
+    """
+    # Threshold at native size, upscale only the digits, center them on a
+    # white square canvas (see ocr.preprocess)
+    canvas = preprocess.engine().digit_canvas(image)
+    if canvas is None:
+        return None, 1.0
+
+    # Set OCR_DEBUG_CROPS to a directory to keep what Tesseract sees
+    debug_dir = os.getenv("OCR_DEBUG_CROPS")
+    if debug_dir:
+        os.makedirs(debug_dir, exist_ok=True)
+        timestamp = int(time.time() * 1000)
+        cv2.imwrite(f"{debug_dir}/{timestamp}_debug.png", canvas)
+
+    # Final OCR
     try:
-        # Define config for Tesseract (e.g., to recognize only digits)
-        # Assuming 'config' is defined elsewhere or needs to be added.
-        # For this change, we'll assume it's implicitly handled or will be added.
-        # If not, pytesseract.image_to_string(canvas) would be used.
         config = r'--oem 3 --psm 8 -c tessedit_char_whitelist=0123456789'
-        text = pytesseract.image_to_string(canvas, config=config)
-        print(f"[DEBUG] Raw OCR text: '{text.strip()}'")
+        d = pytesseract.image_to_data(canvas, config=config, output_type=Output.DICT)
     except pytesseract.TesseractNotFoundError:
         print("[ERROR] Tesseract not found.")
         raise Exception("Tesseract OCR is not installed on the server. Please install it.")
     except Exception as e:
         print(f"[ERROR] OCR failed: {e}")
-        return 0
-        
+        return None, 0.0
+
+    words = [
+        (text, float(conf))
+        for text, conf in zip(d['text'], d['conf'])
+        if text.strip() and float(conf) >= 0
+    ]
+    text = "".join(w for w, _ in words)
+    logger.debug(f"Raw OCR text: '{text}'")
     digits = "".join(ch for ch in text if ch.isdigit())
-    val = int(digits) if digits else 0
-    print(f"[DEBUG] Parsed value: {val}")
-    return val
-
+    if not digits:
+        return None, 0.0
+    val = int(digits)
+    conf = min(c for _, c in words) / 100
+    logger.debug(f"Parsed value: {val} (conf {conf:.2f})")
+    return val, conf
 
 
 from ..ocr.google_vision import detect_document_text
@@ -176,22 +116,24 @@ def _get_centroids(vertices):
 import logging
 import sys
 
+# Set OCR_DEBUG_LOG to a file to keep a per-scan debug log there; off by
+# default, /api/metrics covers the timings. Every OCR worker appends to it.
+OCR_DEBUG_LOG = os.getenv("OCR_DEBUG_LOG")
+
 # Create a custom logger
 logger = logging.getLogger("backend_debug")
-logger.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG if OCR_DEBUG_LOG else logging.INFO)
 
 # Check if handlers already exist to avoid duplicates
 if not logger.handlers:
-    # File Handler
-    fh = logging.FileHandler('backend_debug.log')
-    fh.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
+    formatter = logging.Formatter('%(asctime)s - %(process)d - %(levelname)s - %(message)s')
+    if OCR_DEBUG_LOG:
+        fh = logging.FileHandler(OCR_DEBUG_LOG)
+        fh.setFormatter(formatter)
+        logger.addHandler(fh)
 
     # Stream Handler (stdout)
     sh = logging.StreamHandler(sys.stdout)
-    sh.setLevel(logging.DEBUG)
     sh.setFormatter(formatter)
     logger.addHandler(sh)
 
@@ -206,81 +148,387 @@ def extract_grid_marks(image_b64: str, rows: int = 4, cols: int = 2) -> List[int
     Sends the WHOLE image to Google Vision once, then maps detected text 
     to the corresponding grid cell based on coordinates.
     """
-    image_cv = _decode_base64_image(image_b64)
+    img_bytes, image_cv = decode_scan(image_b64)
+    return _grid_marks(image_cv, img_bytes, rows, cols)["marks"]
+
+
+def extract_grid_marks_from_frame(
+    frame: FrameHandle | np.ndarray,
+    img_bytes: bytes,
+    rows: int = 4,
+    cols: int = 2,
+    max_marks: List[int | None] | None = None,
+) -> dict:
+    """
+    Same as extract_grid_marks on an already decoded frame, read in place
+    from shared memory when called in an OCR worker. Returns
+    {"marks", "confidence", "retried", "symbols", "merged"} (see
+    _retry_low_confidence), the "max_marks" the cells were read against
+    and the "roll_number" written after a "Roll No" label on the sheet,
+    with its "roll_confidence" (both None when there is none).
+    """
+    with attach_frame(frame) as image_cv:
+        result = _grid_marks(image_cv, img_bytes, rows, cols, max_marks)
+    result["max_marks"] = max_marks
+    return result
+
+
+def _grid_marks(
+    image_cv: np.ndarray,
+    img_bytes: bytes,
+    rows: int,
+    cols: int,
+    max_marks: List[int | None] | None = None,
+) -> dict:
     h, w = image_cv.shape[:2]
     logger.info(f"Processing image: {w}x{h}, Rows={rows}, Cols={cols}")
-    
-    # Encode back to bytes for Google Vision
-    if "," in image_b64:
-        _, _, data = image_b64.partition(",")
-        img_bytes = base64.b64decode(data)
-    else:
-        img_bytes = base64.b64decode(image_b64)
-        
+
     try:
         annotation = detect_document_text(img_bytes)
     except Exception as e:
         logger.error(f"Google Vision API failed: {e}")
         print(f"[ERROR] Google Vision API failed: {e}")
         print("Falling back to legacy local OCR...")
-        return _extract_grid_marks_fallback(image_cv, rows, cols)
+        cells, bounds = _extract_grid_cells_fallback(image_cv, rows, cols)
+        grid = (cells, _grid_cell_boxes(bounds, rows, cols))
+        result = _retry_low_confidence(image_cv, [grid], vision=False, max_marks=max_marks)[0]
+        return {**result, **_roll_number_fields(None)}
+
+    # A "Roll No" field would otherwise count as marks when inferring the grid
+    roll = roll_number.find_labelled(annotation)
+    digits = symbols.symbol_array(annotation)
+    if roll:
+        x, y, bw, bh = roll["box"]
+        in_roll = (
+            (digits[:, symbols.X] >= x) & (digits[:, symbols.X] <= x + bw)
+            & (digits[:, symbols.Y] >= y) & (digits[:, symbols.Y] <= y + bh)
+        )
+        digits = digits[~in_roll]
+    ids = symbols.number_ids(digits)
+    _, bounds = _cells_from_candidates(symbols.candidates(digits, ids), rows, cols, h, w)
+    boxes = _grid_cell_boxes(bounds, rows, cols)
+    cells = symbols.read_cells(digits, ids, symbols.grid_cells(digits, bounds, rows, cols), boxes)
+    grid = (cells, boxes)
+    result = _retry_low_confidence(image_cv, [grid], vision=True, max_marks=max_marks)[0]
+    return {**result, **_roll_number_fields(roll)}
+
+
+def _roll_number_fields(roll: dict | None) -> dict:
+    return {
+        "roll_number": roll["value"] if roll else None,
+        "roll_confidence": roll["confidence"] if roll else None,
+    }
+
+
+def extract_multi_grid_marks_from_frame(
+    frame: FrameHandle | np.ndarray, img_bytes: bytes, rows: int = 4, cols: int = 2
+) -> List[dict]:
+    """
+    Several sheets photographed together: find every rows x cols grid in
+    the frame and read them all from ONE Vision call on the whole photo.
+    Returns [{"box": [x, y, w, h], "marks", "confidence", "retried"}] in
+    reading order.
+    """
+    with attach_frame(frame) as image_cv:
+        boxes = find_grid_regions(image_cv, min_cells=max(2, rows * cols // 2))
+        logger.info(f"Multi-sheet: {len(boxes)} grids found, Rows={rows}, Cols={cols}")
+        if not boxes:
+            return []
 
+        grids = []
+        try:
+            digits = symbols.symbol_array(detect_document_text(img_bytes))
+            ids = symbols.number_ids(digits)
+            vision = True
+        except Exception as e:
+            logger.error(f"Google Vision API failed: {e}")
+            vision = False
+
+        for x, y, w, h in boxes:
+            if vision:
+                # The box is the detected grid itself, so its cells are read where they are
+                cell_boxes = _grid_cell_boxes((x, y, w, h), rows, cols)
+                cells = symbols.read_cells(
+                    digits, ids, symbols.box_cells(digits, cell_boxes), cell_boxes
+                )
+            else:
+                # Fallback: Tesseract on each grid (a copy, the frame may be shared)
+                cells, (gx, gy, gw, gh) = _extract_grid_cells_fallback(
+                    image_cv[y:y + h, x:x + w].copy(), rows, cols
+                )
+                cell_boxes = _grid_cell_boxes((x + gx, y + gy, gw, gh), rows, cols)
+            grids.append((cells, cell_boxes))
 
-    # Initialize grid marks
-    grid_marks = [0] * (rows * cols)
-    
-    row_height = h / rows
-    col_width = w / cols
-    
-    found_marks = [] # List of {'val': int, 'x': float, 'y': float} 
-    
-    # Iterate through all pages/blocks/paragraphs/words/symbols
+        # Low-confidence cells of every sheet are re-read together
+        results = _retry_low_confidence(image_cv, grids, vision=vision)
+
+    return [
+        {"box": list(box), **result} for box, result in zip(boxes, results)
+    ]
+
+
+def extract_template_marks_from_frame(
+    frame: FrameHandle | np.ndarray, template: dict
+) -> dict | None:
+    """
+    Read a sheet printed from a registered template. The photo is mapped
+    onto the template (fiducials or page outline, see ocr.registration)
+    and straightened, so every cell is read where the template puts it,
+    with no grid inference. Returns {"marks", "confidence", "retried",
+    "symbols", "merged", "labels", "max_marks", "roll_number",
+    "roll_confidence"} in template cell order, or None when the sheet cannot be located in the photo.
+    The roll number is read from the template's roll_number field, when
+    it has one.
+    """
+    with attach_frame(frame) as image_cv:
+        straightened = straighten(image_cv, template, TEMPLATE_READ_WIDTH)
+    if straightened is None:
+        logger.info(f"Template {template.get('name')}: sheet not located")
+        return None
+    # scale: template units -> pixels of the straightened page
+    page, scale = straightened
+
+    layout = template["cells"]
+    boxes = [
+        (c["x"] * scale, c["y"] * scale, c["width"] * scale, c["height"] * scale)
+        for c in layout
+    ]
+    max_marks = [c.get("max_marks") for c in layout]
+    region = template.get("roll_number")
+    roll_box = (
+        (region["x"] * scale, region["y"] * scale, region["width"] * scale, region["height"] * scale)
+        if region else None
+    )
+
+    try:
+        ok, encoded = cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        annotation = detect_document_text(encoded.tobytes())
+    except Exception as e:
+        logger.error(f"Google Vision API failed: {e}")
+        result = _template_cells_fallback(page, boxes, max_marks)
+        roll = _roll_number_fallback(page, roll_box) if roll_box else None
+    else:
+        digits = symbols.symbol_array(annotation)
+        cells = symbols.read_cells(
+            digits, symbols.number_ids(digits), symbols.box_cells(digits, boxes), boxes
+        )
+        result = _retry_low_confidence(page, [(cells, boxes)], vision=True, max_marks=max_marks)[0]
+        roll = roll_number.read_in_box(annotation, roll_box) if roll_box else None
+
+    result["labels"] = [c["label"] for c in layout]
+    result["max_marks"] = max_marks
+    result.update(_roll_number_fields(roll))
+    return result
+
+
+def _roll_number_fallback(page: np.ndarray, box: Bounds) -> dict | None:
+    """Tesseract, digits only, on the template's roll number field."""
+    crop = _cell_crop(page, box)
+    if crop is None:
+        return None
+    try:
+        return roll_number.read_crop(crop)
+    except Exception as e:
+        logger.error(f"Roll number OCR failed: {e}")
+        return None
+
+
+def _template_cells_fallback(
+    page: np.ndarray, boxes: List[Bounds], max_marks: List[int | None]
+) -> dict:
+    """Tesseract on every template cell, the cells' positions being known."""
+    marks, confidence, cell_symbols = [], [], []
+    for box, limit in zip(boxes, max_marks):
+        crop = _cell_crop(page, box)
+        val, conf = _ocr_box_with_confidence(crop) if crop is not None else (None, 1.0)
+        cell_symbols.append(_symbols({"val": val, "conf": conf}) if val is not None else [])
+        if val is not None and limit is not None and val > limit:
+            conf = 0.0
+        marks.append(val or 0)
+        confidence.append(round(conf, 3))
+    return {
+        "marks": marks, "confidence": confidence, "retried": [], "symbols": cell_symbols, "merged": [],
+    }
+
+
+def _grid_cell_boxes(bounds: Bounds, rows: int, cols: int) -> List[Bounds]:
+    """(x, y, width, height) of every cell of a rows x cols grid, row by row."""
+    x, y, w, h = bounds
+    cell_w, cell_h = w / cols, h / rows
+    return [
+        (x + c * cell_w, y + r * cell_h, cell_w, cell_h)
+        for r in range(rows)
+        for c in range(cols)
+    ]
+
+
+def _cell_crop(image: np.ndarray, box: Bounds) -> np.ndarray | None:
+    """Copy of one cell, without the ruled lines at its edges."""
+    x, y, w, h = box
+    x0 = int(max(x + CELL_INSET * w, 0))
+    y0 = int(max(y + CELL_INSET * h, 0))
+    x1 = int(min(x + (1 - CELL_INSET) * w, image.shape[1]))
+    y1 = int(min(y + (1 - CELL_INSET) * h, image.shape[0]))
+    if x1 - x0 < 4 or y1 - y0 < 4:
+        return None
+    return image[y0:y1, x0:x1].copy()
+
+
+def _reread_cells_vision(crops: List[np.ndarray]) -> List[tuple[int | None, float]]:
+    """
+    Read many cell crops with ONE Vision call: they are pasted side by side
+    on a white strip and every word is attributed to the tile it falls in.
+    """
+    height = RETRY_TILE_HEIGHT
+    tiles = [
+        cv2.resize(crop, (max(int(crop.shape[1] * height / crop.shape[0]), 1), height))
+        for crop in crops
+    ]
+    gap = np.full((height, RETRY_TILE_GAP, 3), 255, dtype=np.uint8)
+    strip = [gap]
+    starts = []
+    offset = RETRY_TILE_GAP
+    for tile in tiles:
+        starts.append(offset)
+        strip += [tile, gap]
+        offset += tile.shape[1] + RETRY_TILE_GAP
+    ok, png = cv2.imencode(".png", np.hstack(strip))
+    annotation = detect_document_text(png.tobytes())
+
+    texts: List[List[str]] = [[] for _ in crops]
+    confs: List[List[float]] = [[] for _ in crops]
     for page in annotation.pages:
         for block in page.blocks:
             for paragraph in block.paragraphs:
                 for word in paragraph.words:
-                    word_text = "".join([symbol.text for symbol in word.symbols])
-                    
-                    # Clean the text
-                    # If text contains non-digits, clean them.
-                    cleaned_text = "".join(filter(str.isdigit, word_text))
-                    if not cleaned_text:
+                    cx, _ = _get_centroids(word.bounding_box.vertices)
+                    tile = next(
+                        (i for i in reversed(range(len(starts))) if cx >= starts[i]), None
+                    )
+                    if tile is None or cx > starts[tile] + tiles[tile].shape[1]:
                         continue
-                        
-                    val = int(cleaned_text)
-                    
-                    # Get bounding box
-                    vertices = word.bounding_box.vertices
-                    cx, cy = _get_centroids(vertices)
-                    
-                    # Logic: 
-                    # If val <= 100, assume it's a single mark.
-                    # If val > 100 (e.g. 547, 105), it's likely merged digits.
-                    # Exception: 100 is valid.
-                    
-                    if val <= 100:
-                        logger.debug(f"Found Mark: {val} at ({cx}, {cy})")
-                        found_marks.append({'val': val, 'x': cx, 'y': cy})
-                    else:
-                        # Split! "547" -> 5, 4, 7
-                        logger.debug(f"Splitting merged value: {val} at ({cx}, {cy})")
-                        s_val = str(val)
-                        n_chars = len(s_val)
-                        
-                        # Interpolate X coordinates
-                        # Approximate width of the word box
-                        min_x = min([v.x for v in vertices])
-                        max_x = max([v.x for v in vertices])
-                        width = max_x - min_x
-                        char_width = width / n_chars
-                        
-                        for i, char in enumerate(s_val):
-                            digit = int(char)
-                            # Estimate center of this char
-                            char_cx = min_x + (i * char_width) + (char_width / 2)
-                            
-                            logger.debug(f"  -> Split: {digit} at ({char_cx}, {cy})")
-                            found_marks.append({'val': digit, 'x': char_cx, 'y': cy})
+                    texts[tile].append("".join(symbol.text for symbol in word.symbols))
+                    confs[tile].append(float(getattr(word, "confidence", 1.0)))
+
+    return [
+        (_clean_and_find_mark(" ".join(text)), min(conf) if conf else 0.0)
+        for text, conf in zip(texts, confs)
+    ]
+
+
+def _retry_low_confidence(
+    image: np.ndarray,
+    grids: List[tuple[List[dict | None], List[Bounds]]],
+    vision: bool,
+    max_marks: List[int | None] | None = None,
+) -> List[dict]:
+    """
+    Turn mapped cells (with the box of each cell in the image) into
+    {"marks", "confidence", "retried", "symbols", "merged"} per grid.
+    symbols are the digits each cell was read from, with their
+    confidences, and merged the numbers that were split into digits (see
+    _merged_numbers); both feed services.validation. Cells below
+    OCR_MIN_CONFIDENCE (empty cells count as 0) are cropped and read again
+    on their own, all of them in a single Vision call, or with local OCR
+    when Vision is unavailable. A re-read only replaces the value when it
+    is more confident. retried lists the cell indexes that were read again.
+
+    max_marks gives the highest possible value per cell (None: no limit).
+    A value above it is treated as unreadable: confidence 0, re-read, and
+    never taken from a re-read.
+    """
+    limits = max_marks or []
+
+    def possible(idx: int, val: int) -> bool:
+        return idx >= len(limits) or limits[idx] is None or val <= limits[idx]
+
+    results = []
+    retry = []  # (grid index, cell index, crop)
+    for g, (cells, boxes) in enumerate(grids):
+        marks = [c["val"] if c else 0 for c in cells]
+        confidence = [
+            round(c.get("conf", 1.0), 3) if c and possible(idx, c["val"]) else 0.0
+            for idx, c in enumerate(cells)
+        ]
+        results.append({
+            "marks": marks,
+            "confidence": confidence,
+            "retried": [],
+            "symbols": [_symbols(c) for c in cells],
+            "merged": _merged_numbers(cells),
+        })
+        for idx, conf in enumerate(confidence):
+            if conf < OCR_MIN_CONFIDENCE and len(retry) < OCR_RETRY_MAX_CELLS:
+                crop = _cell_crop(image, boxes[idx])
+                if crop is not None:
+                    retry.append((g, idx, crop))
+
+    if not retry:
+        return results
+    logger.info(f"Re-reading {len(retry)} low-confidence cells")
+
+    crops = [crop for _, _, crop in retry]
+    reads = None
+    if vision:
+        try:
+            reads = _reread_cells_vision(crops)
+        except Exception as e:
+            logger.error(f"Cell re-read with Vision failed: {e}")
+    if reads is None:
+        reads = []
+        for crop in crops:
+            try:
+                reads.append(_ocr_box_with_confidence(crop))
+            except Exception as e:
+                logger.error(f"Cell re-read with Tesseract failed: {e}")
+                reads.append((None, 0.0))
+
+    for (g, idx, _), (val, conf) in zip(retry, reads):
+        result = results[g]
+        result["retried"].append(idx)
+        if val is not None and possible(idx, val) and conf > result["confidence"][idx]:
+            logger.debug(f"Cell {idx}: {result['marks'][idx]} -> {val} (conf {conf:.2f})")
+            result["marks"][idx] = val
+            result["confidence"][idx] = round(conf, 3)
+            result["symbols"][idx] = _symbols({"val": val, "conf": conf})
+    return results
+
+
+def _symbols(cell: dict | None) -> List[tuple[str, float]]:
+    """The digits a cell was read from, each with its confidence."""
+    if not cell:
+        return []
+    digits = cell.get("digits") or str(cell["val"])
+    confs = cell.get("digit_confs") or [cell.get("conf", 1.0)] * len(digits)
+    return [(digit, round(conf, 3)) for digit, conf in zip(digits, confs)]
+
+
+def _merged_numbers(cells: List[dict | None]) -> List[dict]:
+    """
+    Numbers written across a cell edge, their digits landing in different
+    cells (see ocr.symbols.read_cells), as {"cells": indexes their digits
+    ended up in, "symbols": every digit of the number with its confidence}.
+    """
+    numbers: dict[tuple, List[int]] = {}
+    for idx, cell in enumerate(cells):
+        if cell and cell.get("merged"):
+            numbers.setdefault(cell["merged"], []).append(idx)
+    return [
+        {"cells": idxs, "symbols": list(zip(digits, confs))}
+        for (_, digits, confs), idxs in numbers.items()
+    ]
+
+
+def _cells_from_candidates(
+    found_marks: List[dict], rows: int, cols: int, h: float, w: float, infer: bool = True
+) -> tuple[List[dict | None], Bounds]:
+    """
+    Map candidates to the cells of a rows x cols grid covering a w x h area.
+    Returns the candidate read in each cell (None when empty) and the grid
+    bounds used. infer=False when the area is known to be exactly the grid.
+    """
+    row_height = h / rows
+    col_width = w / cols
 
     # --- SMART GRID LOGIC ---
     total_cells = rows * cols
@@ -288,18 +536,19 @@ def extract_grid_marks(image_b64: str, rows: int = 4, cols: int = 2) -> List[int
     
     # NEW STRATEGY: Content-Based Grid Inference
     # Instead of assuming the grid fills the image, we infer the grid bounds from the detected Marks.
-    if len(found_marks) >= 3: # Need at least a few points to infer a grid
+    if infer and len(found_marks) >= 3: # Need at least a few points to infer a grid
         logger.info("Attempting to infer grid from available points.")
         try:
              return _infer_grid_from_candidates(found_marks, rows, cols)
         except Exception as e:
              logger.error(f"Inferred Grid Mapping failed: {e}")
 
-    logger.warning("Fallback to Basic Rigid Grid (Image-Based).")
-    logger.debug(f"[DEBUG] Only {len(found_marks)} marks found vs {total_cells} expected. Using Rigid Fallback.")
+    if infer:
+        logger.warning("Fallback to Basic Rigid Grid (Image-Based).")
+        logger.debug(f"[DEBUG] Only {len(found_marks)} marks found vs {total_cells} expected. Using Rigid Fallback.")
     
     # Case B: Standard Rigid Grid Mapping (Fallback)
-    grid_marks = [0] * total_cells
+    grid_marks = [None] * total_cells
     
     for item in found_marks:
         val = item['val']
@@ -313,16 +562,18 @@ def extract_grid_marks(image_b64: str, rows: int = 4, cols: int = 2) -> List[int
         
         if 0 <= r < rows and 0 <= c < cols:
             idx = r * cols + c
-            grid_marks[idx] = val
+            grid_marks[idx] = item
 
-    return grid_marks
+    return grid_marks, (0, 0, w, h)
 
-def _infer_grid_from_candidates(candidates: List[dict], rows: int, cols: int) -> List[int]:
+def _infer_grid_from_candidates(
+    candidates: List[dict], rows: int, cols: int
+) -> tuple[List[dict | None], Bounds]:
     """
     Infers the grid structure based on the bounding box of the detected numbers.
     """
     if not candidates:
-        return [0] * (rows * cols)
+        return [None] * (rows * cols), (0, 0, 0, 0)
 
     # 1. Determine Bounding Box of Content
     min_x = min(c['x'] for c in candidates)
@@ -354,7 +605,7 @@ def _infer_grid_from_candidates(candidates: List[dict], rows: int, cols: int) ->
     
     logger.debug(f"Inferred Grid Bounds: x={start_x:.1f}-{end_x:.1f}, y={start_y:.1f}-{end_y:.1f}")
     
-    grid_marks = [0] * (rows * cols)
+    grid_marks = [None] * (rows * cols)
     
     for item in candidates:
         # Normalize to 0-1 within the effective grid
@@ -375,15 +626,14 @@ def _infer_grid_from_candidates(candidates: List[dict], rows: int, cols: int) ->
         
         idx = r * cols + c
         
-        if grid_marks[idx] == 0:
-            grid_marks[idx] = item['val']
-        else:
-            # Overwrite collision
-            grid_marks[idx] = item['val']
+        # Overwrite collision: the later candidate wins
+        grid_marks[idx] = item
             
-    return grid_marks
+    return grid_marks, (start_x, start_y, eff_w, eff_h)
 
-def _smart_grid_cluster(candidates: List[dict], rows: int, cols: int, img_h: int, img_w: int) -> List[int]:
+def _smart_grid_cluster(
+    candidates: List[dict], rows: int, cols: int, img_h: int, img_w: int
+) -> List[dict | None]:
     """
     Robustly maps a list of candidate points {'val', 'x', 'y'} to a grid.
     Handles cases where len(candidates) >= rows * cols (noise, labels).
@@ -438,7 +688,7 @@ def _smart_grid_cluster(candidates: List[dict], rows: int, cols: int, img_h: int
         # Re-sort by Y
         row_groups.sort(key=lambda g: sum(i['y'] for i in g)/len(g))
         
-    final_grid = [0] * (rows * cols)
+    final_grid = [None] * (rows * cols)
     
     for r_idx, r_group in enumerate(row_groups):
         if r_idx >= rows: break
@@ -492,10 +742,11 @@ def _smart_grid_cluster(candidates: List[dict], rows: int, cols: int, img_h: int
             
             # Sort by X descending
             c_group.sort(key=lambda k: k['x'], reverse=True)
-            chosen_val = c_group[0]['val'] # Rightmost
+            chosen = c_group[0] # Rightmost
+            chosen_val = chosen['val']
             
             flat_idx = r_idx * cols + c_idx
-            final_grid[flat_idx] = chosen_val
+            final_grid[flat_idx] = chosen
             logger.debug(f"    -> Mapped val {chosen_val} to [{r_idx},{c_idx}]")
 
     return final_grid
@@ -548,21 +799,17 @@ def _clean_and_find_mark(text: str) -> int | None:
     # Let's return the one that looks most like a mark.
     return candidates[-1]
 
-def extract_single_mark(image_b64: str) -> int:
+def extract_single_mark_from_frame(frame: FrameHandle | np.ndarray, img_bytes: bytes) -> int:
     """
     Extract a single mark from a cropped image.
-    Uses Google Cloud Vision API effectively on the small crop.
+    Uses Google Cloud Vision API effectively on the small crop, and
+    Tesseract on the decoded frame (from shared memory in an OCR worker)
+    when Vision fails.
     """
-    if "," in image_b64:
-        _, _, data = image_b64.partition(",")
-        img_bytes = base64.b64decode(data)
-    else:
-        img_bytes = base64.b64decode(image_b64)
-    
     try:
         annotation = detect_document_text(img_bytes)
         full_text = annotation.text or ""
-        print(f"[DEBUG] Manual Crop Text: {full_text}")
+        logger.debug(f"Manual Crop Text: {full_text}")
         
         val = _clean_and_find_mark(full_text)
         if val is not None:
@@ -572,17 +819,18 @@ def extract_single_mark(image_b64: str) -> int:
     except Exception as e:
         print(f"[ERROR] Google Vision API failed on single crop: {e}")
         # Fallback to local
-        image_cv = _decode_base64_image(image_b64)
-        return _ocr_box(image_cv)
+        with attach_frame(frame) as image_cv:
+            return _ocr_box(image_cv)
 
 
-from pytesseract import Output
-
-def _extract_grid_marks_fallback(image: np.ndarray, rows: int = 4, cols: int = 2) -> List[int]:
+def _extract_grid_cells_fallback(
+    image: np.ndarray, rows: int = 4, cols: int = 2
+) -> tuple[List[dict | None], Bounds]:
     """
     Legacy Tesseract implementation UPGRADED with Smart Sort.
     Uses image_to_data on full image instead of slicing,
-    then applies the same spatial logic.
+    then applies the same spatial logic. Returns cells and bounds like
+    _cells_from_candidates, with Tesseract's confidence scaled to 0-1.
     """
     h, w = image.shape[:2]
     logger.info(f"[Fallback] Processing image: {w}x{h}, Rows={rows}, Cols={cols}")
@@ -609,7 +857,7 @@ def _extract_grid_marks_fallback(image: np.ndarray, rows: int = 4, cols: int = 2
         d = pytesseract.image_to_data(thresh, config=custom_config, output_type=Output.DICT)
     except Exception as e:
         logger.error(f"[ERROR] Tesseract failed: {e}")
-        return [0] * (rows * cols)
+        return [None] * (rows * cols), (0, 0, w, h)
 
     found_marks = []
     
@@ -617,7 +865,7 @@ def _extract_grid_marks_fallback(image: np.ndarray, rows: int = 4, cols: int = 2
     logger.info(f"[Fallback-Debug] Tesseract found {n_boxes} potential text blocks.")
     
     for i in range(n_boxes):
-        conf = int(d['conf'][i])
+        conf = float(d['conf'][i])
         text = d['text'][i].strip()
         
         # Log EVERYTHING
@@ -639,18 +887,21 @@ def _extract_grid_marks_fallback(image: np.ndarray, rows: int = 4, cols: int = 2
             
             # Logic: Split if merged
             if val <= 100:
-                found_marks.append({'val': val, 'x': cx, 'y': cy})
+                found_marks.append({'val': val, 'x': cx, 'y': cy, 'conf': conf / 100})
             else:
                 # Split merged digits (e.g. 547 -> 5, 4, 7)
                 logger.info(f"[Fallback-Debug] Splitting merged: {val}")
                 s_val = str(val)
                 n_chars = len(s_val)
                 char_width = w_box / n_chars
+                merged = (i, s_val, (conf / 100,) * n_chars)
                 
                 for k, char in enumerate(s_val):
                     digit = int(char)
                     char_cx = x + (k * char_width) + (char_width / 2)
-                    found_marks.append({'val': digit, 'x': char_cx, 'y': cy})
+                    found_marks.append(
+                        {'val': digit, 'x': char_cx, 'y': cy, 'conf': conf / 100, 'merged': merged}
+                    )
 
 
     # --- SHARED SMART GRID LOGIC ---
@@ -661,7 +912,7 @@ def _extract_grid_marks_fallback(image: np.ndarray, rows: int = 4, cols: int = 2
     if len(found_marks) >= total_cells:
         logger.info("[Fallback] Sufficient candidates found. Using Smart Clustering.")
         try:
-             return _smart_grid_cluster(found_marks, rows, cols, h, w)
+             return _smart_grid_cluster(found_marks, rows, cols, h, w), (0, 0, w, h)
         except Exception as e:
              logger.error(f"Smart Clustering failed: {e}")
              # Fall through to rigid grid
@@ -669,12 +920,11 @@ def _extract_grid_marks_fallback(image: np.ndarray, rows: int = 4, cols: int = 2
     # Case B: Rigid Fallback
     logger.warning("[Fallback] Mismatch or Clustering Failed. Using Rigid Grid.")
     
-    grid_marks = [0] * total_cells
+    grid_marks = [None] * total_cells
     row_height = h / rows
     col_width = w / cols
 
     for item in found_marks:
-        val = item['val']
         cx = item['x']
         cy = item['y']
         
@@ -683,20 +933,55 @@ def _extract_grid_marks_fallback(image: np.ndarray, rows: int = 4, cols: int = 2
         
         if 0 <= r < rows and 0 <= c < cols:
             idx = r * cols + c
-            grid_marks[idx] = val
+            grid_marks[idx] = item
 
-    return grid_marks
+    return grid_marks, (0, 0, w, h)
 
 def append_marks_to_excel(
     marks: List[int],
-    excel_content: bytes | None = None
+    excel_content: bytes | None = None,
+    labels: List[str] | None = None,
 ) -> tuple[int, bytes]:
     """
     Append a row with marks and total to an Excel sheet.
     If excel_content is None, creates a new workbook.
     Returns (total, modified_excel_bytes).
     """
-    total = sum(marks)
+    totals, excel_bytes = append_rows_to_excel([marks], excel_content, labels)
+    return totals[0], excel_bytes
+
+
+def append_rows_to_excel(
+    rows: List[List[int]],
+    excel_content: bytes | None = None,
+    labels: List[str] | None = None,
+) -> tuple[List[int], bytes]:
+    """
+    Append one row of marks and total per entry of rows, loading and
+    saving the workbook once. Returns (totals, modified_excel_bytes).
+    labels name the columns of a new workbook (Q1, Q2... by default).
+    """
+    totals, _, excel_bytes = append_rows_to_workbook(rows, excel_content, labels)
+    return totals, excel_bytes
+
+
+def append_rows_to_workbook(
+    rows: List[List[int]],
+    excel_content: bytes | None = None,
+    labels: List[str] | None = None,
+) -> tuple[List[int], int, bytes]:
+    """
+    append_rows_to_excel that also returns the sheet row number (1-based)
+    of the first appended row: (totals, first_row, modified_excel_bytes).
+    Existing files are appended to in place in their sheet XML when
+    possible (see xlsx_append), with openpyxl as the fallback.
+    """
+    if excel_content:
+        appended = xlsx_append.append_rows(excel_content, rows)
+        if appended is not None:
+            return appended
+
+    widest = max(rows, key=len, default=[])
 
     if excel_content:
         # Load from bytes
@@ -707,17 +992,23 @@ def append_marks_to_excel(
         wb = Workbook()
         ws = wb.active
         # Header row
-        for idx in range(len(marks)):
-            ws.cell(row=1, column=idx + 1).value = f"Q{idx + 1}"
-        ws.cell(row=1, column=len(marks) + 1).value = "Total"
-
-    row = ws.max_row + 1
-    for idx, value in enumerate(marks):
-        ws.cell(row=row, column=idx + 1).value = value
-    ws.cell(row=row, column=len(marks) + 1).value = total
+        for idx in range(len(widest)):
+            label = labels[idx] if labels and idx < len(labels) else f"Q{idx + 1}"
+            ws.cell(row=1, column=idx + 1).value = label
+        ws.cell(row=1, column=len(widest) + 1).value = "Total"
+
+    totals = []
+    first_row = ws.max_row + 1
+    for marks in rows:
+        total = sum(marks)
+        row = ws.max_row + 1
+        for idx, value in enumerate(marks):
+            ws.cell(row=row, column=idx + 1).value = value
+        ws.cell(row=row, column=len(marks) + 1).value = total
+        totals.append(total)
 
     # Save to bytes
     out_buffer = io.BytesIO()
     wb.save(out_buffer)
     out_buffer.seek(0)
-    return total, out_buffer.getvalue()
+    return totals, first_row, out_buffer.getvalue()
@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+
+from ..ocr import quality
+
+# Laplacian variance (on the small copy) below which a frame is too blurry
+LIVE_MIN_SHARPNESS = float(os.getenv("LIVE_MIN_SHARPNESS", "100"))
+# Consecutive steady frames before the sheet is scanned
+LIVE_STABLE_FRAMES = int(os.getenv("LIVE_STABLE_FRAMES", "3"))
+# Thumbnail difference (0-255) under which two frames show the same view
+LIVE_STEADY_DIFF = float(os.getenv("LIVE_STEADY_DIFF", "6"))
+# Difference from the scanned sheet above which a new sheet is assumed
+LIVE_NEW_SHEET_DIFF = float(os.getenv("LIVE_NEW_SHEET_DIFF", "20"))
+# Frames without a grid after which the sheet is considered taken away
+LIVE_MISSING_FRAMES = int(os.getenv("LIVE_MISSING_FRAMES", "3"))
+
+SEARCHING = "searching"  # no usable grid in view
+STEADY = "steady"  # grid in view, waiting for it to hold still
+SCANNING = "scanning"  # best frame sent to OCR
+DONE = "done"  # result sent, waiting for the next sheet
+
+
+def measure(data: bytes) -> tuple[np.ndarray, quality.QualityReport] | None:
+    """
+    Thumbnail and quality report of one encoded frame, None when it does
+    not decode. This is the image work of a frame; it touches no session,
+    so it can run on a worker thread while the session stays on one.
+    """
+    gray = quality.decode_gray(data)
+    if gray is None:
+        return None
+    return quality.thumbnail(gray), quality.assess(gray, min_sharpness=LIVE_MIN_SHARPNESS)
+
+
+class LiveScanSession:
+    """
+    State of one live-scan connection. Every frame goes through a cheap
+    quality gate; while a sheet is held still the sharpest frame is kept,
+    and after LIVE_STABLE_FRAMES steady frames that one frame (and only
+    that one) is handed out for OCR. A new sheet starts when the view
+    changes a lot or the grid disappears. Not thread-safe: call observe,
+    take_scan and finish from one thread (the event loop), and only
+    measure() elsewhere.
+    """
+
+    def __init__(self, rows: int = 4, cols: int = 2):
+        self.rows = rows
+        self.cols = cols
+        self.sheet = 1
+        self.state = SEARCHING
+        self.frames = 0
+        self.scans = 0
+        self._steady = 0
+        self._missing = 0
+        self._best: tuple[float, bytes] | None = None
+        self._previous: np.ndarray | None = None
+        self._scanned: np.ndarray | None = None
+        self._pending: list[tuple[int, bytes]] = []
+
+    def _new_sheet(self) -> None:
+        self.sheet += 1
+        self.state = SEARCHING
+        self._steady = 0
+        self._missing = 0
+        self._best = None
+        self._scanned = None
+
+    def observe(
+        self, data: bytes, measured: tuple[np.ndarray, quality.QualityReport] | None
+    ) -> dict:
+        """
+        Advance the state with one encoded frame and its measure(data).
+        Returns the status to report to the client. When the sheet is
+        ready, take_scan() returns the frame to OCR.
+        """
+        self.frames += 1
+        if measured is None:
+            return self._status(False, "undecodable", 0.0)
+
+        thumb, report = measured
+        moved = quality.difference(thumb, self._previous) if self._previous is not None else 255.0
+        self._previous = thumb
+        sharp, has_grid = report.sharpness, report.has_grid
+
+        if self.state in (SCANNING, DONE):
+            self._missing = 0 if has_grid else self._missing + 1
+            changed = quality.difference(thumb, self._scanned) > LIVE_NEW_SHEET_DIFF
+            if self.state == DONE and (changed or self._missing >= LIVE_MISSING_FRAMES):
+                self._new_sheet()
+            else:
+                return self._status(False, "already_scanned", sharp)
+
+        # The sheet is found through its grid here, whatever SCAN_REQUIRE_GRID says
+        reason = report.reason or (None if has_grid else "no_grid")
+        if reason is None and moved > LIVE_STEADY_DIFF:
+            reason = "moving"
+
+        if reason is not None:
+            # The sheet must be held still again from here
+            self.state = STEADY if has_grid else SEARCHING
+            self._steady = 0
+            self._best = None
+            return self._status(False, reason, sharp)
+
+        self.state = STEADY
+        self._steady += 1
+        if self._best is None or sharp > self._best[0]:
+            self._best = (sharp, data)
+        if self._steady >= LIVE_STABLE_FRAMES:
+            self.state = SCANNING
+            self._scanned = thumb
+            self._pending.append((self.sheet, self._best[1]))
+            self._best = None
+            self.scans += 1
+        return self._status(True, None, sharp)
+
+    def take_scan(self) -> tuple[int, bytes] | None:
+        """(sheet, frame) to OCR, once per sheet."""
+        return self._pending.pop() if self._pending else None
+
+    def finish(self, sheet: int, ok: bool = True) -> None:
+        """
+        Called when the OCR of a sheet is over. After a failure the same
+        sheet is scanned again once it has been held still again.
+        """
+        if sheet == self.sheet and self.state == SCANNING:
+            self.state = DONE if ok else STEADY
+            self._steady = 0
+
+    def _status(self, accepted: bool, reason: str | None, sharp: float) -> dict:
+        return {
+            "sheet": self.sheet,
+            "state": self.state,
+            "accepted": accepted,
+            "reason": reason,
+            "sharpness": round(sharp, 1),
+        }
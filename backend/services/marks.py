@@ -0,0 +1,103 @@
+from typing import List
+
+from bson import ObjectId
+from pymongo import ASCENDING, DeleteMany, UpdateOne
+from pymongo.database import Database
+from pymongo.results import BulkWriteResult
+
+from ..schemas.core import MarkItem
+from .summaries import apply_summary_delta, summary_seq
+
+
+# One document per (exam, student, question). Exam comes first so that
+# whole-exam reads can use the same index as a prefix.
+MARKS_INDEX_NAME = "exam_student_question_unique"
+MARKS_INDEX_KEYS = [
+    ("exam_id", ASCENDING),
+    ("student_id", ASCENDING),
+    ("question_label", ASCENDING),
+]
+
+
+def ensure_marks_indexes(db: Database) -> None:
+    """
+    Create the unique compound index the upsert write path relies on.
+    No-op if it already exists.
+    """
+    db["marks"].create_index(MARKS_INDEX_KEYS, unique=True, name=MARKS_INDEX_NAME)
+
+
+def parse_object_id(value: str) -> ObjectId | None:
+    """
+    Returns the ObjectId for value, or None if it is not a valid id.
+    """
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+def current_marks(
+    db: Database, exam_oid: ObjectId, student_oids: List[ObjectId]
+) -> dict[ObjectId, dict[str, int]]:
+    """
+    Stored marks for the given students in one query,
+    as {student_id: {question_label: marks}}.
+    """
+    marks: dict[ObjectId, dict[str, int]] = {}
+    cursor = db["marks"].find(
+        {"exam_id": exam_oid, "student_id": {"$in": student_oids}},
+        {"_id": 0, "student_id": 1, "question_label": 1, "marks": 1},
+    )
+    for doc in cursor:
+        marks.setdefault(doc["student_id"], {})[doc["question_label"]] = doc["marks"]
+    return marks
+
+
+def mark_upserts(
+    student_oid: ObjectId, exam_oid: ObjectId, entries: List[MarkItem]
+) -> List[UpdateOne]:
+    """
+    Build one upsert per entry, keyed on (student, exam, question_label).
+    """
+    return [
+        UpdateOne(
+            {
+                "student_id": student_oid,
+                "exam_id": exam_oid,
+                "question_label": entry.question_label,
+            },
+            {"$set": {"marks": entry.marks}},
+            upsert=True,
+        )
+        for entry in entries
+    ]
+
+
+def replace_student_marks(
+    db: Database, student_oid: ObjectId, exam_oid: ObjectId, entries: List[MarkItem]
+) -> BulkWriteResult:
+    """
+    Make the stored marks for (student, exam) equal to entries.
+
+    Entries are upserted in place and only labels that are no longer present
+    are removed afterwards, all in one ordered bulk_write. Readers never see
+    the student without marks, and an unchanged resubmission writes nothing.
+    The exam summary is updated with the difference.
+    """
+    seq = summary_seq(db, exam_oid)
+    previous = current_marks(db, exam_oid, [student_oid]).get(student_oid, {})
+    operations: list = mark_upserts(student_oid, exam_oid, entries)
+    operations.append(
+        DeleteMany(
+            {
+                "student_id": student_oid,
+                "exam_id": exam_oid,
+                "question_label": {"$nin": [entry.question_label for entry in entries]},
+            }
+        )
+    )
+    result = db["marks"].bulk_write(operations, ordered=True)
+    current = {entry.question_label: entry.marks for entry in entries}
+    apply_summary_delta(db, exam_oid, [(student_oid, previous, current)], seq)
+    return result
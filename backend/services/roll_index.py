@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+
+from ..storage.base import Repository
+
+# The index is reloaded from the students collection when older than this,
+# so students added through another worker process show up
+ROLL_INDEX_TTL_SECONDS = float(os.getenv("ROLL_INDEX_TTL_SECONDS", "300"))
+# An unknown roll number reloads the index, at most this often
+ROLL_INDEX_MISS_REFRESH_SECONDS = float(os.getenv("ROLL_INDEX_MISS_REFRESH_SECONDS", "10"))
+
+
+def normalize(roll_number: str) -> str:
+    """
+    Lookup key of a roll number: upper case without spaces or separators,
+    and without leading zeros when it is all digits ("0042" and "42" are
+    the same student, spreadsheets drop the zeros).
+    """
+    key = "".join(ch for ch in str(roll_number).upper() if ch.isalnum())
+    if key.isdigit():
+        key = key.lstrip("0") or "0"
+    return key
+
+
+class RollNumberIndex:
+    """
+    Students by normalized roll number, held in memory so a scan is linked
+    to its student without a query. Keys shared by several students map to
+    None: such a sheet is not linked rather than linked to the wrong one.
+    """
+
+    def __init__(self):
+        self._students: dict[str, dict | None] = {}
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """Reload on the next lookup (call after students are added or changed)."""
+        self._loaded_at = None
+
+    def _load(self, repo: Repository) -> None:
+        students: dict[str, dict | None] = {}
+        for doc in repo.list_students():
+            key = normalize(doc["roll_number"])
+            student = {"id": doc["id"], "roll_number": doc["roll_number"], "name": doc["name"]}
+            students[key] = None if key in students else student
+        self._students = students
+        self._loaded_at = time.monotonic()
+
+    def lookup(self, repo: Repository, roll_number: str) -> dict | None:
+        """{id, roll_number, name} of the student, or None."""
+        key = normalize(roll_number)
+        if not key:
+            return None
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > ROLL_INDEX_TTL_SECONDS:
+                self._load(repo)
+            elif key not in self._students and (
+                time.monotonic() - self._loaded_at > ROLL_INDEX_MISS_REFRESH_SECONDS
+            ):
+                self._load(repo)
+            return self._students.get(key)
+
+
+# One per process, like the repository behind it
+_index = RollNumberIndex()
+
+
+def lookup(repo: Repository, roll_number: str) -> dict | None:
+    return _index.lookup(repo, roll_number)
+
+
+def invalidate() -> None:
+    _index.invalidate()
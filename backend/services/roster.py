@@ -0,0 +1,137 @@
+import csv
+import io
+import os
+import time
+from itertools import islice
+from typing import BinaryIO, Iterator, List
+
+from ..storage.base import Repository
+
+# Rows validated, checked for duplicates and inserted together
+ROSTER_CHUNK_SIZE = int(os.getenv("ROSTER_CHUNK_SIZE", "1000"))
+
+ROSTER_COLUMNS = ("roll_number", "name", "department", "year", "section")
+REQUIRED_COLUMNS = ("roll_number", "name")
+# Same limits as the SQL student columns
+MAX_LENGTHS = {"roll_number": 50, "name": 100, "department": 100, "year": 20, "section": 20}
+# Other headings seen in school rosters
+HEADER_ALIASES = {"roll": "roll_number", "roll_no": "roll_number", "student_name": "name"}
+
+
+def _column(heading) -> str:
+    name = str(heading or "").strip().lower().replace(" ", "_").replace("-", "_").rstrip(".")
+    return HEADER_ALIASES.get(name, name)
+
+
+def _text(value) -> str | None:
+    # Spreadsheet cells can be numbers: a roll number of 1001 is "1001", not "1001.0"
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = "" if value is None else str(value).strip()
+    return text or None
+
+
+def _records(rows: Iterator[tuple]) -> Iterator[tuple[int, dict]]:
+    """(row number, {column: text}) for every non-blank row after the header."""
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("The file is empty")
+    columns = [_column(h) for h in header]
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    wanted = [(i, c) for i, c in enumerate(columns) if c in ROSTER_COLUMNS]
+
+    for number, row in enumerate(rows, start=2):
+        record = {c: _text(row[i]) if i < len(row) else None for i, c in wanted}
+        if any(record.values()):
+            yield number, record
+
+
+def read_roster(file: BinaryIO) -> Iterator[tuple[int, dict]]:
+    """
+    Rows of an uploaded roster, read as they are needed. XLSX files are
+    recognised by their zip signature and read with openpyxl in read-only
+    mode; anything else is read as UTF-8 CSV. Raises ValueError when the
+    header lacks the required columns.
+    """
+    if file.read(4) == b"PK\x03\x04":
+        from openpyxl import load_workbook
+
+        file.seek(0)
+        try:
+            wb = load_workbook(file, read_only=True, data_only=True)
+        except Exception as exc:
+            raise ValueError("The file is not a readable XLSX workbook") from exc
+        try:
+            yield from _records(wb.active.iter_rows(values_only=True))
+        finally:
+            wb.close()
+    else:
+        file.seek(0)
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        try:
+            yield from _records(iter(csv.reader(text)))
+        except UnicodeDecodeError:
+            raise ValueError("CSV files must be UTF-8")
+        finally:
+            text.detach()  # leave the upload open for its owner
+
+
+def _row_error(record: dict) -> str | None:
+    for column in REQUIRED_COLUMNS:
+        if not record[column]:
+            return f"{column} is empty"
+    for column, limit in MAX_LENGTHS.items():
+        if record.get(column) and len(record[column]) > limit:
+            return f"{column} is longer than {limit} characters"
+    return None
+
+
+def import_roster(repo: Repository, records: Iterator[tuple[int, dict]]) -> dict:
+    """
+    Validate and insert roster rows ROSTER_CHUNK_SIZE at a time: one query
+    for the roll numbers already taken and one unordered batch insert per
+    chunk. Returns {rows, inserted, errors: [{row, roll_number, detail}],
+    seconds, rows_per_second}.
+    """
+    start = time.perf_counter()
+    report = {"rows": 0, "inserted": 0, "errors": []}
+    seen: set[str] = set()
+
+    def error(number: int, record: dict, detail: str) -> None:
+        report["errors"].append(
+            {"row": number, "roll_number": record.get("roll_number"), "detail": detail}
+        )
+
+    while chunk := list(islice(records, ROSTER_CHUNK_SIZE)):
+        report["rows"] += len(chunk)
+        valid: List[tuple[int, dict]] = []
+        for number, record in chunk:
+            detail = _row_error(record)
+            if detail is None and record["roll_number"] in seen:
+                detail = "Roll number appears earlier in the file"
+            if detail:
+                error(number, record, detail)
+                continue
+            seen.add(record["roll_number"])
+            valid.append((number, {c: record.get(c) for c in ROSTER_COLUMNS}))
+
+        taken = repo.existing_roll_numbers([doc["roll_number"] for _, doc in valid])
+        docs = []
+        for number, doc in valid:
+            if doc["roll_number"] in taken:
+                error(number, doc, "Student with this roll number exists")
+            else:
+                docs.append((number, doc))
+
+        failed = repo.insert_students([doc for _, doc in docs])
+        for index, detail in failed.items():
+            error(docs[index][0], docs[index][1], detail)
+        report["inserted"] += len(docs) - len(failed)
+
+    seconds = time.perf_counter() - start
+    report["errors"].sort(key=lambda e: e["row"])
+    report["seconds"] = seconds
+    report["rows_per_second"] = report["rows"] / seconds if seconds else 0.0
+    return report
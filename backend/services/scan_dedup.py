@@ -0,0 +1,177 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List
+
+from .. import metrics
+from ..storage.base import Repository
+
+# Look for an earlier scan of the same sheet before paying for OCR
+SCAN_DEDUP = os.getenv("SCAN_DEDUP", "1") == "1"
+# Bits (of 64) each cell's hash may differ by for two photos to be the
+# same sheet. Photos of sheets with one mark changed differ by more
+# (see bench_scan_dedup.py).
+SCAN_DEDUP_MAX_DISTANCE = int(os.getenv("SCAN_DEDUP_MAX_DISTANCE", "5"))
+# The same for the hashes of a sheet's header (the roll number and name
+# above a grid, a template's roll number field). They are hashed wider
+# than a cell, so a retake moves them more, but another student's roll
+# number must still tell the sheets apart (see bench_scan_dedup.py).
+SCAN_DEDUP_HEADER_DISTANCE = int(os.getenv("SCAN_DEDUP_HEADER_DISTANCE", "8"))
+# Sheets remembered per process, oldest dropped first
+SCAN_DEDUP_MAX_ENTRIES = int(os.getenv("SCAN_DEDUP_MAX_ENTRIES", "5000"))
+# An earlier scan older than this is read again
+SCAN_DEDUP_TTL_SECONDS = float(os.getenv("SCAN_DEDUP_TTL_SECONDS", str(12 * 3600)))
+# Also keep the fingerprints in the database, shared by every worker
+# process and kept across restarts
+SCAN_DEDUP_PERSIST = os.getenv("SCAN_DEDUP_PERSIST", "0") == "1"
+
+# Each 64-bit cell hash is indexed by SCAN_DEDUP_MAX_DISTANCE + 1 bands
+# of its bits. Two hashes that many bits apart at most agree on at least
+# one band, so every near-duplicate shares a key with the scan it
+# repeats; wider bands are shared by fewer unrelated sheets.
+BANDS = min(SCAN_DEDUP_MAX_DISTANCE + 1, 64)
+BAND_EDGES = [round(band * 64 / BANDS) for band in range(BANDS + 1)]
+# Entries kept per key; bounds the candidates checked per lookup
+BUCKET_SIZE = 16
+
+Fingerprint = List[int | None]
+
+
+def keys(fingerprint: Fingerprint, header: int = 0) -> List[str]:
+    """
+    Index keys of a fingerprint: cell, band and band value of every
+    written cell. The header hashes are left out, a printed header would
+    put every sheet under the same keys.
+    """
+    return [
+        f"{cell}:{band}:{(value >> low) & ((1 << (high - low)) - 1):x}"
+        for cell, value in enumerate(fingerprint[:len(fingerprint) - header])
+        if value is not None
+        for band, (low, high) in enumerate(zip(BAND_EDGES, BAND_EDGES[1:]))
+    ]
+
+
+def same_sheet(a: Fingerprint, b: Fingerprint, header: int = 0) -> bool:
+    """
+    Whether two fingerprints are photos of the same sheet: the same cells
+    written in, each within SCAN_DEDUP_MAX_DISTANCE bits, and the last
+    header hashes within SCAN_DEDUP_HEADER_DISTANCE. Sheets with no
+    marks are never the same, a header alone (often printed on every
+    sheet) does not tell them apart.
+    """
+    if len(a) != len(b) or all(x is None for x in a[:len(a) - header]):
+        return False
+    for i, (x, y) in enumerate(zip(a, b)):
+        if (x is None) != (y is None):
+            return False
+        limit = SCAN_DEDUP_HEADER_DISTANCE if i >= len(a) - header else SCAN_DEDUP_MAX_DISTANCE
+        if x is not None and (x ^ y).bit_count() > limit:
+            return False
+    return True
+
+
+class ScanIndex:
+    """
+    Fingerprints of recent scans and their OCR results, per scope (an
+    exam, a workbook or a teacher). A lookup reads the buckets of the
+    scan's keys, each holding at most BUCKET_SIZE entries, so its cost is
+    bounded however many sheets are remembered.
+    """
+
+    def __init__(self, max_entries: int = SCAN_DEDUP_MAX_ENTRIES):
+        self._max_entries = max_entries
+        # id -> (scope, fingerprint, header, result, monotonic time), oldest first
+        self._entries: OrderedDict[int, tuple] = OrderedDict()
+        self._buckets: dict[tuple[str, str], deque] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find(self, scope: str, fingerprint: Fingerprint, header: int = 0) -> dict | None:
+        """Copy of the result of the latest scan of the same sheet, or None."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for key in keys(fingerprint, header):
+                candidates.update(self._buckets.get((scope, key), ()))
+            for entry_id in sorted(candidates, reverse=True):
+                _, stored, _, result, added = self._entries[entry_id]
+                if now - added <= SCAN_DEDUP_TTL_SECONDS and same_sheet(fingerprint, stored, header):
+                    return copy.deepcopy(result)
+        return None
+
+    def add(self, scope: str, fingerprint: Fingerprint, result: dict, header: int = 0) -> None:
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (
+                scope, fingerprint, header, copy.deepcopy(result), time.monotonic()
+            )
+            for key in keys(fingerprint, header):
+                bucket = self._buckets.setdefault((scope, key), deque(maxlen=BUCKET_SIZE))
+                bucket.append(entry_id)
+            while len(self._entries) > self._max_entries:
+                self._drop(*self._entries.popitem(last=False))
+
+    def _drop(self, entry_id: int, entry: tuple) -> None:
+        scope, fingerprint, header = entry[0], entry[1], entry[2]
+        for key in keys(fingerprint, header):
+            bucket = self._buckets.get((scope, key))
+            if bucket is None:
+                continue
+            if entry_id in bucket:
+                bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[(scope, key)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+
+# One per process; SCAN_DEDUP_PERSIST shares them through the database
+_index = ScanIndex()
+
+
+def _stored(fingerprint: Fingerprint) -> List[str | None]:
+    return [None if value is None else f"{value:016x}" for value in fingerprint]
+
+
+def _loaded(stored: List[str | None]) -> Fingerprint:
+    return [None if value is None else int(value, 16) for value in stored]
+
+
+def lookup(repo: Repository, scope: str, fingerprint: Fingerprint, header: int = 0) -> dict | None:
+    """
+    The OCR result of an earlier scan of the same sheet in scope, from
+    this process's index, else (with SCAN_DEDUP_PERSIST) the database.
+    header is the number of header hashes ending the fingerprint (see
+    ocr.fingerprint.header_size).
+    """
+    result = _index.find(scope, fingerprint, header)
+    if result is None and SCAN_DEDUP_PERSIST:
+        since = time.time() - SCAN_DEDUP_TTL_SECONDS
+        found = repo.find_scan_fingerprints(scope, keys(fingerprint, header), since, BUCKET_SIZE)
+        for doc in found:
+            if same_sheet(fingerprint, _loaded(doc["cells"]), header):
+                result = doc["result"]
+                _index.add(scope, fingerprint, result, header)
+                break
+    metrics.increment("scan_dedup_total", {"outcome": "duplicate" if result else "new"})
+    return result
+
+
+def remember(
+    repo: Repository, scope: str, fingerprint: Fingerprint, result: dict, header: int = 0
+) -> None:
+    """Keep the OCR result of a sheet for later scans of it in scope."""
+    if all(value is None for value in fingerprint[:len(fingerprint) - header]):
+        return
+    _index.add(scope, fingerprint, result, header)
+    if SCAN_DEDUP_PERSIST:
+        repo.save_scan_fingerprint(scope, keys(fingerprint, header), _stored(fingerprint), result)
@@ -0,0 +1,274 @@
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Iterable
+
+from bson import ObjectId
+from pymongo import ASCENDING, DeleteMany, ReturnDocument, UpdateOne
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+
+# One document per exam, keyed by the exam's _id:
+#   students      number of students with at least one mark
+#   total_sum     sum of student totals
+#   total_sq_sum  sum of squared student totals (for the standard deviation)
+#   questions     {key: {label, count, sum}} per question label
+#   version       bumped on every write to the exam's marks
+#   seq           bumped by the $inc that folds a write in
+# Every counter is additive, so a marks write is folded in with an $inc;
+# the version is bumped after the per-student totals are written.
+# A writer reads seq before the previous marks it diffs against, and its
+# $inc only applies while seq is unchanged: if another write was folded in
+# meanwhile, the previous marks may be stale and the summary is recomputed.
+SUMMARIES = "exam_summaries"
+
+# One document per (exam, student) holding the student's total, stamped
+# with the summary version that produced it.
+TOTALS = "exam_totals"
+
+TOTALS_CACHE_SIZE = 128
+
+# exam_id -> (version, totals). Validated against the summary version on
+# every read, so a write from any process invalidates it. Read and filled
+# from threadpool workers, hence the lock.
+_totals_cache: "OrderedDict[ObjectId, tuple[int, list[dict]]]" = OrderedDict()
+_totals_cache_lock = threading.Lock()
+
+
+def ensure_summary_indexes(db: Database) -> None:
+    db[TOTALS].create_index(
+        [("exam_id", ASCENDING), ("student_id", ASCENDING)],
+        unique=True,
+        name="exam_student_unique",
+    )
+
+
+def _question_key(label: str) -> str:
+    # '.' and '$' are not allowed in field names, swap them for their
+    # full-width forms. The real label is stored next to the counters.
+    return label.replace(".", "．").replace("$", "＄")
+
+
+def _total_upserts(
+    exam_oid: ObjectId, students: dict[ObjectId, dict[str, int]], version: int
+) -> list:
+    operations: list = []
+    emptied = []
+    for student_oid, marks in students.items():
+        if not marks:
+            emptied.append(student_oid)
+            continue
+        operations.append(
+            UpdateOne(
+                {"exam_id": exam_oid, "student_id": student_oid},
+                {
+                    "$set": {
+                        "total": sum(marks.values()),
+                        "questions": len(marks),
+                        "version": version,
+                    }
+                },
+                upsert=True,
+            )
+        )
+    if emptied:
+        operations.append(DeleteMany({"exam_id": exam_oid, "student_id": {"$in": emptied}}))
+    return operations
+
+
+def summary_seq(db: Database, exam_oid: ObjectId) -> int:
+    """The exam summary's seq, to read before the previous marks of a write."""
+    summary = db[SUMMARIES].find_one({"_id": exam_oid}, {"seq": 1}) or {}
+    return summary.get("seq", 0)
+
+
+def apply_summary_delta(
+    db: Database,
+    exam_oid: ObjectId,
+    changes: Iterable[tuple[ObjectId, dict[str, int], dict[str, int]]],
+    seq: int,
+) -> None:
+    """
+    Fold a batch of per-student changes into the exam summary and the
+    per-student totals. Each change is (student_id, previous marks,
+    current marks) with marks as {question_label: marks}, the previous
+    marks read after summary_seq returned seq. Rebuilds the summary
+    instead when another write was folded in since.
+    """
+    inc: dict[str, int] = defaultdict(int)
+    labels: dict[str, str] = {}
+    changed: dict[ObjectId, dict[str, int]] = {}
+
+    for student_oid, previous, current in changes:
+        old_total = sum(previous.values())
+        new_total = sum(current.values())
+        inc["students"] += bool(current) - bool(previous)
+        inc["total_sum"] += new_total - old_total
+        inc["total_sq_sum"] += new_total * new_total - old_total * old_total
+
+        for label in previous.keys() | current.keys():
+            prefix = f"questions.{_question_key(label)}"
+            inc[f"{prefix}.count"] += (label in current) - (label in previous)
+            inc[f"{prefix}.sum"] += current.get(label, 0) - previous.get(label, 0)
+            labels[f"{prefix}.label"] = label
+
+        if current != previous:
+            changed[student_oid] = current
+
+    if not changed:
+        return
+    inc = {k: v for k, v in inc.items() if v}
+    inc["seq"] = 1
+    try:
+        summary = db[SUMMARIES].find_one_and_update(
+            {"_id": exam_oid, "seq": seq} if seq else {"_id": exam_oid, "seq": {"$in": [0, None]}},
+            {"$set": {**labels, "updated_at": datetime.utcnow()}, "$inc": inc},
+            projection={"version": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The summary exists with another seq: the upsert tried a second one
+        summary = None
+    if summary is None:
+        rebuild_exam_summary(db, exam_oid)
+        return
+    version = summary.get("version", 0) + 1
+    db[TOTALS].bulk_write(_total_upserts(exam_oid, changed, version), ordered=False)
+    # The version goes up only once the totals are written: a reader that
+    # sees it can only load the new totals (see get_exam_totals).
+    db[SUMMARIES].update_one({"_id": exam_oid}, {"$inc": {"version": 1}})
+
+
+def _aggregate_exam(db: Database, exam_oid: ObjectId) -> dict:
+    pipeline = [
+        {"$match": {"exam_id": exam_oid}},
+        {
+            "$facet": {
+                "students": [
+                    {
+                        "$group": {
+                            "_id": "$student_id",
+                            "total": {"$sum": "$marks"},
+                            "questions": {"$sum": 1},
+                        }
+                    },
+                ],
+                "questions": [
+                    {
+                        "$group": {
+                            "_id": "$question_label",
+                            "count": {"$sum": 1},
+                            "sum": {"$sum": "$marks"},
+                        }
+                    }
+                ],
+            }
+        },
+    ]
+    return next(db["marks"].aggregate(pipeline), {"students": [], "questions": []})
+
+
+def rebuild_exam_summary(db: Database, exam_oid: ObjectId) -> dict:
+    """
+    Recompute the summary and per-student totals for one exam from the
+    marks collection and replace the stored documents. Returns the new
+    summary document.
+    """
+    facets = _aggregate_exam(db, exam_oid)
+    totals = [s["total"] for s in facets["students"]]
+    previous = db[SUMMARIES].find_one({"_id": exam_oid}, {"version": 1, "seq": 1}) or {}
+    version = previous.get("version", 0) + 1
+
+    doc = {
+        "_id": exam_oid,
+        "students": len(totals),
+        "total_sum": sum(totals),
+        "total_sq_sum": sum(t * t for t in totals),
+        "questions": {
+            _question_key(q["_id"]): {"label": q["_id"], "count": q["count"], "sum": q["sum"]}
+            for q in facets["questions"]
+        },
+        "version": version,
+        # Deltas diffed against marks from before the rebuild no longer apply
+        "seq": previous.get("seq", 0) + 1,
+        "updated_at": datetime.utcnow(),
+    }
+
+    operations = [
+        UpdateOne(
+            {"exam_id": exam_oid, "student_id": s["_id"]},
+            {"$set": {"total": s["total"], "questions": s["questions"], "version": version}},
+            upsert=True,
+        )
+        for s in facets["students"]
+    ]
+    student_oids = [s["_id"] for s in facets["students"]]
+    operations.append(DeleteMany({"exam_id": exam_oid, "student_id": {"$nin": student_oids}}))
+    db[TOTALS].bulk_write(operations, ordered=True)
+    db[SUMMARIES].replace_one({"_id": exam_oid}, doc, upsert=True)
+    return doc
+
+
+def get_exam_summary(db: Database, exam_oid: ObjectId) -> dict | None:
+    return db[SUMMARIES].find_one({"_id": exam_oid})
+
+
+def get_exam_totals(db: Database, exam_oid: ObjectId) -> tuple[int, list[dict]]:
+    """
+    Totals for every student of an exam as (version, [{student_id, total,
+    questions}]), sorted by total descending. Served from the in-process
+    cache while the exam's summary version is unchanged, otherwise read
+    with one query on the (exam_id, student_id) index.
+    """
+    summary = db[SUMMARIES].find_one({"_id": exam_oid}, {"version": 1}) or {}
+    version = summary.get("version", 0)
+
+    with _totals_cache_lock:
+        cached = _totals_cache.get(exam_oid)
+        if cached and cached[0] == version:
+            _totals_cache.move_to_end(exam_oid)
+            return cached
+
+    totals = list(
+        db[TOTALS].find(
+            {"exam_id": exam_oid}, {"_id": 0, "student_id": 1, "total": 1, "questions": 1}
+        )
+    )
+    totals.sort(key=lambda t: t["total"], reverse=True)
+
+    # Totals read after the version are at least as new as it: caching them
+    # under it is safe, a later write bumps the version past them.
+    with _totals_cache_lock:
+        _totals_cache[exam_oid] = (version, totals)
+        _totals_cache.move_to_end(exam_oid)
+        while len(_totals_cache) > TOTALS_CACHE_SIZE:
+            _totals_cache.popitem(last=False)
+    return version, totals
+
+
+def check_exam_totals(db: Database, exam_oid: ObjectId, repair: bool = False) -> dict:
+    """
+    Compare the stored totals of an exam with a fresh aggregation over the
+    marks collection. With repair=True, any difference triggers a rebuild.
+    """
+    expected = {s["_id"]: s["total"] for s in _aggregate_exam(db, exam_oid)["students"]}
+    stored = {
+        t["student_id"]: t["total"]
+        for t in db[TOTALS].find({"exam_id": exam_oid}, {"_id": 0, "student_id": 1, "total": 1})
+    }
+
+    report = {
+        "checked": len(expected),
+        "missing": len(expected.keys() - stored.keys()),
+        "stale": len(stored.keys() - expected.keys()),
+        "mismatched": sum(
+            1 for oid, total in expected.items() if oid in stored and stored[oid] != total
+        ),
+        "repaired": False,
+    }
+    if repair and (report["missing"] or report["stale"] or report["mismatched"]):
+        rebuild_exam_summary(db, exam_oid)
+        report["repaired"] = True
+    return report
@@ -0,0 +1,144 @@
+import os
+from itertools import combinations
+from typing import Iterator, List, Sequence
+
+# Highest mark of a question without a maximum of its own
+MARK_CEILING = int(os.getenv("MARK_CEILING", "100"))
+# Alternative readings proposed per flag
+MARK_ALTERNATIVES = int(os.getenv("MARK_ALTERNATIVES", "3"))
+# Numbers with more digits than this are flagged without alternatives
+ALTERNATIVE_MAX_DIGITS = 8
+
+# Flags that leave the marks impossible for the exam even after clamping
+BLOCKING_REASONS = ("above_exam_max",)
+
+# (digit, Vision confidence 0-1)
+Symbol = tuple[str, float]
+
+
+def _subsets(symbols: Sequence[Symbol]) -> Iterator[tuple[List[str], float]]:
+    """
+    Every non-empty subsequence of the digits with its likelihood: each
+    digit is kept with its confidence, or dropped as a misread stroke with
+    1 - confidence.
+    """
+    n = len(symbols)
+    for mask in range(1, 2 ** n):
+        kept, score = [], 1.0
+        for i, (digit, conf) in enumerate(symbols):
+            # A confidence of exactly 0 or 1 would rule a reading out entirely
+            conf = min(max(conf, 0.01), 0.99)
+            if mask >> i & 1:
+                kept.append(digit)
+                score *= conf
+            else:
+                score *= 1 - conf
+        yield kept, score
+
+
+def segmentations(symbols: Sequence[Symbol], limits: Sequence[int]) -> List[dict]:
+    """
+    Ways to read the digits as len(limits) consecutive marks, each within
+    its limit, most likely first, as {"marks", "score"}. Scores are shares
+    of all such readings (they add up to 1).
+    """
+    if not symbols or len(symbols) > ALTERNATIVE_MAX_DIGITS:
+        return []
+    best: dict[tuple, float] = {}
+    for kept, score in _subsets(symbols):
+        for cuts in combinations(range(1, len(kept)), len(limits) - 1):
+            bounds = (0, *cuts, len(kept))
+            marks = tuple(int("".join(kept[a:b])) for a, b in zip(bounds, bounds[1:]))
+            if all(m <= limit for m, limit in zip(marks, limits)) and score > best.get(marks, 0.0):
+                best[marks] = score
+    total = sum(best.values())
+    return [
+        {"marks": list(marks), "score": round(score / total, 3)}
+        for marks, score in sorted(best.items(), key=lambda item: -item[1])
+    ]
+
+
+def _alternatives(symbols: Sequence[Symbol], limits: Sequence[int], read: List[int]) -> List[dict]:
+    return [alt for alt in segmentations(symbols, limits) if alt["marks"] != read][:MARK_ALTERNATIVES]
+
+
+def check_marks(
+    result: dict,
+    labels: List[str],
+    limits: Sequence[int | None] | None = None,
+    exam_max: int | None = None,
+    min_confidence: float = 0.0,
+) -> List[dict]:
+    """
+    Rule checks on the marks read from one sheet (an OCR result with
+    "marks", "confidence", "symbols" and "merged", see
+    grid_excel._retry_low_confidence). Returns the cells worth a human
+    look as {"reason", "cells", "questions", "read", "detail",
+    "alternatives": [{"marks", "score"}]}, where reason is one of
+
+    - above_question_max: more than the question's limit (limits, else
+      MARK_CEILING). The mark is clamped to the limit in result["marks"].
+    - split_digits: one number written across a cell edge, its digits
+      read in different cells. Alternatives cut it differently.
+    - low_confidence: read with less than min_confidence.
+    - above_exam_max: the sheet's total is more than exam_max (no cells).
+
+    Alternatives are other readings of the digits Vision saw in the
+    cells, ranked by the confidence of each digit (see segmentations).
+    """
+    marks = result["marks"]
+    symbols = result.get("symbols") or [[] for _ in marks]
+    confidence = result.get("confidence") or []
+    limits = [
+        limit if limit is not None else MARK_CEILING
+        for limit in list(limits or []) + [None] * (len(marks) - len(limits or []))
+    ]
+    flags = []
+    flagged = set()
+
+    def flag(reason: str, cells: List[int], detail: str, alternatives: List[dict]) -> None:
+        flags.append({
+            "reason": reason,
+            "cells": cells,
+            "questions": [labels[i] for i in cells],
+            "read": [marks[i] for i in cells],
+            "detail": detail,
+            "alternatives": alternatives,
+        })
+        flagged.update(cells)
+
+    for idx, mark in enumerate(marks):
+        if mark > limits[idx]:
+            flag(
+                "above_question_max",
+                [idx],
+                f"{labels[idx]}: {mark} is above the maximum of {limits[idx]}",
+                _alternatives(symbols[idx], limits[idx:idx + 1], [mark]),
+            )
+            marks[idx] = limits[idx]
+
+    for number in result.get("merged") or []:
+        cells = number["cells"]
+        digits = "".join(digit for digit, _ in number["symbols"])
+        flag(
+            "split_digits",
+            cells,
+            f"{', '.join(labels[i] for i in cells)}: split from the number {digits}",
+            _alternatives(
+                number["symbols"], [limits[i] for i in cells], [marks[i] for i in cells]
+            ),
+        )
+
+    for idx, conf in enumerate(confidence):
+        if idx not in flagged and conf < min_confidence:
+            flag(
+                "low_confidence",
+                [idx],
+                f"{labels[idx]}: {marks[idx]} was read with confidence {conf:.2f}",
+                _alternatives(symbols[idx], limits[idx:idx + 1], [marks[idx]]),
+            )
+
+    total = sum(marks)
+    if exam_max and total > exam_max:
+        flag("above_exam_max", [], f"Total {total} is above the exam's maximum of {exam_max}", [])
+    return flags
@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Stored workbooks untouched for this long are dropped
+WORKBOOK_TTL_DAYS = int(os.getenv("WORKBOOK_TTL_DAYS", "7"))
+# Concurrent scans into one workbook: attempts before giving up with 409
+WORKBOOK_WRITE_ATTEMPTS = 3
+
+# What a scan endpoint sends back:
+#   full  - the whole updated workbook, base64 in the JSON (the original format)
+#   delta - the appended row only; the workbook is kept on the server and
+#           downloaded from /workbooks/{id} with ETag / If-None-Match
+#   marks - the marks only, no workbook is read or written
+RESPONSE_MODES = ("full", "delta", "marks")
+ACCEPT_MODES = {
+    "application/vnd.marks.full+json": "full",
+    "application/vnd.marks.delta+json": "delta",
+    "application/vnd.marks.marks+json": "marks",
+}
+
+
+def response_mode(query: str | None, accept: str | None) -> str | None:
+    """
+    Mode asked for by the ?response= parameter, else by the first vendor
+    type of the Accept header, else "full". None when the parameter is
+    not a known mode.
+    """
+    if query:
+        return query if query in RESPONSE_MODES else None
+    for part in (accept or "").split(","):
+        mode = ACCEPT_MODES.get(part.split(";")[0].strip().lower())
+        if mode:
+            return mode
+    return "full"
+
+
+def etag(content: bytes) -> str:
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
@@ -0,0 +1,140 @@
+import io
+import os
+import posixpath
+import re
+import zipfile
+from typing import List
+
+# Set to 0 to always go through openpyxl
+XLSX_FAST_APPEND = os.getenv("XLSX_FAST_APPEND", "1") == "1"
+
+_REL_NS = b"http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_SHEET = re.compile(rb"<sheet\b[^>]*?/?>")
+_ATTR = rb'\b%s="([^"]*)"'
+_ROW_REF = re.compile(rb'\br="(\d+)"')
+_DIMENSION = re.compile(rb'<dimension\b[^>]*?\bref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+
+
+def _attr(tag: bytes, name: bytes) -> bytes | None:
+    match = re.search(_ATTR % re.escape(name), tag)
+    return match.group(1) if match else None
+
+
+def _column(index: int) -> str:
+    """1 -> A, 27 -> AA"""
+    letters = ""
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _column_index(letters: bytes) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ch - 64
+    return index
+
+
+def _active_sheet_path(archive: zipfile.ZipFile) -> str | None:
+    """Path of the worksheet openpyxl's wb.active would return."""
+    workbook = archive.read("xl/workbook.xml")
+    view = re.search(rb"<workbookView\b[^>]*>", workbook)
+    active = int(_attr(view.group(0), b"activeTab") or 0) if view else 0
+    sheets = _SHEET.findall(workbook)
+    if active >= len(sheets):
+        return None
+    # r:id, whatever prefix the relationships namespace was given
+    prefix = re.search(rb'xmlns:(\w+)="' + re.escape(_REL_NS) + b'"', workbook)
+    if prefix is None:
+        return None
+    rel_id = _attr(sheets[active], prefix.group(1) + b":id")
+
+    rels = archive.read("xl/_rels/workbook.xml.rels")
+    for rel in re.findall(rb"<Relationship\b[^>]*>", rels):
+        if _attr(rel, b"Id") == rel_id:
+            if not (_attr(rel, b"Type") or b"").endswith(b"/worksheet"):
+                return None  # chartsheet
+            target = _attr(rel, b"Target").decode()
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    return None
+
+
+def _append_to_sheet(sheet: bytes, rows: List[List[int]]) -> tuple[int, bytes] | None:
+    """(first appended row, new sheet XML), or None when unsure."""
+    if b"<mergeCells" in sheet:
+        return None  # merged ranges count towards openpyxl's max_row
+
+    end = sheet.rfind(b"</sheetData>")
+    if end == -1:
+        empty = re.search(rb"<sheetData\s*/>", sheet)
+        if empty is None:
+            return None
+        max_row = 1
+        head, tail = sheet[:empty.start()] + b"<sheetData>", b"</sheetData>" + sheet[empty.end():]
+    else:
+        # Rows are written in order, so the last one holds max_row
+        last = sheet.rfind(b"<row", sheet.find(b"<sheetData"), end)
+        if last == -1:
+            max_row = 1
+        else:
+            tag_end = sheet.index(b">", last)
+            ref = _ROW_REF.search(sheet, last, tag_end)
+            if ref is None or b"<c" not in sheet[tag_end:end]:
+                return None  # implicit row numbers, or a trailing empty row
+            max_row = int(ref.group(1))
+        head, tail = sheet[:end], sheet[end:]
+
+    first_row = max_row + 1
+    xml = []
+    width = 0
+    for offset, marks in enumerate(rows):
+        r = first_row + offset
+        values = [*marks, sum(marks)]
+        width = max(width, len(values))
+        cells = "".join(f'<c r="{_column(i + 1)}{r}"><v>{v}</v></c>' for i, v in enumerate(values))
+        xml.append(f'<row r="{r}">{cells}</row>')
+    head += "".join(xml).encode()
+
+    # Keep the used range in step
+    last_row = first_row + len(rows) - 1
+    dimension = _DIMENSION.search(head)
+    if dimension:
+        start_col, start_row, end_col, end_row = dimension.groups()
+        end_col, end_row = end_col or start_col, end_row or start_row
+        last_col = max(_column_index(end_col), width)
+        ref = b"%s%s:%s%d" % (start_col, start_row, _column(last_col).encode(), max(int(end_row), last_row))
+        head = head[:dimension.start(1)] + ref + head[dimension.end(dimension.lastindex):]
+    return first_row, head + tail
+
+
+def append_rows(content: bytes, rows: List[List[int]]) -> tuple[List[int], int, bytes] | None:
+    """
+    Append one row of marks and total per entry of rows to the active
+    sheet of an existing xlsx by editing its sheet XML in the zip, without
+    loading the workbook. Same result as append_rows_to_workbook:
+    (totals, first_row, new content). Returns None when the file is
+    anything but plainly laid out, so the caller can use openpyxl.
+    """
+    if not XLSX_FAST_APPEND or not rows:
+        return None
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            path = _active_sheet_path(archive)
+            if path is None:
+                return None
+            appended = _append_to_sheet(archive.read(path), rows)
+            if appended is None:
+                return None
+            first_row, sheet = appended
+
+            out = io.BytesIO()
+            with zipfile.ZipFile(out, "w") as target:
+                for info in archive.infolist():
+                    data = sheet if info.filename == path else archive.read(info)
+                    target.writestr(info, data)
+    except (zipfile.BadZipFile, KeyError, ValueError):
+        return None
+    return [sum(marks) for marks in rows], first_row, out.getvalue()
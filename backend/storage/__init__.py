@@ -0,0 +1,28 @@
+import os
+
+from ..database import get_db
+from .base import Repository
+
+# "mongo" (default) or "sqlite" for an embedded, offline database.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()
+SQLITE_URL = os.getenv("SQLITE_URL", "sqlite:///marks.db")
+
+_sql_repository: Repository | None = None
+
+
+def get_repository() -> Repository:
+    global _sql_repository
+    if STORAGE_BACKEND == "sqlite":
+        # One engine (and connection pool) per process
+        if _sql_repository is None:
+            from .sql import SqlRepository
+
+            _sql_repository = SqlRepository(SQLITE_URL)
+        return _sql_repository
+
+    from .mongo import MongoRepository
+
+    return MongoRepository(get_db())
+
+
+__all__ = ["Repository", "get_repository", "STORAGE_BACKEND"]
@@ -0,0 +1,215 @@
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Sequence
+
+from ..schemas.core import MarkItem
+
+
+class Repository(ABC):
+    """
+    Storage used by the routes. Entities go in and out as plain dicts whose
+    ids (id, subject_id, user_id, student_id) are strings, whatever the
+    backend uses internally. Unknown or malformed ids behave like missing
+    records; use valid_id() to tell the two apart.
+    """
+
+    @abstractmethod
+    def ensure_schema(self) -> None:
+        """Create tables/indexes. Safe to call on every startup."""
+
+    @abstractmethod
+    def valid_id(self, value: str) -> bool:
+        ...
+
+    # --- Users ---
+
+    @abstractmethod
+    def get_user_by_username(self, username: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def find_user(self, username: str, email: str) -> dict | None:
+        """A user with this username or this email."""
+
+    @abstractmethod
+    def create_user(self, doc: dict) -> dict:
+        ...
+
+    # --- Students ---
+
+    @abstractmethod
+    def create_student(self, doc: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def get_student(self, student_id: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def get_student_by_roll_number(self, roll_number: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def list_students(self, search: str = "") -> List[dict]:
+        """All students, or those whose roll number or name contains search."""
+
+    @abstractmethod
+    def existing_student_ids(self, student_ids: Sequence[str]) -> set[str]:
+        """The subset of student_ids that exist, in one query."""
+
+    @abstractmethod
+    def existing_roll_numbers(self, roll_numbers: Sequence[str]) -> set[str]:
+        """The subset of roll_numbers already taken, in one query."""
+
+    @abstractmethod
+    def insert_students(self, docs: List[dict]) -> dict[int, str]:
+        """
+        Insert the students as one batch, carrying on past failures.
+        Returns {index in docs: message} for those that were not inserted.
+        """
+
+    # --- Teachers, subjects, exams ---
+
+    @abstractmethod
+    def create_teacher(self, doc: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def get_subject_by_code(self, code: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def create_subject(self, doc: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def create_exam(self, doc: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def get_exam(self, exam_id: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def list_exams(self) -> List[dict]:
+        ...
+
+    # --- Sheet templates ---
+
+    @abstractmethod
+    def create_template(self, doc: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def get_template(self, template_id: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def get_template_by_name(self, name: str) -> dict | None:
+        ...
+
+    @abstractmethod
+    def list_templates(self) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def delete_template(self, template_id: str) -> bool:
+        """False when there was no such template."""
+
+    # --- Scan workbooks ---
+
+    @abstractmethod
+    def create_workbook(self, owner: str, content: bytes, etag: str) -> dict:
+        """Store an Excel file kept on the server between scans."""
+
+    @abstractmethod
+    def get_workbook(self, workbook_id: str) -> dict | None:
+        """{id, owner, content, etag, updated_at}"""
+
+    @abstractmethod
+    def update_workbook(
+        self, workbook_id: str, content: bytes, etag: str, expected_etag: str
+    ) -> bool:
+        """Replace the content if the stored etag is still expected_etag."""
+
+    # --- Scan fingerprints ---
+
+    @abstractmethod
+    def save_scan_fingerprint(
+        self, scope: str, keys: List[str], cells: List[str | None], result: dict
+    ) -> None:
+        """Keep a scanned sheet's fingerprint and OCR result (see services.scan_dedup)."""
+
+    @abstractmethod
+    def find_scan_fingerprints(
+        self, scope: str, keys: Sequence[str], since: float, limit: int
+    ) -> List[dict]:
+        """
+        {cells, result} of the latest fingerprints of scope saved after
+        since (a Unix time) sharing any of keys, newest first.
+        """
+
+    # --- Marks ---
+
+    @abstractmethod
+    def replace_student_marks(
+        self, student_id: str, exam_id: str, entries: List[MarkItem]
+    ) -> None:
+        """Make the stored marks of (student, exam) equal to entries."""
+
+    @abstractmethod
+    def bulk_upsert_marks(
+        self, exam_id: str, rows: Sequence[tuple[int, str, List[MarkItem]]]
+    ) -> dict:
+        """
+        Upsert (row index, student id, entries) rows keyed on
+        (student, exam, question_label). Returns {matched, upserted,
+        modified, errors} where errors maps row index -> message for rows
+        that could not be fully written.
+        """
+
+    @abstractmethod
+    def iter_exam_marks(self, exam_id: str, chunk_size: int) -> Iterator[List[dict]]:
+        """
+        Marks of the exam in lists of at most chunk_size {student_id,
+        roll_number, name, question_label, marks} dicts, ordered by student
+        then question. Read from a cursor, never all at once.
+        """
+
+    # --- Exam analytics ---
+
+    @abstractmethod
+    def exam_summary(self, exam_id: str) -> dict | None:
+        """
+        {students, total_sum, total_sq_sum, questions: {key: {label,
+        count, sum}}} for the exam.
+        """
+
+    @abstractmethod
+    def rebuild_exam_summary(self, exam_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    def exam_totals(self, exam_id: str) -> tuple[int, List[dict]]:
+        """(version, [{student_id, total, questions}]) highest total first."""
+
+    @abstractmethod
+    def check_exam_totals(self, exam_id: str, repair: bool = False) -> dict:
+        """{checked, missing, stale, mismatched, repaired}"""
+
+    @abstractmethod
+    def exam_rankings(self, exam_id: str, limit: int = 0) -> List[dict]:
+        """[{rank, student_id, roll_number, name, total}] highest total first."""
+
+    @abstractmethod
+    def exam_question_stats(self, exam_id: str) -> List[dict]:
+        """[{question_label, count, average, min, max, std_dev}] by label."""
+
+    @abstractmethod
+    def exam_distribution(
+        self, exam_id: str, boundaries: Sequence[float], percentiles: Sequence[int]
+    ) -> dict:
+        """
+        {students, percentiles: {p: value}, histogram: [count per
+        [boundaries[i], boundaries[i + 1])]} over student totals.
+        Percentiles use the nearest rank below.
+        """
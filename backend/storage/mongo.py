@@ -0,0 +1,439 @@
+from datetime import date, datetime
+from itertools import islice
+from typing import Iterator, List, Sequence
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+
+from ..schemas.core import MarkItem
+from ..services import summaries
+from ..services.scan_dedup import SCAN_DEDUP_TTL_SECONDS
+from ..services.workbooks import WORKBOOK_TTL_DAYS
+from ..services.marks import (
+    MARKS_INDEX_KEYS,
+    current_marks,
+    ensure_marks_indexes,
+    mark_upserts,
+    parse_object_id,
+    replace_student_marks,
+)
+from .base import Repository
+
+
+def _out(doc: dict | None, *id_fields: str) -> dict | None:
+    """
+    Mongo document -> repository dict: _id becomes a string id and the
+    given ObjectId references become strings too.
+    """
+    if doc is None:
+        return None
+    out = {k: v for k, v in doc.items() if k != "_id"}
+    out["id"] = str(doc["_id"])
+    for field in id_fields:
+        if field in out:
+            out[field] = str(out[field])
+    return out
+
+
+def _exam_out(doc: dict | None) -> dict | None:
+    out = _out(doc, "subject_id")
+    # BSON has no date type, exam dates are stored as midnight datetimes
+    if out and isinstance(out.get("date"), datetime):
+        out["date"] = out["date"].date()
+    return out
+
+
+class MongoRepository(Repository):
+    def __init__(self, db: Database):
+        self.db = db
+
+    def ensure_schema(self) -> None:
+        ensure_marks_indexes(self.db)
+        summaries.ensure_summary_indexes(self.db)
+        self.db["templates"].create_index("name", unique=True)
+        # Workbooks nobody scanned into for WORKBOOK_TTL_DAYS are removed by Mongo
+        self.db["workbooks"].create_index(
+            "updated_at", expireAfterSeconds=WORKBOOK_TTL_DAYS * 24 * 3600
+        )
+        # Multikey: one entry per key, so a lookup is one index range per key
+        self.db["scan_fingerprints"].create_index(
+            [("scope", ASCENDING), ("keys", ASCENDING), ("created_at", -1)]
+        )
+        self.db["scan_fingerprints"].create_index(
+            "created_at", expireAfterSeconds=int(SCAN_DEDUP_TTL_SECONDS)
+        )
+
+    def valid_id(self, value: str) -> bool:
+        return parse_object_id(value) is not None
+
+    def _find_by_id(self, collection: str, value: str) -> dict | None:
+        oid = parse_object_id(value)
+        if oid is None:
+            return None
+        return self.db[collection].find_one({"_id": oid})
+
+    def _insert(self, collection: str, doc: dict) -> dict:
+        result = self.db[collection].insert_one(doc)
+        doc["_id"] = result.inserted_id
+        return doc
+
+    # --- Users ---
+
+    def get_user_by_username(self, username: str) -> dict | None:
+        return _out(self.db["users"].find_one({"username": username}))
+
+    def find_user(self, username: str, email: str) -> dict | None:
+        return _out(self.db["users"].find_one({"$or": [{"username": username}, {"email": email}]}))
+
+    def create_user(self, doc: dict) -> dict:
+        return _out(self._insert("users", dict(doc)))
+
+    # --- Students ---
+
+    def create_student(self, doc: dict) -> dict:
+        return _out(self._insert("students", dict(doc)))
+
+    def get_student(self, student_id: str) -> dict | None:
+        return _out(self._find_by_id("students", student_id))
+
+    def get_student_by_roll_number(self, roll_number: str) -> dict | None:
+        return _out(self.db["students"].find_one({"roll_number": roll_number}))
+
+    def list_students(self, search: str = "") -> List[dict]:
+        query: dict = {}
+        if search:
+            query = {
+                "$or": [
+                    {"roll_number": {"$regex": search, "$options": "i"}},
+                    {"name": {"$regex": search, "$options": "i"}},
+                ]
+            }
+        return [_out(d) for d in self.db["students"].find(query)]
+
+    def existing_student_ids(self, student_ids: Sequence[str]) -> set[str]:
+        oids = list({oid for oid in map(parse_object_id, student_ids) if oid is not None})
+        return {str(d["_id"]) for d in self.db["students"].find({"_id": {"$in": oids}}, {"_id": 1})}
+
+    def existing_roll_numbers(self, roll_numbers: Sequence[str]) -> set[str]:
+        cursor = self.db["students"].find(
+            {"roll_number": {"$in": list(set(roll_numbers))}}, {"_id": 0, "roll_number": 1}
+        )
+        return {d["roll_number"] for d in cursor}
+
+    def insert_students(self, docs: List[dict]) -> dict[int, str]:
+        if not docs:
+            return {}
+        try:
+            # insert_many adds _id to the documents it is given
+            self.db["students"].insert_many([dict(d) for d in docs], ordered=False)
+        except BulkWriteError as exc:
+            return {
+                e["index"]: e.get("errmsg", "Write failed")
+                for e in exc.details.get("writeErrors", [])
+            }
+        return {}
+
+    # --- Teachers, subjects, exams ---
+
+    def create_teacher(self, doc: dict) -> dict:
+        doc = {**doc, "user_id": ObjectId(doc["user_id"])}
+        return _out(self._insert("teachers", doc), "user_id")
+
+    def get_subject_by_code(self, code: str) -> dict | None:
+        return _out(self.db["subjects"].find_one({"code": code}))
+
+    def create_subject(self, doc: dict) -> dict:
+        return _out(self._insert("subjects", dict(doc)))
+
+    def create_exam(self, doc: dict) -> dict:
+        doc = {**doc, "subject_id": ObjectId(doc["subject_id"])}
+        if isinstance(doc.get("date"), date) and not isinstance(doc["date"], datetime):
+            doc["date"] = datetime.combine(doc["date"], datetime.min.time())
+        return _exam_out(self._insert("exams", doc))
+
+    def get_exam(self, exam_id: str) -> dict | None:
+        return _exam_out(self._find_by_id("exams", exam_id))
+
+    def list_exams(self) -> List[dict]:
+        return [_exam_out(d) for d in self.db["exams"].find()]
+
+    # --- Sheet templates ---
+
+    def create_template(self, doc: dict) -> dict:
+        return _out(self._insert("templates", dict(doc)))
+
+    def get_template(self, template_id: str) -> dict | None:
+        return _out(self._find_by_id("templates", template_id))
+
+    def get_template_by_name(self, name: str) -> dict | None:
+        return _out(self.db["templates"].find_one({"name": name}))
+
+    def list_templates(self) -> List[dict]:
+        return [_out(d) for d in self.db["templates"].find().sort("name", 1)]
+
+    def delete_template(self, template_id: str) -> bool:
+        oid = parse_object_id(template_id)
+        return oid is not None and self.db["templates"].delete_one({"_id": oid}).deleted_count > 0
+
+    # --- Scan workbooks ---
+
+    def create_workbook(self, owner: str, content: bytes, etag: str) -> dict:
+        doc = {"owner": owner, "content": content, "etag": etag, "updated_at": datetime.utcnow()}
+        return _out(self._insert("workbooks", doc))
+
+    def get_workbook(self, workbook_id: str) -> dict | None:
+        return _out(self._find_by_id("workbooks", workbook_id))
+
+    def update_workbook(
+        self, workbook_id: str, content: bytes, etag: str, expected_etag: str
+    ) -> bool:
+        oid = parse_object_id(workbook_id)
+        if oid is None:
+            return False
+        result = self.db["workbooks"].update_one(
+            {"_id": oid, "etag": expected_etag},
+            {"$set": {"content": content, "etag": etag, "updated_at": datetime.utcnow()}},
+        )
+        return result.matched_count > 0
+
+    # --- Scan fingerprints ---
+
+    def save_scan_fingerprint(
+        self, scope: str, keys: List[str], cells: List[str | None], result: dict
+    ) -> None:
+        doc = {
+            "scope": scope,
+            "keys": keys,
+            "cells": cells,
+            "result": result,
+            "created_at": datetime.utcnow(),
+        }
+        self.db["scan_fingerprints"].insert_one(doc)
+
+    def find_scan_fingerprints(
+        self, scope: str, keys: Sequence[str], since: float, limit: int
+    ) -> List[dict]:
+        cursor = (
+            self.db["scan_fingerprints"]
+            .find(
+                {
+                    "scope": scope,
+                    "keys": {"$in": list(keys)},
+                    "created_at": {"$gte": datetime.utcfromtimestamp(since)},
+                },
+                {"cells": 1, "result": 1},
+            )
+            .sort("created_at", -1)
+            .limit(limit)
+        )
+        return [{"cells": d["cells"], "result": d["result"]} for d in cursor]
+
+    # --- Marks ---
+
+    def replace_student_marks(
+        self, student_id: str, exam_id: str, entries: List[MarkItem]
+    ) -> None:
+        replace_student_marks(self.db, ObjectId(student_id), ObjectId(exam_id), entries)
+
+    def bulk_upsert_marks(
+        self, exam_id: str, rows: Sequence[tuple[int, str, List[MarkItem]]]
+    ) -> dict:
+        exam_oid = ObjectId(exam_id)
+        student_oids = [ObjectId(student_id) for _, student_id, _ in rows]
+        seq = summaries.summary_seq(self.db, exam_oid)
+        previous = current_marks(self.db, exam_oid, list(set(student_oids)))
+        merged = {oid: dict(marks) for oid, marks in previous.items()}
+
+        operations = []
+        op_rows: list[int] = []  # operation index -> payload row index
+        for (index, _, entries), student_oid in zip(rows, student_oids):
+            ops = mark_upserts(student_oid, exam_oid, entries)
+            operations.extend(ops)
+            op_rows.extend([index] * len(ops))
+            student_marks = merged.setdefault(student_oid, {})
+            for entry in entries:
+                student_marks[entry.question_label] = entry.marks
+
+        report = {"matched": 0, "upserted": 0, "modified": 0, "errors": {}}
+        if not operations:
+            return report
+
+        try:
+            result = self.db["marks"].bulk_write(operations, ordered=False).bulk_api_result
+        except BulkWriteError as exc:
+            result = exc.details
+            for write_error in result.get("writeErrors", []):
+                index = op_rows[write_error["index"]]
+                report["errors"].setdefault(index, write_error.get("errmsg", "Write failed"))
+        report["matched"] = result.get("nMatched", 0)
+        report["upserted"] = result.get("nUpserted", 0)
+        report["modified"] = result.get("nModified", 0)
+
+        if report["errors"]:
+            # Some upserts of a row may have landed and others not, so the
+            # delta is unknown. Recompute the summary from scratch instead.
+            summaries.rebuild_exam_summary(self.db, exam_oid)
+        else:
+            summaries.apply_summary_delta(
+                self.db,
+                exam_oid,
+                [(oid, previous.get(oid, {}), marks) for oid, marks in merged.items()],
+                seq,
+            )
+        return report
+
+    def iter_exam_marks(self, exam_id: str, chunk_size: int) -> Iterator[List[dict]]:
+        # Equality on exam_id and sort on the rest of the marks index: no
+        # in-memory sort, documents come back in index order
+        cursor = (
+            self.db["marks"]
+            .find(
+                {"exam_id": ObjectId(exam_id)},
+                {"_id": 0, "student_id": 1, "question_label": 1, "marks": 1},
+            )
+            .sort([(key, ASCENDING) for key, _ in MARKS_INDEX_KEYS[1:]])
+            .batch_size(chunk_size)
+        )
+        with cursor:
+            while chunk := list(islice(cursor, chunk_size)):
+                # Roll numbers and names of the chunk's students in one query
+                students = {
+                    d["_id"]: d
+                    for d in self.db["students"].find(
+                        {"_id": {"$in": list({doc["student_id"] for doc in chunk})}},
+                        {"roll_number": 1, "name": 1},
+                    )
+                }
+                yield [
+                    {
+                        "student_id": str(doc["student_id"]),
+                        "roll_number": students.get(doc["student_id"], {}).get("roll_number"),
+                        "name": students.get(doc["student_id"], {}).get("name"),
+                        "question_label": doc["question_label"],
+                        "marks": doc["marks"],
+                    }
+                    for doc in chunk
+                ]
+
+    # --- Exam analytics ---
+
+    def exam_summary(self, exam_id: str) -> dict | None:
+        return summaries.get_exam_summary(self.db, ObjectId(exam_id))
+
+    def rebuild_exam_summary(self, exam_id: str) -> dict:
+        return summaries.rebuild_exam_summary(self.db, ObjectId(exam_id))
+
+    def exam_totals(self, exam_id: str) -> tuple[int, List[dict]]:
+        version, totals = summaries.get_exam_totals(self.db, ObjectId(exam_id))
+        return version, [{**t, "student_id": str(t["student_id"])} for t in totals]
+
+    def check_exam_totals(self, exam_id: str, repair: bool = False) -> dict:
+        return summaries.check_exam_totals(self.db, ObjectId(exam_id), repair=repair)
+
+    def _student_totals_stage(self, exam_id: str) -> list[dict]:
+        return [
+            {"$match": {"exam_id": ObjectId(exam_id)}},
+            {"$group": {"_id": "$student_id", "total": {"$sum": "$marks"}}},
+        ]
+
+    def exam_rankings(self, exam_id: str, limit: int = 0) -> List[dict]:
+        pipeline = self._student_totals_stage(exam_id) + [
+            {
+                "$setWindowFields": {
+                    "sortBy": {"total": -1},
+                    "output": {"rank": {"$rank": {}}},
+                }
+            },
+        ]
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline += [
+            {
+                "$lookup": {
+                    "from": "students",
+                    "localField": "_id",
+                    "foreignField": "_id",
+                    "as": "student",
+                }
+            },
+            {"$unwind": {"path": "$student", "preserveNullAndEmptyArrays": True}},
+        ]
+        return [
+            {
+                "rank": d["rank"],
+                "student_id": str(d["_id"]),
+                "roll_number": d.get("student", {}).get("roll_number"),
+                "name": d.get("student", {}).get("name"),
+                "total": d["total"],
+            }
+            for d in self.db["marks"].aggregate(pipeline)
+        ]
+
+    def exam_question_stats(self, exam_id: str) -> List[dict]:
+        pipeline = [
+            {"$match": {"exam_id": ObjectId(exam_id)}},
+            {
+                "$group": {
+                    "_id": "$question_label",
+                    "count": {"$sum": 1},
+                    "average": {"$avg": "$marks"},
+                    "min": {"$min": "$marks"},
+                    "max": {"$max": "$marks"},
+                    "std_dev": {"$stdDevPop": "$marks"},
+                }
+            },
+            {"$sort": {"_id": 1}},
+        ]
+        return [
+            {
+                "question_label": d["_id"],
+                "count": d["count"],
+                "average": d["average"],
+                "min": d["min"],
+                "max": d["max"],
+                "std_dev": d["std_dev"] or 0.0,
+            }
+            for d in self.db["marks"].aggregate(pipeline)
+        ]
+
+    def exam_distribution(
+        self, exam_id: str, boundaries: Sequence[float], percentiles: Sequence[int]
+    ) -> dict:
+        def _at(p: int) -> dict:
+            # Nearest rank, as the SQL backend: the ceil(p * n / 100)-th smallest
+            rank = {"$ceil": {"$divide": [{"$multiply": [p, "$n"]}, 100]}}
+            index = {"$max": [{"$subtract": [rank, 1]}, 0]}
+            return {"$arrayElemAt": ["$totals", {"$toInt": index}]}
+
+        pipeline = self._student_totals_stage(exam_id) + [
+            {
+                "$facet": {
+                    "sorted": [
+                        {"$sort": {"total": 1}},
+                        {"$group": {"_id": None, "totals": {"$push": "$total"}}},
+                        {"$project": {"totals": 1, "n": {"$size": "$totals"}}},
+                        {"$project": {"n": 1, **{f"p{p}": _at(p) for p in percentiles}}},
+                    ],
+                    "histogram": [
+                        {
+                            "$bucket": {
+                                "groupBy": "$total",
+                                "boundaries": list(boundaries),
+                                "default": "out_of_range",
+                                "output": {"count": {"$sum": 1}},
+                            }
+                        }
+                    ],
+                }
+            },
+        ]
+        facets = next(self.db["marks"].aggregate(pipeline), {"sorted": [], "histogram": []})
+        stats = facets["sorted"][0] if facets["sorted"] else {}
+        counts = {b["_id"]: b["count"] for b in facets["histogram"]}
+        return {
+            "students": stats.get("n", 0),
+            "percentiles": {p: stats.get(f"p{p}", 0) for p in percentiles},
+            "histogram": [counts.get(lower, 0) for lower in boundaries[:-1]],
+        }
@@ -0,0 +1,595 @@
+import math
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Iterator, List, Sequence
+
+from sqlalchemy import create_engine, delete, desc, event, func, insert, make_url, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from ..database import Base
+from ..models.core import (
+    Exam,
+    Mark,
+    ScanFingerprint,
+    ScanFingerprintKey,
+    SheetTemplate,
+    Student,
+    Subject,
+    Teacher,
+    Workbook,
+)
+from ..models.user import User
+from ..schemas.core import MarkItem
+from ..services.scan_dedup import SCAN_DEDUP_TTL_SECONDS
+from ..services.workbooks import WORKBOOK_TTL_DAYS
+from .base import Repository
+
+MARK_KEY = ["exam_id", "student_id", "question_label"]
+# Dialects with INSERT ... ON CONFLICT DO UPDATE, which mark upserts use
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+# Rows per multi-row mark upsert: 4 values a row stays under SQLite's
+# default limit of 999 bound parameters
+MARK_UPSERT_CHUNK = 200
+
+
+def _int_id(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _user_out(u: User | None) -> dict | None:
+    if u is None:
+        return None
+    return {
+        "id": str(u.id),
+        "username": u.username,
+        "full_name": u.full_name,
+        "email": u.email,
+        "role": u.role,
+        "hashed_password": u.hashed_password,
+        "is_active": u.is_active,
+    }
+
+
+def _student_out(s: Student | None) -> dict | None:
+    if s is None:
+        return None
+    return {
+        "id": str(s.id),
+        "roll_number": s.roll_number,
+        "name": s.name,
+        "department": s.department,
+        "year": s.year,
+        "section": s.section,
+    }
+
+
+def _exam_out(e: Exam | None) -> dict | None:
+    if e is None:
+        return None
+    return {
+        "id": str(e.id),
+        "name": e.name,
+        "subject_id": str(e.subject_id),
+        "max_marks": e.max_marks,
+        "date": e.date,
+    }
+
+
+def _template_out(t: SheetTemplate | None) -> dict | None:
+    if t is None:
+        return None
+    return {
+        "id": str(t.id),
+        "name": t.name,
+        "width": t.width,
+        "height": t.height,
+        "cells": t.cells,
+        "fiducials": t.fiducials,
+        "roll_number": t.roll_number,
+    }
+
+
+class SqlRepository(Repository):
+    """
+    Embedded storage on the SQLAlchemy models, meant for SQLite. Summaries
+    and totals are computed with GROUP BY on the marks index at read time,
+    there is nothing materialized to keep in sync (versions are always 0).
+    """
+
+    def __init__(self, url: str):
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        dialect = make_url(url).get_backend_name()
+        if dialect not in UPSERT_INSERTS:
+            raise ValueError(f"SQL storage runs on SQLite or PostgreSQL, not {dialect}")
+        self._upsert_insert = UPSERT_INSERTS[dialect]
+        self.engine = create_engine(url, connect_args=connect_args)
+        if url.startswith("sqlite"):
+            event.listen(self.engine, "connect", self._configure_sqlite)
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+
+    @staticmethod
+    def _configure_sqlite(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers run next to the single writer
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    def ensure_schema(self) -> None:
+        Base.metadata.create_all(self.engine)
+
+    def valid_id(self, value: str) -> bool:
+        return _int_id(value) is not None
+
+    def _add(self, obj):
+        with self.Session.begin() as session:
+            session.add(obj)
+        return obj
+
+    def _get(self, model, value: str):
+        pk = _int_id(value)
+        if pk is None:
+            return None
+        with self.Session() as session:
+            return session.get(model, pk)
+
+    def _first(self, stmt):
+        with self.Session() as session:
+            return session.scalars(stmt).first()
+
+    # --- Users ---
+
+    def get_user_by_username(self, username: str) -> dict | None:
+        return _user_out(self._first(select(User).where(User.username == username)))
+
+    def find_user(self, username: str, email: str) -> dict | None:
+        stmt = select(User).where(or_(User.username == username, User.email == email))
+        return _user_out(self._first(stmt))
+
+    def create_user(self, doc: dict) -> dict:
+        return _user_out(self._add(User(**doc)))
+
+    # --- Students ---
+
+    def create_student(self, doc: dict) -> dict:
+        return _student_out(self._add(Student(**doc)))
+
+    def get_student(self, student_id: str) -> dict | None:
+        return _student_out(self._get(Student, student_id))
+
+    def get_student_by_roll_number(self, roll_number: str) -> dict | None:
+        return _student_out(self._first(select(Student).where(Student.roll_number == roll_number)))
+
+    def list_students(self, search: str = "") -> List[dict]:
+        stmt = select(Student)
+        if search:
+            stmt = stmt.where(
+                or_(
+                    Student.roll_number.icontains(search, autoescape=True),
+                    Student.name.icontains(search, autoescape=True),
+                )
+            )
+        with self.Session() as session:
+            return [_student_out(s) for s in session.scalars(stmt)]
+
+    def existing_student_ids(self, student_ids: Sequence[str]) -> set[str]:
+        pks = {pk for pk in map(_int_id, student_ids) if pk is not None}
+        with self.Session() as session:
+            found = session.scalars(select(Student.id).where(Student.id.in_(pks)))
+            return {str(pk) for pk in found}
+
+    def existing_roll_numbers(self, roll_numbers: Sequence[str]) -> set[str]:
+        with self.Session() as session:
+            stmt = select(Student.roll_number).where(Student.roll_number.in_(set(roll_numbers)))
+            return set(session.scalars(stmt))
+
+    def insert_students(self, docs: List[dict]) -> dict[int, str]:
+        if not docs:
+            return {}
+        try:
+            with self.Session.begin() as session:
+                session.execute(insert(Student), docs)  # executemany
+            return {}
+        except IntegrityError:
+            pass
+        # Something in the batch clashes (e.g. an import running at the
+        # same time): the batch was rolled back, insert one by one instead
+        errors = {}
+        for index, doc in enumerate(docs):
+            try:
+                with self.Session.begin() as session:
+                    session.execute(insert(Student), [doc])
+            except IntegrityError as exc:
+                errors[index] = str(exc.orig)
+        return errors
+
+    # --- Teachers, subjects, exams ---
+
+    def create_teacher(self, doc: dict) -> dict:
+        t = self._add(Teacher(**{**doc, "user_id": int(doc["user_id"])}))
+        return {
+            "id": str(t.id),
+            "user_id": str(t.user_id),
+            "name": t.name,
+            "department": t.department,
+        }
+
+    def get_subject_by_code(self, code: str) -> dict | None:
+        s = self._first(select(Subject).where(Subject.code == code))
+        return {"id": str(s.id), "name": s.name, "code": s.code} if s else None
+
+    def create_subject(self, doc: dict) -> dict:
+        s = self._add(Subject(**doc))
+        return {"id": str(s.id), "name": s.name, "code": s.code}
+
+    def create_exam(self, doc: dict) -> dict:
+        return _exam_out(self._add(Exam(**{**doc, "subject_id": int(doc["subject_id"])})))
+
+    def get_exam(self, exam_id: str) -> dict | None:
+        return _exam_out(self._get(Exam, exam_id))
+
+    def list_exams(self) -> List[dict]:
+        with self.Session() as session:
+            return [_exam_out(e) for e in session.scalars(select(Exam))]
+
+    # --- Sheet templates ---
+
+    def create_template(self, doc: dict) -> dict:
+        return _template_out(self._add(SheetTemplate(**doc)))
+
+    def get_template(self, template_id: str) -> dict | None:
+        return _template_out(self._get(SheetTemplate, template_id))
+
+    def get_template_by_name(self, name: str) -> dict | None:
+        return _template_out(self._first(select(SheetTemplate).where(SheetTemplate.name == name)))
+
+    def list_templates(self) -> List[dict]:
+        with self.Session() as session:
+            stmt = select(SheetTemplate).order_by(SheetTemplate.name)
+            return [_template_out(t) for t in session.scalars(stmt)]
+
+    def delete_template(self, template_id: str) -> bool:
+        pk = _int_id(template_id)
+        if pk is None:
+            return False
+        with self.Session.begin() as session:
+            result = session.execute(delete(SheetTemplate).where(SheetTemplate.id == pk))
+            return result.rowcount > 0
+
+    # --- Scan workbooks ---
+
+    def create_workbook(self, owner: str, content: bytes, etag: str) -> dict:
+        now = datetime.utcnow()
+        with self.Session.begin() as session:
+            # No TTL index here: expired workbooks go when a new one is made
+            session.execute(
+                delete(Workbook).where(Workbook.updated_at < now - timedelta(days=WORKBOOK_TTL_DAYS))
+            )
+            w = Workbook(owner=owner, content=content, etag=etag, updated_at=now)
+            session.add(w)
+        return {"id": str(w.id), "owner": owner, "etag": etag, "updated_at": now}
+
+    def get_workbook(self, workbook_id: str) -> dict | None:
+        w = self._get(Workbook, workbook_id)
+        if w is None:
+            return None
+        return {
+            "id": str(w.id),
+            "owner": w.owner,
+            "content": w.content,
+            "etag": w.etag,
+            "updated_at": w.updated_at,
+        }
+
+    def update_workbook(
+        self, workbook_id: str, content: bytes, etag: str, expected_etag: str
+    ) -> bool:
+        pk = _int_id(workbook_id)
+        if pk is None:
+            return False
+        with self.Session.begin() as session:
+            result = session.execute(
+                update(Workbook)
+                .where(Workbook.id == pk, Workbook.etag == expected_etag)
+                .values(content=content, etag=etag, updated_at=datetime.utcnow())
+            )
+            return result.rowcount > 0
+
+    # --- Scan fingerprints ---
+
+    def save_scan_fingerprint(
+        self, scope: str, keys: List[str], cells: List[str | None], result: dict
+    ) -> None:
+        now = datetime.utcnow()
+        with self.Session.begin() as session:
+            # No TTL index here either: expired fingerprints go on the next save
+            expired = select(ScanFingerprint.id).where(
+                ScanFingerprint.created_at < now - timedelta(seconds=SCAN_DEDUP_TTL_SECONDS)
+            )
+            session.execute(
+                delete(ScanFingerprintKey).where(ScanFingerprintKey.fingerprint_id.in_(expired))
+            )
+            session.execute(
+                delete(ScanFingerprint).where(
+                    ScanFingerprint.created_at < now - timedelta(seconds=SCAN_DEDUP_TTL_SECONDS)
+                )
+            )
+            fingerprint = ScanFingerprint(scope=scope, cells=cells, result=result, created_at=now)
+            session.add(fingerprint)
+            session.flush()
+            session.execute(
+                insert(ScanFingerprintKey),
+                [{"fingerprint_id": fingerprint.id, "scope": scope, "key": key} for key in keys],
+            )
+
+    def find_scan_fingerprints(
+        self, scope: str, keys: Sequence[str], since: float, limit: int
+    ) -> List[dict]:
+        matching = select(ScanFingerprintKey.fingerprint_id).where(
+            ScanFingerprintKey.scope == scope, ScanFingerprintKey.key.in_(list(keys))
+        )
+        stmt = (
+            select(ScanFingerprint.cells, ScanFingerprint.result)
+            .where(
+                ScanFingerprint.id.in_(matching),
+                ScanFingerprint.created_at >= datetime.utcfromtimestamp(since),
+            )
+            .order_by(desc(ScanFingerprint.id))
+            .limit(limit)
+        )
+        with self.Session() as session:
+            return [{"cells": cells, "result": result} for cells, result in session.execute(stmt)]
+
+    # --- Marks ---
+
+    def _upsert_marks(self, session, rows: List[dict]) -> None:
+        if not rows:
+            return
+        # One INSERT ... VALUES (...), (...) per chunk. Passing the rows as
+        # execute() parameters instead would be a DBAPI executemany, one
+        # statement per row.
+        for start in range(0, len(rows), MARK_UPSERT_CHUNK):
+            stmt = self._upsert_insert(Mark).values(rows[start:start + MARK_UPSERT_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=MARK_KEY, set_={"marks": stmt.excluded.marks}
+            )
+            session.execute(stmt)
+
+    def replace_student_marks(
+        self, student_id: str, exam_id: str, entries: List[MarkItem]
+    ) -> None:
+        sid, eid = int(student_id), int(exam_id)
+        marks = {entry.question_label: entry.marks for entry in entries}
+        with self.Session.begin() as session:
+            self._upsert_marks(
+                session,
+                [
+                    {"exam_id": eid, "student_id": sid, "question_label": label, "marks": value}
+                    for label, value in marks.items()
+                ],
+            )
+            session.execute(
+                delete(Mark).where(
+                    Mark.exam_id == eid,
+                    Mark.student_id == sid,
+                    Mark.question_label.not_in(list(marks)),
+                )
+            )
+
+    def bulk_upsert_marks(
+        self, exam_id: str, rows: Sequence[tuple[int, str, List[MarkItem]]]
+    ) -> dict:
+        report = {"matched": 0, "upserted": 0, "modified": 0, "errors": {}}
+        try:
+            self._write_marks(int(exam_id), rows, report)
+            return report
+        except IntegrityError:
+            pass
+        # A row breaks a constraint (e.g. a student deleted meanwhile): the
+        # batch was rolled back, write row by row to report just that one
+        report = {"matched": 0, "upserted": 0, "modified": 0, "errors": {}}
+        for row in rows:
+            try:
+                self._write_marks(int(exam_id), [row], report)
+            except IntegrityError as exc:
+                report["errors"][row[0]] = str(exc.orig)
+        return report
+
+    def _write_marks(
+        self, eid: int, rows: Sequence[tuple[int, str, List[MarkItem]]], report: dict
+    ) -> None:
+        """Upsert rows in one transaction, adding their counts to report."""
+        wanted: dict[tuple[int, str], int] = {}
+        for _, student_id, entries in rows:
+            for entry in entries:
+                wanted[(int(student_id), entry.question_label)] = entry.marks
+
+        counts = {"matched": 0, "upserted": 0, "modified": 0}
+        with self.Session.begin() as session:
+            existing = {
+                (sid, label): value
+                for sid, label, value in session.execute(
+                    select(Mark.student_id, Mark.question_label, Mark.marks).where(
+                        Mark.exam_id == eid,
+                        Mark.student_id.in_({sid for sid, _ in wanted}),
+                    )
+                )
+            }
+            for key, value in wanted.items():
+                if key not in existing:
+                    counts["upserted"] += 1
+                else:
+                    counts["matched"] += 1
+                    counts["modified"] += existing[key] != value
+            self._upsert_marks(
+                session,
+                [
+                    {"exam_id": eid, "student_id": sid, "question_label": label, "marks": value}
+                    for (sid, label), value in wanted.items()
+                ],
+            )
+        # Only counted once committed
+        for key, value in counts.items():
+            report[key] += value
+
+    def iter_exam_marks(self, exam_id: str, chunk_size: int) -> Iterator[List[dict]]:
+        stmt = (
+            select(
+                Mark.student_id,
+                Student.roll_number,
+                Student.name,
+                Mark.question_label,
+                Mark.marks,
+            )
+            .outerjoin(Student, Student.id == Mark.student_id)
+            .where(Mark.exam_id == int(exam_id))
+            .order_by(Mark.student_id, Mark.question_label)
+            .execution_options(yield_per=chunk_size)
+        )
+        with self.Session() as session:
+            for rows in session.execute(stmt).partitions():
+                yield [
+                    {
+                        "student_id": str(row.student_id),
+                        "roll_number": row.roll_number,
+                        "name": row.name,
+                        "question_label": row.question_label,
+                        "marks": row.marks,
+                    }
+                    for row in rows
+                ]
+
+    # --- Exam analytics ---
+
+    def _student_totals(self, eid: int):
+        return (
+            select(
+                Mark.student_id,
+                func.sum(Mark.marks).label("total"),
+                func.count().label("questions"),
+            )
+            .where(Mark.exam_id == eid)
+            .group_by(Mark.student_id)
+        )
+
+    def exam_summary(self, exam_id: str) -> dict | None:
+        eid = int(exam_id)
+        with self.Session() as session:
+            totals = [row.total for row in session.execute(self._student_totals(eid))]
+            questions = session.execute(
+                select(Mark.question_label, func.count(), func.sum(Mark.marks))
+                .where(Mark.exam_id == eid)
+                .group_by(Mark.question_label)
+            ).all()
+        return {
+            "students": len(totals),
+            "total_sum": sum(totals),
+            "total_sq_sum": sum(t * t for t in totals),
+            "questions": {
+                label: {"label": label, "count": count, "sum": total}
+                for label, count, total in questions
+            },
+            "version": 0,
+        }
+
+    def rebuild_exam_summary(self, exam_id: str) -> dict:
+        return self.exam_summary(exam_id)
+
+    def exam_totals(self, exam_id: str) -> tuple[int, List[dict]]:
+        with self.Session() as session:
+            stmt = self._student_totals(int(exam_id)).order_by(desc("total"))
+            return 0, [
+                {
+                    "student_id": str(row.student_id),
+                    "total": row.total,
+                    "questions": row.questions,
+                }
+                for row in session.execute(stmt)
+            ]
+
+    def check_exam_totals(self, exam_id: str, repair: bool = False) -> dict:
+        _, totals = self.exam_totals(exam_id)
+        return {"checked": len(totals), "missing": 0, "stale": 0, "mismatched": 0, "repaired": False}
+
+    def exam_rankings(self, exam_id: str, limit: int = 0) -> List[dict]:
+        with self.Session() as session:
+            totals = self._student_totals(int(exam_id)).subquery()
+            stmt = (
+                select(
+                    func.rank().over(order_by=desc(totals.c.total)).label("rank"),
+                    totals.c.student_id,
+                    totals.c.total,
+                    Student.roll_number,
+                    Student.name,
+                )
+                .outerjoin(Student, Student.id == totals.c.student_id)
+                .order_by(desc(totals.c.total))
+            )
+            if limit:
+                stmt = stmt.limit(limit)
+            return [
+                {
+                    "rank": row.rank,
+                    "student_id": str(row.student_id),
+                    "roll_number": row.roll_number,
+                    "name": row.name,
+                    "total": row.total,
+                }
+                for row in session.execute(stmt)
+            ]
+
+    def exam_question_stats(self, exam_id: str) -> List[dict]:
+        with self.Session() as session:
+            rows = session.execute(
+                select(
+                    Mark.question_label,
+                    func.count(),
+                    func.avg(Mark.marks),
+                    func.min(Mark.marks),
+                    func.max(Mark.marks),
+                    func.avg(Mark.marks * Mark.marks),
+                )
+                .where(Mark.exam_id == int(exam_id))
+                .group_by(Mark.question_label)
+                .order_by(Mark.question_label)
+            ).all()
+        return [
+            {
+                "question_label": label,
+                "count": count,
+                "average": mean,
+                "min": low,
+                "max": high,
+                # SQLite has no stddev, derive it from E[x^2] - E[x]^2
+                "std_dev": math.sqrt(max(mean_sq - mean * mean, 0.0)),
+            }
+            for label, count, mean, low, high, mean_sq in rows
+        ]
+
+    def exam_distribution(
+        self, exam_id: str, boundaries: Sequence[float], percentiles: Sequence[int]
+    ) -> dict:
+        with self.Session() as session:
+            stmt = self._student_totals(int(exam_id)).order_by("total")
+            totals = [row.total for row in session.execute(stmt)]
+
+        histogram = [0] * (len(boundaries) - 1)
+        for total in totals:
+            index = bisect_right(boundaries, total) - 1
+            if 0 <= index < len(histogram):
+                histogram[index] += 1
+        n = len(totals)
+        return {
+            "students": n,
+            # Nearest rank: the ceil(p * n / 100)-th smallest total
+            "percentiles": {
+                p: totals[max(math.ceil(p * n / 100) - 1, 0)] if n else 0 for p in percentiles
+            },
+            "histogram": histogram,
+        }
@@ -0,0 +1,66 @@
+import io
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.getcwd())
+
+from backend.ocr.codecs import decode
+
+RUNS = int(os.getenv("BENCH_RUNS", "20"))
+
+
+def _frame(width: int = 1280, height: int = 720) -> np.ndarray:
+    """A webcam-sized frame of a marks grid on a desk, with sensor noise."""
+    rng = np.random.default_rng(0)
+    image = np.full((height, width, 3), (90, 110, 130), dtype=np.uint8)
+    cv2.rectangle(image, (200, 60), (1080, 680), (235, 235, 235), -1)
+    for i in range(5):
+        cv2.line(image, (260, 100 + i * 140), (1020, 100 + i * 140), (30, 30, 30), 3)
+    for j in range(3):
+        cv2.line(image, (260 + j * 380, 100), (260 + j * 380, 660), (30, 30, 30), 3)
+    for i in range(4):
+        for j in range(2):
+            cv2.putText(image, str(i * 2 + j + 3), (400 + j * 380, 190 + i * 140),
+                        cv2.FONT_HERSHEY_SIMPLEX, 2, (40, 40, 40), 5)
+    noise = rng.normal(0, 4, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def _pil_decode(data: bytes) -> np.ndarray:
+    # Previous path: PIL, then RGB -> BGR copy
+    return np.array(Image.open(io.BytesIO(data)).convert("RGB"))[:, :, ::-1].copy()
+
+
+def _time(fn, data: bytes) -> float:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn(data)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    image = _frame()
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    captures = {
+        "png": cv2.imencode(".png", image)[1],
+        "jpeg q85": cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])[1],
+        "jpeg q85 gray": cv2.imencode(".jpg", gray, [cv2.IMWRITE_JPEG_QUALITY, 85])[1],
+        "webp q85": cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, 85])[1],
+    }
+
+    print(f"frame {image.shape[1]}x{image.shape[0]}, median of {RUNS} runs")
+    print(f"{'format':>14} {'KB':>8} {'base64 KB':>10} {'PIL ms':>8} {'imdecode ms':>12}")
+    for label, encoded in captures.items():
+        data = encoded.tobytes()
+        print(
+            f"{label:>14} {len(data) / 1024:8.1f} {len(data) * 4 / 3 / 1024:10.1f} "
+            f"{_time(_pil_decode, data):8.2f} {_time(decode, data):12.2f}"
+        )
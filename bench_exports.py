@@ -0,0 +1,83 @@
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+from openpyxl import Workbook
+
+sys.path.append(os.getcwd())
+
+from backend.services import exports
+
+STUDENTS = int(os.getenv("BENCH_STUDENTS", "2000"))
+QUESTIONS = int(os.getenv("BENCH_QUESTIONS", "20"))
+
+
+def _chunks():
+    """Marks as the repository yields them: chunks of EXPORT_CHUNK_SIZE rows."""
+    chunk = []
+    for s in range(STUDENTS):
+        for q in range(QUESTIONS):
+            chunk.append(
+                {
+                    "student_id": f"{s:024x}",
+                    "roll_number": f"R{s:05d}",
+                    "name": f"Student {s}",
+                    "question_label": f"Q{q + 1}",
+                    "marks": (s + q) % 11,
+                }
+            )
+            if len(chunk) == exports.EXPORT_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _xlsx(chunks) -> bytes:
+    # The Excel route: every row in an openpyxl workbook, saved at the end
+    wb = Workbook()
+    ws = wb.active
+    ws.append(exports.COLUMNS)
+    for chunk in chunks:
+        for row in chunk:
+            ws.append([row[c] for c in exports.COLUMNS])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _measure(fn) -> tuple[float, int, float]:
+    """(ms, output bytes, peak MB of Python allocations)"""
+    start = time.perf_counter()
+    size = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    # Second run for memory, tracemalloc slows everything down
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, size, peak / 2**20
+
+
+def _streamed(fmt: str):
+    return lambda: sum(len(part) for part in exports.export_stream(_chunks(), fmt))
+
+
+if __name__ == "__main__":
+    runs = {
+        "xlsx": lambda: len(_xlsx(_chunks())),
+        "csv": _streamed("csv"),
+    }
+    if exports.arrow_available():
+        runs["parquet"] = _streamed("parquet")
+        runs["arrow"] = _streamed("arrow")
+    else:
+        print("pyarrow not installed, skipping parquet and arrow")
+
+    print(f"{STUDENTS} students x {QUESTIONS} questions = {STUDENTS * QUESTIONS} marks")
+    print(f"{'format':>8} {'ms':>9} {'KB':>9} {'peak MB':>8}")
+    for fmt, fn in runs.items():
+        elapsed, size, peak = _measure(fn)
+        print(f"{fmt:>8} {elapsed:9.1f} {size / 1024:9.1f} {peak:8.1f}")
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+from backend.database import MONGO_URL
+from backend.schemas.core import MarkItem
+from backend.services.marks import ensure_marks_indexes, replace_student_marks
+
+# Runs against a scratch database so real marks are never touched.
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "marksdb_bench")
+STUDENTS = int(os.getenv("BENCH_STUDENTS", "60"))
+QUESTIONS = int(os.getenv("BENCH_QUESTIONS", "10"))
+
+
+def make_entries(offset: int) -> list[MarkItem]:
+    return [MarkItem(question_label=f"Q{q + 1}", marks=(q + offset) % 10) for q in range(QUESTIONS)]
+
+
+def delete_insert(db, student_oid, exam_oid, entries) -> int:
+    """Old write path. Returns the number of documents written."""
+    deleted = db["marks"].delete_many({"student_id": student_oid, "exam_id": exam_oid}).deleted_count
+    db["marks"].insert_many(
+        [
+            {
+                "student_id": student_oid,
+                "exam_id": exam_oid,
+                "question_label": e.question_label,
+                "marks": e.marks,
+            }
+            for e in entries
+        ]
+    )
+    return deleted + len(entries)
+
+
+def upsert(db, student_oid, exam_oid, entries) -> int:
+    """New write path. Returns the number of documents written."""
+    result = replace_student_marks(db, student_oid, exam_oid, entries)
+    return result.upserted_count + result.modified_count + result.deleted_count
+
+
+def run(name, write, db, students, exam_oid):
+    db["marks"].delete_many({})
+    for s in students:
+        write(db, s, exam_oid, make_entries(0))
+
+    for label, offset in (("unchanged resubmission", 0), ("one changed mark", None)):
+        docs = 0
+        start = time.perf_counter()
+        for s in students:
+            entries = make_entries(0)
+            if offset is None:
+                entries[0] = MarkItem(question_label="Q1", marks=entries[0].marks + 1)
+            docs += write(db, s, exam_oid, entries)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:14s} {label:24s} {elapsed * 1000 / len(students):7.2f} ms/student  "
+            f"{docs / len(students):5.1f} docs written/student"
+        )
+
+
+def main():
+    client = MongoClient(MONGO_URL)
+    db = client[BENCH_DB_NAME]
+    students = [ObjectId() for _ in range(STUDENTS)]
+    exam_oid = ObjectId()
+
+    print(f"{STUDENTS} students x {QUESTIONS} questions on database '{BENCH_DB_NAME}'")
+    db["marks"].drop()
+    run("delete+insert", delete_insert, db, students, exam_oid)
+    db["marks"].drop()
+    ensure_marks_indexes(db)
+    run("upsert", upsert, db, students, exam_oid)
+    client.drop_database(BENCH_DB_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from backend.ocr.preprocess import Preprocessor
+
+RUNS = int(os.getenv("BENCH_RUNS", "30"))
+
+
+def _sheet(width: int, height: int) -> np.ndarray:
+    """A white page with one line of handwriting-sized text."""
+    image = np.full((height, width, 3), 245, dtype=np.uint8)
+    cv2.putText(image, "Q1 - 7", (width // 6, height // 6), cv2.FONT_HERSHEY_SIMPLEX,
+                width / 700, (30, 30, 30), max(2, width // 400))
+    return image
+
+
+def _cell() -> np.ndarray:
+    image = np.full((150, 200, 3), 240, dtype=np.uint8)
+    cv2.rectangle(image, (0, 0), (199, 149), (0, 0, 0), 3)
+    cv2.putText(image, "17", (60, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.8, (20, 20, 20), 4)
+    return image
+
+
+def _time(fn, *args) -> float:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+# --- Previous implementations, for comparison ---
+
+def legacy_page(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    thresh = cv2.adaptiveThreshold(
+        blur, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2
+    )
+    return cv2.resize(thresh, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC)
+
+
+def legacy_cell(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    resized = cv2.resize(gray, None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC)
+    _, th_inv = cv2.threshold(resized, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    cv2.findContours(th_inv, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    _, th_clean = cv2.threshold(resized, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return th_clean
+
+
+def bench_page(width: int, height: int) -> None:
+    image = _sheet(width, height)
+    engine = Preprocessor()
+    gray = engine.gray(image).copy()
+    blur = engine.blur(gray).copy()
+    binary = engine.adaptive_threshold(blur).copy()
+
+    print(f"\npage {width}x{height} (ms, median of {RUNS})")
+    print(f"  gray               {_time(engine.gray, image):8.2f}")
+    print(f"  blur               {_time(engine.blur, gray):8.2f}")
+    print(f"  adaptive threshold {_time(engine.adaptive_threshold, blur):8.2f}")
+    print(f"  upscale full page  {_time(engine.upscale, binary):8.2f}")
+    print(f"  page() total       {_time(engine.page, image):8.2f}")
+    print(f"  previous pipeline  {_time(legacy_page, image):8.2f}")
+
+
+def bench_cell() -> None:
+    image = _cell()
+    engine = Preprocessor()
+    gray = engine.gray(image).copy()
+
+    print(f"\ngrid cell 200x150 (ms, median of {RUNS})")
+    print(f"  gray               {_time(engine.gray, image):8.3f}")
+    print(f"  otsu               {_time(engine.otsu_inv, gray):8.3f}")
+    print(f"  digit_canvas total {_time(engine.digit_canvas, image):8.3f}")
+    print(f"  previous pipeline  {_time(legacy_cell, image):8.3f}")
+
+
+if __name__ == "__main__":
+    cv2.setNumThreads(1)  # as in the OCR workers
+    bench_page(1600, 1200)
+    bench_page(4000, 3000)
+    bench_cell()
@@ -0,0 +1,51 @@
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from backend.services import roster
+from bench_storage import make_repository
+
+# Roster onboarding: one request per student versus the chunked import.
+#   python bench_roster_import.py sqlite mongo
+STUDENTS = int(os.getenv("BENCH_STUDENTS", "5000"))
+
+
+def _csv(prefix: str) -> bytes:
+    lines = ["roll_number,name,department,year,section"]
+    lines += [f"{prefix}{i:05d},Student {i},CSE,{i % 4 + 1},{'ABC'[i % 3]}" for i in range(STUDENTS)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _per_request(repo, data: bytes) -> None:
+    # What POST /students does for each row: a find_one, then an insert
+    for _, record in roster.read_roster(io.BytesIO(data)):
+        if repo.get_student_by_roll_number(record["roll_number"]) is None:
+            repo.create_student(record)
+
+
+def run(name: str):
+    repo, cleanup = make_repository(name)
+    print(f"{name}: {STUDENTS} students, chunks of {roster.ROSTER_CHUNK_SIZE}")
+    try:
+        repo.ensure_schema()
+        for label, fn in (
+            ("one request per student", lambda: _per_request(repo, _csv("A"))),
+            ("roster import", lambda: roster.import_roster(repo, roster.read_roster(io.BytesIO(_csv("B"))))),
+        ):
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            print(f"  {label:24s} {elapsed * 1000:9.1f} ms  {STUDENTS / elapsed:9.0f} rows/s")
+
+        report = roster.import_roster(repo, roster.read_roster(io.BytesIO(_csv("B"))))
+        print(f"  re-import: {report['inserted']} inserted, {len(report['errors'])} duplicates reported")
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    for backend in sys.argv[1:] or ["sqlite"]:
+        run(backend)
@@ -0,0 +1,110 @@
+import os
+import random
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from backend.ocr.fingerprint import header_size, sheet_fingerprint
+from backend.services import scan_dedup
+
+# Repeated scans of a sheet: how often a retake is caught, how often a
+# different sheet is mistaken for one, and what fingerprinting and the
+# index lookup cost.
+#   python bench_scan_dedup.py
+SHEETS = int(os.getenv("BENCH_SHEETS", "30"))
+ROWS, COLS = 4, 2
+
+
+def _sheet(marks: list, roll: int = 21045) -> np.ndarray:
+    """A ruled rows x cols sheet with the marks written in, under a roll number."""
+    image = np.full((1500, 1000, 3), 235, np.uint8)
+    cv2.putText(
+        image, f"Roll No: {roll}", (70, 300), cv2.FONT_HERSHEY_SIMPLEX, 2, (30, 30, 30), 5,
+    )
+    for i in range(ROWS + 1):
+        cv2.line(image, (50, 380 + i * 250), (950, 380 + i * 250), (20, 20, 20), 6)
+    for j in range(COLS + 1):
+        cv2.line(image, (50 + j * 450, 380), (50 + j * 450, 1380), (20, 20, 20), 6)
+    for k, mark in enumerate(marks):
+        i, j = divmod(k, COLS)
+        cv2.putText(
+            image, str(mark), (220 + j * 450, 540 + i * 250),
+            cv2.FONT_HERSHEY_SIMPLEX, 3, (30, 30, 30), 8,
+        )
+    return image
+
+
+def _photo(image: np.ndarray, seed: int, shift: float, turn: float) -> np.ndarray:
+    """The sheet photographed again: moved, turned, lit and noisy differently."""
+    rng = np.random.default_rng(seed)
+    h, w = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-turn, turn), rng.uniform(0.98, 1.02))
+    matrix[:, 2] += rng.uniform(-shift, shift, 2)
+    out = cv2.warpAffine(image, matrix, (w, h), borderValue=(120, 110, 100))
+    out = cv2.convertScaleAbs(out, alpha=rng.uniform(0.9, 1.1), beta=rng.uniform(-15, 15))
+    return np.clip(out + rng.normal(0, 5, out.shape), 0, 255).astype(np.uint8)
+
+
+def _fingerprint(image: np.ndarray):
+    return sheet_fingerprint(image, ROWS, COLS)
+
+
+def accuracy():
+    rng = random.Random(7)
+    print(
+        f"{SHEETS} sheets, SCAN_DEDUP_MAX_DISTANCE={scan_dedup.SCAN_DEDUP_MAX_DISTANCE}, "
+        f"SCAN_DEDUP_HEADER_DISTANCE={scan_dedup.SCAN_DEDUP_HEADER_DISTANCE}"
+    )
+    for label, shift, turn in (("same frame", 0, 0), ("steady retake", 8, 0.5), ("moved retake", 25, 2)):
+        caught = mistaken = other_student = 0
+        for n in range(SHEETS):
+            marks = [rng.randint(0, 10) for _ in range(ROWS * COLS)]
+            roll = rng.randint(10000, 99998)
+            first = _fingerprint(_photo(_sheet(marks, roll), n, shift, turn))
+            again = _fingerprint(_photo(_sheet(marks, roll), n if not shift else n + 1000, shift, turn))
+            # A different sheet: one mark changed
+            other = list(marks)
+            k = rng.randrange(len(other))
+            other[k] = (other[k] + rng.randint(1, 9)) % 11
+            changed = _fingerprint(_photo(_sheet(other, roll), n + 2000, shift, turn))
+            # Another student's sheet with the very same marks: the next roll number
+            next_roll = _fingerprint(_photo(_sheet(marks, roll + 1), n + 3000, shift, turn))
+            caught += scan_dedup.same_sheet(first, again, header_size())
+            mistaken += scan_dedup.same_sheet(first, changed, header_size())
+            other_student += scan_dedup.same_sheet(first, next_roll, header_size())
+        print(
+            f"  {label:14s} retakes caught {caught}/{SHEETS}, one-mark changes taken as retakes "
+            f"{mistaken}/{SHEETS}, same marks of the next roll number {other_student}/{SHEETS}"
+        )
+
+
+def speed():
+    image = _photo(_sheet([3, 7, 10, 0, 5, 5, 9, 1]), 1, 8, 0.5)
+    start = time.perf_counter()
+    for _ in range(20):
+        fingerprint = _fingerprint(image)
+    print(f"fingerprint: {(time.perf_counter() - start) / 20 * 1000:.1f} ms per sheet")
+
+    rng = random.Random(3)
+    for size in (100, 1000, 10000):
+        index = scan_dedup.ScanIndex(max_entries=size)
+        length = ROWS * COLS + header_size()
+        for _ in range(size):
+            # Random cell hashes: most keys are not shared
+            index.add(
+                "exam:1:4x2", [rng.getrandbits(64) for _ in range(length)], {"marks": []}, header_size()
+            )
+        queries = [[rng.getrandbits(64) for _ in range(length)] for _ in range(1000)]
+        start = time.perf_counter()
+        for query in queries:
+            index.find("exam:1:4x2", query, header_size())
+        print(f"  lookup with {size:6d} sheets: {(time.perf_counter() - start) / len(queries) * 1e6:6.1f} us")
+
+
+if __name__ == "__main__":
+    accuracy()
+    speed()
@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from backend.ocr.shm import attach_frame, shared_frame
+
+RUNS = int(os.getenv("BENCH_RUNS", "20"))
+# 12 MP phone photo, BGR
+SHAPE = (3000, 4000, 3)
+
+
+def _checksum(frame) -> int:
+    # Touch a row per 100 so the worker actually reads the pixels
+    with attach_frame(frame) as image:
+        return int(image[::100].sum())
+
+
+def _measure(pool: ProcessPoolExecutor, image: np.ndarray, shared: bool) -> list[float]:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        if shared:
+            with shared_frame(image) as handle:
+                pool.submit(_checksum, handle).result()
+        else:
+            pool.submit(_checksum, image).result()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+if __name__ == "__main__":
+    image = np.random.default_rng(0).integers(0, 256, SHAPE, dtype=np.uint8)
+    print(f"frame {SHAPE[1]}x{SHAPE[0]}x{SHAPE[2]}: {image.nbytes / 1e6:.1f} MB, {RUNS} runs")
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pool.submit(_checksum, image[:1]).result()  # start the worker
+        for label, shared in (("pickle", False), ("shared memory", True)):
+            timings = _measure(pool, image, shared)
+            print(
+                f"{label:>14}: median {statistics.median(timings):.1f} ms, "
+                f"max {max(timings):.1f} ms per frame"
+            )
@@ -0,0 +1,77 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HEAVY_MODULES = ["cv2", "pytesseract", "openpyxl", "google.cloud.vision"]
+RUNS = int(os.getenv("BENCH_RUNS", "5"))
+PORT = int(os.getenv("BENCH_PORT", "8765"))
+
+IMPORT_SNIPPET = f"""
+import json, sys, time
+start = time.perf_counter()
+import backend.main
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import() -> None:
+    timings = []
+    loaded = []
+    for _ in range(RUNS):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        timings.append(result["ms"])
+        loaded = result["loaded"]
+    print(f"import backend.main: median {statistics.median(timings):.0f} ms over {RUNS} runs")
+    print(f"heavy modules loaded at import: {loaded or 'none'}")
+
+
+def _get(path: str) -> int:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{PORT}{path}", timeout=1) as res:
+            return res.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def measure_boot(timeout: float = 60.0) -> None:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(PORT)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    healthy_at = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                status = _get("/api/health" if healthy_at is None else "/api/ready")
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+                continue
+            now = time.perf_counter() - start
+            if healthy_at is None and status == 200:
+                healthy_at = now
+                print(f"/api/health answered after {healthy_at * 1000:.0f} ms")
+            elif healthy_at is not None and status == 200:
+                print(f"/api/ready answered after {now * 1000:.0f} ms")
+                return
+            time.sleep(0.05)
+        print(f"/api/ready not ready within {timeout:.0f} s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    sys.path.append(os.getcwd())
+    measure_import()
+    measure_boot(float(os.getenv("BENCH_BOOT_TIMEOUT", "30")))
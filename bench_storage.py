@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.append(os.getcwd())
+
+from backend.schemas.core import MarkItem
+
+# Same workload against every storage backend given on the command line:
+#   python bench_storage.py sqlite mongo
+# Mongo runs on a scratch database (BENCH_DB_NAME) that is dropped afterwards.
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "marksdb_bench")
+STUDENTS = int(os.getenv("BENCH_STUDENTS", "200"))
+QUESTIONS = int(os.getenv("BENCH_QUESTIONS", "10"))
+
+
+def make_repository(name: str):
+    if name == "sqlite":
+        from backend.storage.sql import SqlRepository
+
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        return SqlRepository(f"sqlite:///{path}"), lambda: None
+
+    from pymongo import MongoClient
+
+    from backend.database import MONGO_URL
+    from backend.storage.mongo import MongoRepository
+
+    client = MongoClient(MONGO_URL)
+    client.drop_database(BENCH_DB_NAME)
+    return MongoRepository(client[BENCH_DB_NAME]), lambda: client.drop_database(BENCH_DB_NAME)
+
+
+def timed(label: str, count: int, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:32s} {elapsed * 1000:9.1f} ms  {elapsed * 1000 / count:7.3f} ms/op")
+    return result
+
+
+def entries(offset: int) -> list[MarkItem]:
+    return [MarkItem(question_label=f"Q{q + 1}", marks=(q + offset) % 10) for q in range(QUESTIONS)]
+
+
+def run(name: str):
+    repo, cleanup = make_repository(name)
+    print(f"{name}: {STUDENTS} students x {QUESTIONS} questions")
+    try:
+        repo.ensure_schema()
+        subject = repo.create_subject({"name": "Bench", "code": "BENCH"})
+        exam = repo.create_exam(
+            {
+                "name": "Bench",
+                "subject_id": subject["id"],
+                "max_marks": 10 * QUESTIONS,
+                "date": date.today(),
+            }
+        )
+        students = timed(
+            "create students",
+            STUDENTS,
+            lambda: [
+                repo.create_student({"roll_number": f"B{i:05d}", "name": f"Student {i}"})
+                for i in range(STUDENTS)
+            ],
+        )
+        ids = [s["id"] for s in students]
+        timed(
+            "replace marks (per student)",
+            STUDENTS,
+            lambda: [repo.replace_student_marks(sid, exam["id"], entries(0)) for sid in ids],
+        )
+        rows = [(i, sid, entries(1)) for i, sid in enumerate(ids)]
+        timed("bulk upsert (whole class)", 1, lambda: repo.bulk_upsert_marks(exam["id"], rows))
+        timed("existing_student_ids", 1, lambda: repo.existing_student_ids(ids))
+        timed("exam totals", 1, lambda: repo.exam_totals(exam["id"]))
+        timed("exam summary", 1, lambda: repo.exam_summary(exam["id"]))
+        timed("search students", 1, lambda: repo.list_students("Student 1"))
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    for backend in sys.argv[1:] or ["sqlite"]:
+        run(backend)
@@ -0,0 +1,141 @@
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace as NS
+
+sys.path.append(os.getcwd())
+
+from backend.ocr import symbols
+from backend.services.grid_excel import _grid_cell_boxes
+
+# Reading marks from Vision's symbol boxes against the old word-level
+# parse, which split a number too large to be a mark evenly across its
+# word's box. Sheets are synthetic annotations of a rows x cols grid
+# where Vision sometimes joins the marks of neighbouring cells into one
+# word, as it does when they are written close to the line between them.
+#   python bench_vision_symbols.py
+SHEETS = int(os.getenv("BENCH_SHEETS", "2000"))
+ROWS, COLS = 4, 2
+GRID = (50, 80, 900, 1000)
+# Written digits: "1" is narrow, the rest wide
+DIGIT_HEIGHT, DIGIT_GAP = 70, 8
+
+
+def _width(digit: str) -> int:
+    return 18 if digit == "1" else 46
+
+
+def _vertices(x0, y0, x1, y1):
+    return [NS(x=x0, y=y0), NS(x=x1, y=y0), NS(x=x1, y=y1), NS(x=x0, y=y1)]
+
+
+def _word(placed: list) -> NS:
+    """One Vision word from (digit, x0, y0) placed digits."""
+    word_symbols = [
+        NS(text=d, confidence=0.95, bounding_box=NS(vertices=_vertices(x, y, x + _width(d), y + DIGIT_HEIGHT)))
+        for d, x, y in placed
+    ]
+    x0 = min(x for _, x, _ in placed)
+    x1 = max(x + _width(d) for d, x, _ in placed)
+    y0 = min(y for _, _, y in placed)
+    return NS(
+        symbols=word_symbols,
+        confidence=0.95,
+        bounding_box=NS(vertices=_vertices(x0, y0, x1, y0 + DIGIT_HEIGHT)),
+    )
+
+
+def _sheet(rng: random.Random, joined: float) -> tuple[NS, list]:
+    """A sheet's annotation and its marks. joined: share of rows Vision reads as one word."""
+    marks = [rng.randint(0, 20) for _ in range(ROWS * COLS)]
+    boxes = _grid_cell_boxes(GRID, ROWS, COLS)
+    words = []
+    for r in range(ROWS):
+        join = rng.random() < joined
+        placed_row = []
+        for c in range(COLS):
+            x, y, w, h = boxes[r * COLS + c]
+            text = str(marks[r * COLS + c])
+            width = sum(_width(d) + DIGIT_GAP for d in text) - DIGIT_GAP
+            # Joined words are written up to the line between the cells
+            if join and c == 0:
+                left = x + w - width - rng.randint(4, 12)
+            elif join:
+                left = x + rng.randint(4, 12)
+            else:
+                left = x + rng.uniform(0.2, 0.8) * (w - width)
+            top = y + (h - DIGIT_HEIGHT) / 2 + rng.uniform(-10, 10)
+            placed = []
+            for d in text:
+                placed.append((d, left, top))
+                left += _width(d) + DIGIT_GAP
+            if join:
+                placed_row += placed
+            else:
+                words.append(_word(placed))
+        if join:
+            words.append(_word(placed_row))
+    annotation = NS(pages=[NS(blocks=[NS(paragraphs=[NS(words=words)])])])
+    return annotation, marks
+
+
+def _word_level(annotation) -> list:
+    """The old parse: word centers, numbers over 100 split evenly over the word's box."""
+    x, y, w, h = GRID
+    cells = [None] * (ROWS * COLS)
+    for page in annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    text = "".join(ch for s in word.symbols for ch in s.text if ch.isdigit())
+                    if not text:
+                        continue
+                    xs = [v.x for v in word.bounding_box.vertices]
+                    ys = [v.y for v in word.bounding_box.vertices]
+                    cx, cy = sum(xs) / len(xs), sum(ys) / len(ys)
+                    if int(text) <= 100:
+                        found = [(int(text), cx)]
+                    else:
+                        share = (max(xs) - min(xs)) / len(text)
+                        found = [(int(d), min(xs) + (i + 0.5) * share) for i, d in enumerate(text)]
+                    for val, px in found:
+                        r = min(max(int((cy - y) / h * ROWS), 0), ROWS - 1)
+                        c = min(max(int((px - x) / w * COLS), 0), COLS - 1)
+                        # Later candidates win a cell
+                        cells[r * COLS + c] = val
+    return [v or 0 for v in cells]
+
+
+def _symbol_level(annotation) -> list:
+    digits = symbols.symbol_array(annotation)
+    ids = symbols.number_ids(digits)
+    cells = symbols.read_cells(
+        digits, ids, symbols.grid_cells(digits, GRID, ROWS, COLS), _grid_cell_boxes(GRID, ROWS, COLS)
+    )
+    return [c["val"] if c else 0 for c in cells]
+
+
+def accuracy():
+    print(f"{SHEETS} sheets of {ROWS}x{COLS} marks 0-20, cells read right")
+    for joined in (0.0, 0.25, 1.0):
+        rng = random.Random(11)
+        sheets = [_sheet(rng, joined) for _ in range(SHEETS)]
+        for label, read in (("word-level", _word_level), ("symbol-level", _symbol_level)):
+            right = sum(a == b for annotation, marks in sheets for a, b in zip(read(annotation), marks))
+            print(f"  rows joined {joined:4.0%}  {label:12s} {right / (SHEETS * ROWS * COLS):6.1%}")
+
+
+def speed():
+    rng = random.Random(5)
+    sheets = [_sheet(rng, 0.25)[0] for _ in range(SHEETS)]
+    for label, read in (("word-level", _word_level), ("symbol-level", _symbol_level)):
+        start = time.perf_counter()
+        for annotation in sheets:
+            read(annotation)
+        print(f"{label:12s} {(time.perf_counter() - start) / SHEETS * 1e6:7.1f} us per sheet")
+
+
+if __name__ == "__main__":
+    accuracy()
+    speed()
@@ -0,0 +1,68 @@
+import io
+import os
+import statistics
+import sys
+import time
+
+from openpyxl import Workbook, load_workbook
+
+sys.path.append(os.getcwd())
+
+from backend.services import xlsx_append
+
+RUNS = int(os.getenv("BENCH_RUNS", "10"))
+SIZES = (100, 1_000, 10_000)
+QUESTIONS = 8
+
+
+def _workbook(rows: int) -> bytes:
+    """A marks workbook as the scanner builds it: a header and `rows` scanned sheets."""
+    wb = Workbook()
+    ws = wb.active
+    ws.append([f"Q{i + 1}" for i in range(QUESTIONS)] + ["Total"])
+    for r in range(rows):
+        marks = [(r + q) % 10 for q in range(QUESTIONS)]
+        ws.append(marks + [sum(marks)])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _openpyxl_append(content: bytes, marks: list) -> bytes:
+    # Previous path: load the whole workbook, append, save it again
+    wb = load_workbook(io.BytesIO(content))
+    wb.active.append(marks + [sum(marks)])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _fast_append(content: bytes, marks: list) -> bytes:
+    return xlsx_append.append_rows(content, [marks])[2]
+
+
+def _time(fn, content: bytes, marks: list) -> float:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn(content, marks)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    marks = [7, 5, 9, 3, 8, 6, 4, 10]
+    print(f"one row appended to a workbook of n rows, median of {RUNS} runs")
+    print(f"{'rows':>7} {'KB':>8} {'openpyxl ms':>12} {'fast ms':>9} {'speedup':>8} {'same':>5}")
+    for size in SIZES:
+        content = _workbook(size)
+        same = (
+            list(load_workbook(io.BytesIO(_fast_append(content, marks))).active.values)
+            == list(load_workbook(io.BytesIO(_openpyxl_append(content, marks))).active.values)
+        )
+        slow = _time(_openpyxl_append, content, marks)
+        fast = _time(_fast_append, content, marks)
+        print(
+            f"{size:>7} {len(content) / 1024:8.1f} {slow:12.2f} {fast:9.2f} "
+            f"{slow / fast:7.1f}x {'yes' if same else 'NO':>5}"
+        )
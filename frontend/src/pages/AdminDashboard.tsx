@@ -8,26 +8,53 @@ interface Student {
   name: string;
 }
 
+interface RosterImport {
+  rows: number;
+  inserted: number;
+  errors: { row: number; roll_number: string | null; detail: string }[];
+  rows_per_second: number;
+}
+
 const AdminDashboard: React.FC = () => {
   const [students, setStudents] = useState<Student[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
+  const [importing, setImporting] = useState(false);
+  const [report, setReport] = useState<RosterImport | null>(null);
+
+  const load = async () => {
+    try {
+      setLoading(true);
+      const res = await apiClient.get<Student[]>("/api/admin/students");
+      setStudents(res.data);
+    } catch (e) {
+      setError("Failed to load students (make sure you are logged in as admin).");
+    } finally {
+      setLoading(false);
+    }
+  };
+
   useEffect(() => {
-    const load = async () => {
-      try {
-        setLoading(true);
-        const res = await apiClient.get<Student[]>("/api/admin/students");
-        setStudents(res.data);
-      } catch (e) {
-        setError("Failed to load students (make sure you are logged in as admin).");
-      } finally {
-        setLoading(false);
-      }
-    };
     load();
   }, []);
 
+  const importRoster = async (file: File) => {
+    const form = new FormData();
+    form.append("file", file);
+    try {
+      setImporting(true);
+      setError(null);
+      const res = await apiClient.post<RosterImport>("/api/admin/students/import", form);
+      setReport(res.data);
+      await load();
+    } catch (e: any) {
+      setError(e?.response?.data?.detail || "Roster import failed.");
+    } finally {
+      setImporting(false);
+    }
+  };
+
   return (
     <div className="space-y-4">
       <h1 className="text-2xl font-semibold text-slate-800">Admin Dashboard</h1>
@@ -45,6 +72,41 @@ const AdminDashboard: React.FC = () => {
         </Link>
       </div>
 
+      <div className="space-y-2">
+        <label className="block text-sm font-medium text-slate-700">
+          Import roster (CSV or XLSX with roll_number, name, department, year, section)
+        </label>
+        <input
+          type="file"
+          accept=".csv,.xlsx"
+          disabled={importing}
+          onChange={(e) => {
+            const file = e.target.files?.[0];
+            if (file) importRoster(file);
+            e.target.value = "";
+          }}
+          className="text-sm"
+        />
+        {importing && <p className="text-sm text-slate-600">Importing...</p>}
+        {report && (
+          <div className="text-sm text-slate-700">
+            <p>
+              {report.inserted} of {report.rows} rows added ({Math.round(report.rows_per_second)} rows/s).
+            </p>
+            {report.errors.length > 0 && (
+              <ul className="list-disc pl-5 text-red-600">
+                {report.errors.map((err) => (
+                  <li key={err.row}>
+                    Row {err.row}
+                    {err.roll_number ? ` (${err.roll_number})` : ""}: {err.detail}
+                  </li>
+                ))}
+              </ul>
+            )}
+          </div>
+        )}
+      </div>
+
       {loading && <p>Loading...</p>}
       {error && <p className="text-red-600 text-sm">{error}</p>}
       
@@ -2,13 +2,82 @@ import { useEffect, useRef, useState } from "react";
 import { useLocation, useNavigate, Link } from "react-router-dom";
 import ReactCrop, { Crop, PixelCrop } from "react-image-crop";
 import "react-image-crop/dist/ReactCrop.css";
-import { apiClient } from "../services/api";
+import { apiClient, API_BASE_URL } from "../services/api";
 
 interface LocationState {
   examId: string;
   studentId: string;
 }
 
+interface LiveStatus {
+  sheet: number;
+  state: "searching" | "steady" | "scanning" | "done";
+  reason: string | null;
+}
+
+interface CaptureFormat {
+  formats: string[];
+  quality: number;
+}
+
+// Used until the server's preferences arrive
+const DEFAULT_CAPTURE: CaptureFormat = { formats: ["image/jpeg"], quality: 0.85 };
+
+// First format the browser can actually encode: toDataURL falls back to
+// PNG for the ones it does not support
+const encodeCanvas = (canvas: HTMLCanvasElement, capture: CaptureFormat) => {
+    for (const format of capture.formats) {
+        const dataUrl = canvas.toDataURL(format, capture.quality);
+        if (dataUrl.startsWith(`data:${format}`)) return dataUrl;
+    }
+    return canvas.toDataURL("image/png");
+};
+
+interface SheetTemplate {
+  id: string;
+  name: string;
+}
+
+interface LiveResult {
+  sheet: number;
+  marks: number[];
+  confidence?: number[];
+  total: number;
+}
+
+// Marks read with less confidence than this are flagged for checking
+const LOW_CONFIDENCE = 0.8;
+
+const formatMarks = (marks: number[], confidence: number[] = []) =>
+    marks.map((m, i) => (confidence[i] !== undefined && confidence[i] < LOW_CONFIDENCE ? `${m}?` : `${m}`)).join(", ");
+
+interface MarkFlag {
+  reason: string;
+  questions: string[];
+  detail: string;
+  alternatives: { marks: number[]; score: number }[];
+}
+
+// Cells the server flagged, with the likeliest other reading
+const formatFlags = (flags: MarkFlag[] = []) =>
+    flags.length
+        ? " Check: " + flags.map((f) =>
+            f.alternatives.length ? `${f.detail} (maybe ${f.alternatives[0].marks.join(", ")})` : f.detail
+        ).join("; ") + "."
+        : "";
+
+const LIVE_FRAME_INTERVAL_MS = 250;
+
+const LIVE_HINTS: Record<string, string> = {
+  no_grid: "Show the marks grid to the camera",
+  blurry: "Too blurry, hold the sheet closer or steadier",
+  moving: "Hold the sheet still",
+  already_scanned: "Scanned. Show the next sheet",
+  undecodable: "Camera frame could not be read",
+  too_dark: "Too dark, add some light",
+  overexposed: "Too bright, avoid glare",
+};
+
 const WebcamScannerPage: React.FC = () => {
     const videoRef = useRef<HTMLVideoElement | null>(null);
     const canvasRef = useRef<HTMLCanvasElement | null>(null);
@@ -19,21 +88,43 @@ const WebcamScannerPage: React.FC = () => {
     // Excel State
     const [excelFile, setExcelFile] = useState<File | null>(null);
     const [downloadUrl, setDownloadUrl] = useState<string | null>(null);
+    // Scans only return the new row; the workbook stays on the server and
+    // is downloaded on demand (304 when nothing changed since last time)
+    const [workbookId, setWorkbookId] = useState<string | null>(null);
+    const [downloaded, setDownloaded] = useState<{ etag: string; url: string } | null>(null);
     const [excelInfo, setExcelInfo] = useState<string | null>(null);
     const [rows, setRows] = useState(4);
     const [cols, setCols] = useState(2);
+    const [multiSheet, setMultiSheet] = useState(false);
+    // Registered printed form; when set, its layout replaces rows/cols
+    const [templates, setTemplates] = useState<SheetTemplate[]>([]);
+    const [templateId, setTemplateId] = useState("");
+    const [capture, setCapture] = useState<CaptureFormat>(DEFAULT_CAPTURE);
     
     // Mode State
-    const [mode, setMode] = useState<"auto" | "manual">("auto");
+    const [mode, setMode] = useState<"auto" | "manual" | "live">("auto");
     const [capturedImage, setCapturedImage] = useState<string | null>(null);
     const [crop, setCrop] = useState<Crop>();
     const [completedCrop, setCompletedCrop] = useState<PixelCrop>();
     const imgRef = useRef<HTMLImageElement>(null);
 
+    // Live State
+    const [liveStatus, setLiveStatus] = useState<LiveStatus | null>(null);
+    const [liveResults, setLiveResults] = useState<LiveResult[]>([]);
+
     const navigate = useNavigate();
     const location = useLocation();
     const state = (location.state || {}) as Partial<LocationState>;
 
+    useEffect(() => {
+        apiClient.get<SheetTemplate[]>("/api/teacher/templates")
+            .then((res) => setTemplates(res.data))
+            .catch(() => setTemplates([]));
+        apiClient.get<CaptureFormat>("/api/teacher/capture-format")
+            .then((res) => setCapture(res.data))
+            .catch(() => setCapture(DEFAULT_CAPTURE));
+    }, []);
+
     // ... (useEffect for stream remains same) ...
     useEffect(() => {
         const start = async () => {
@@ -59,6 +150,61 @@ const WebcamScannerPage: React.FC = () => {
         // eslint-disable-next-line react-hooks/exhaustive-deps
     }, []);
 
+    // LIVE MODE: stream JPEG frames over a WebSocket, one in flight at a time.
+    // The backend only runs OCR once per sheet and pushes the result back.
+    useEffect(() => {
+        if (mode !== "live") return;
+
+        const token = localStorage.getItem("token") || "";
+        const url = `${API_BASE_URL.replace(/^http/, "ws")}/api/teacher/live-scan`
+            + `?token=${encodeURIComponent(token)}&rows=${rows}&cols=${cols}`;
+        const socket = new WebSocket(url);
+        socket.binaryType = "arraybuffer";
+        let waiting = false;
+
+        socket.onmessage = (event) => {
+            const msg = JSON.parse(event.data);
+            if (msg.type === "status") {
+                waiting = false;
+                setLiveStatus(msg);
+            } else if (msg.type === "result") {
+                setLiveResults((prev) => [{ sheet: msg.sheet, marks: msg.marks, confidence: msg.confidence, total: msg.total }, ...prev]);
+                setExcelInfo(`Sheet ${msg.sheet}. Marks: [${formatMarks(msg.marks, msg.confidence)}], Total: ${msg.total}`);
+            } else if (msg.type === "error") {
+                setError(msg.detail);
+            }
+        };
+        socket.onclose = (event) => {
+            if (event.code === 1008) setError("Live scan needs a teacher login.");
+        };
+
+        const timer = window.setInterval(() => {
+            const video = videoRef.current;
+            const canvas = canvasRef.current;
+            if (waiting || socket.readyState !== WebSocket.OPEN || !video || !canvas) return;
+            const ctx = canvas.getContext("2d");
+            if (!ctx || !video.videoWidth) return;
+
+            canvas.width = video.videoWidth;
+            canvas.height = video.videoHeight;
+            ctx.drawImage(video, 0, 0);
+            waiting = true;
+            canvas.toBlob(async (blob) => {
+                if (!blob || socket.readyState !== WebSocket.OPEN) {
+                    waiting = false;
+                    return;
+                }
+                socket.send(await blob.arrayBuffer());
+            }, "image/jpeg", 0.85);
+        }, LIVE_FRAME_INTERVAL_MS);
+
+        return () => {
+            window.clearInterval(timer);
+            socket.close();
+            setLiveStatus(null);
+        };
+    }, [mode, rows, cols]);
+
     const captureFrame = () => {
         if (!videoRef.current || !canvasRef.current) return;
         const video = videoRef.current;
@@ -70,9 +216,9 @@ const WebcamScannerPage: React.FC = () => {
         canvas.height = video.videoHeight;
         ctx.drawImage(video, 0, 0);
 
-        const fullImage = canvas.toDataURL("image/png");
-        
         if (mode === "manual") {
+            // Kept lossless in the browser, only the crop is uploaded
+            const fullImage = canvas.toDataURL("image/png");
             setCapturedImage(fullImage);
             return fullImage;
         }
@@ -82,7 +228,7 @@ const WebcamScannerPage: React.FC = () => {
         // PROBLEM: If the user wasn't perfectly aligned, we cut off numbers.
         // FIX: Send the FULL video frame. The backend's "Smart Sort" is robust enough 
         // to find the grid structure in the full image, provided the background isn't full of numbers.
-        return fullImage;
+        return encodeCanvas(canvas, capture);
     };
 
     const fileToBase64 = (file: File): Promise<string> => {
@@ -99,40 +245,89 @@ const WebcamScannerPage: React.FC = () => {
         if (e.target.files && e.target.files[0]) {
         setExcelFile(e.target.files[0]);
         setDownloadUrl(null); // Reset download link on new upload
+        setWorkbookId(null); // The next scan starts a server workbook from this file
+        setDownloaded(null);
         setExcelInfo("Loaded custom Excel file.");
         }
     };
 
     // AUTO MODE SCAN
-    const handleScanToExcel = async () => {
+    const handleScanToExcel = async (force = false, frame?: string, rescan = false) => {
         if (!videoRef.current || !canvasRef.current) return;
         setError(null);
         setExcelInfo(null);
         setLoading(true);
-        const dataUrl = captureFrame();
+        const dataUrl = frame || captureFrame();
 
         try {
         let excelBase64: string | null = null;
-        if (excelFile) {
+        if (excelFile && !workbookId) {
             excelBase64 = await fileToBase64(excelFile);
         }
 
-        const res = await apiClient.post("/api/teacher/scan-grid-excel", {
+        const useMulti = multiSheet && !templateId;
+        const endpoint = useMulti ? "/api/teacher/scan-multi-grid-excel" : "/api/teacher/scan-grid-excel";
+        const res = await apiClient.post(`${endpoint}?response=delta`, {
             image_base64: dataUrl,
             excel_file: excelBase64,
+            workbook_id: workbookId,
             rows: rows,
-            cols: cols
+            cols: cols,
+            force: force,
+            rescan: rescan,
+            template_id: useMulti ? undefined : templateId || undefined
         });
-        
+
+        // Scanned before: nothing was appended, unless the teacher wants it read again
+        if (res.data.duplicate && window.confirm("This sheet was scanned before and was not added again.\n\nRead it again and add it anyway?")) {
+            return await handleScanToExcel(force, dataUrl, true);
+        }
         handleExcelResponse(res.data);
         } catch (e: any) {
              const msg = e.response?.data?.detail || "Failed to scan grid. Check backend logs.";
+             if (e.response?.status === 404 && workbookId) setWorkbookId(null); // expired on the server
+             // 422: the photo failed the quality check, OCR was not run
+             if (e.response?.status === 422 && !force && window.confirm(`${msg}\n\nScan this photo anyway?`)) {
+                 return await handleScanToExcel(true, dataUrl);
+             }
              setError(msg);
         } finally {
              setLoading(false);
         }
     };
 
+    // Read the sheet and save the marks for the exam in one request,
+    // no workbook involved
+    const handleScanToExam = async (force = false, frame?: string) => {
+        if (!state.examId || !videoRef.current || !canvasRef.current) return;
+        setError(null);
+        setExcelInfo(null);
+        setLoading(true);
+        const dataUrl = frame || captureFrame();
+        try {
+            const res = await apiClient.post("/api/teacher/scan-marks", {
+                image_base64: dataUrl,
+                exam_id: state.examId,
+                student_id: state.studentId || undefined,
+                rows: rows,
+                cols: cols,
+                force: force,
+                template_id: templateId || undefined
+            });
+            const d = res.data;
+            const again = d.duplicate ? " (sheet scanned before, earlier reading used)" : "";
+            setExcelInfo(`Saved ${d.saved} marks for ${d.roll_number || "the student"}${again}. Total: ${d.total}.${formatFlags(d.flags)}`);
+        } catch (e: any) {
+            const msg = e.response?.data?.detail || "Failed to save marks.";
+            if (e.response?.status === 422 && !force && window.confirm(`${msg}\n\nScan this photo anyway?`)) {
+                return await handleScanToExam(true, dataUrl);
+            }
+            setError(msg);
+        } finally {
+            setLoading(false);
+        }
+    };
+
     // MANUAL CROP HELPER
     const getCroppedImg = async (imageSrc: string, crop: PixelCrop): Promise<string> => {
         const image = new Image();
@@ -161,7 +356,7 @@ const WebcamScannerPage: React.FC = () => {
             crop.height
         );
         
-        return canvas.toDataURL('image/png');
+        return encodeCanvas(canvas, capture);
     }
 
     // MANUAL SCAN ACTION
@@ -203,17 +398,18 @@ const WebcamScannerPage: React.FC = () => {
                 completedCrop.height * scaleY,
             );
             
-            const cropBase64 = canvas.toDataURL('image/png');
+            const cropBase64 = encodeCanvas(canvas, capture);
             
             // 2. Send to backend
             let excelBase64: string | null = null;
-            if (excelFile) {
+            if (excelFile && !workbookId) {
                 excelBase64 = await fileToBase64(excelFile);
             }
 
-            const res = await apiClient.post("/api/teacher/scan-crop-excel", {
+            const res = await apiClient.post("/api/teacher/scan-crop-excel?response=delta", {
                 image_base64: cropBase64,
-                excel_file: excelBase64
+                excel_file: excelBase64,
+                workbook_id: workbookId
             });
             
             handleExcelResponse(res.data);
@@ -221,6 +417,7 @@ const WebcamScannerPage: React.FC = () => {
             
         } catch (e: any) {
             console.error(e);
+            if (e.response?.status === 404 && workbookId) setWorkbookId(null);
             setError("Failed to scan crop. " + (e.response?.data?.detail || e.message));
         } finally {
             setLoading(false);
@@ -228,7 +425,13 @@ const WebcamScannerPage: React.FC = () => {
     }
 
     const handleExcelResponse = (data: any) => {
-        const { marks, total, excel_file } = data;
+        if (data.workbook_id || data.duplicate) {
+            if (data.workbook_id) setWorkbookId(data.workbook_id);
+            showScanInfo(data);
+            return;
+        }
+
+        const { excel_file } = data;
 
         // Convert returned base64 back to file
         const byteCharacters = atob(excel_file);
@@ -242,17 +445,56 @@ const WebcamScannerPage: React.FC = () => {
 
         setExcelFile(newFile);
         setDownloadUrl(URL.createObjectURL(blob));
+        showScanInfo(data);
+    }
 
-        setExcelInfo(`Added row. Marks: [${marks.join(", ")}], Total: ${total}`);
+    const showScanInfo = (data: any) => {
+        if (data.sheets) {
+            setExcelInfo(`Added ${data.sheets.length} rows. Totals: ${data.sheets.map((s: any) => s.total).join(", ")}.${data.sheets.map((s: any) => formatFlags(s.flags)).join("")}`);
+        } else {
+            // Marks followed by "?" were read with low confidence, worth a look
+            const student = data.student
+                ? ` Student: ${data.student.name} (${data.student.roll_number}).`
+                : data.roll_number ? ` Roll number ${data.roll_number} not found.` : "";
+            const added = data.duplicate ? "Already scanned, not added again" : "Added row";
+            setExcelInfo(`${added}. Marks: [${formatMarks(data.marks, data.confidence)}], Total: ${data.total}.${student}${formatFlags(data.flags)}`);
+        }
     }
 
+    const downloadWorkbook = async () => {
+        if (!workbookId) return;
+        try {
+            const res = await apiClient.get(`/api/teacher/workbooks/${workbookId}`, {
+                responseType: "blob",
+                headers: downloaded ? { "If-None-Match": downloaded.etag } : {},
+                validateStatus: (status) => status === 200 || status === 304,
+            });
+            let url = downloaded?.url;
+            if (res.status === 200) {
+                if (url) URL.revokeObjectURL(url);
+                url = URL.createObjectURL(res.data);
+                setDownloaded({ etag: res.headers["etag"], url });
+            }
+            if (!url) return;
+            const link = document.createElement("a");
+            link.href = url;
+            link.download = excelFile?.name || "marks.xlsx";
+            link.click();
+        } catch (e: any) {
+            if (e.response?.status === 404) setWorkbookId(null);
+            setError("Failed to download the Excel file.");
+        }
+    };
+
     return (
         <div className="space-y-6">
             <div className="flex items-center justify-between">
                 <div>
                   <h1 className="text-2xl font-bold text-slate-800">Scan Marks</h1>
                   <p className="text-slate-500 text-sm">
-                      {mode === "auto" ? "Point camera at the grid." : "Take a photo and select a box."}
+                      {mode === "auto" && "Point camera at the grid."}
+                      {mode === "manual" && "Take a photo and select a box."}
+                      {mode === "live" && "Hold each sheet up to the camera; it is scanned once it is still."}
                   </p>
                 </div>
                 
@@ -271,6 +513,12 @@ const WebcamScannerPage: React.FC = () => {
                         >
                             Manual Crop
                         </button>
+                        <button 
+                            onClick={() => { setMode("live"); setCapturedImage(null); }}
+                            className={`px-3 py-1.5 rounded-md transition ${mode === "live" ? "bg-white text-blue-600 shadow-sm" : "text-slate-500 hover:text-slate-700"}`}
+                        >
+                            Live
+                        </button>
                     </div>
                     
                     <Link to="/teacher" className="text-sm font-medium text-slate-600 hover:text-slate-900">
@@ -306,7 +554,12 @@ const WebcamScannerPage: React.FC = () => {
                                         {excelFile ? excelFile.name : "New File"}
                                     </span>
                                 </div>
-                                {downloadUrl && (
+                                {workbookId && (
+                                    <button onClick={downloadWorkbook} className="block w-full text-center px-4 py-2 bg-green-600 text-white text-sm font-medium rounded-md hover:bg-green-700 transition">
+                                        Download Updated File
+                                    </button>
+                                )}
+                                {!workbookId && downloadUrl && (
                                     <a href={downloadUrl} download={excelFile?.name || "marks.xlsx"} className="block w-full text-center px-4 py-2 bg-green-600 text-white text-sm font-medium rounded-md hover:bg-green-700 transition">
                                         Download Updated File
                                     </a>
@@ -315,8 +568,8 @@ const WebcamScannerPage: React.FC = () => {
                          </div>
                     </div>
 
-                    {/* Auto Grid Config (Only in Auto Mode) */}
-                    {mode === "auto" && (
+                    {/* Grid Config (Auto and Live Modes) */}
+                    {mode !== "manual" && (
                         <div className="bg-white p-6 rounded-lg shadow-sm border border-slate-200">
                             <h2 className="text-lg font-semibold text-slate-800 mb-4">Grid Layout</h2>
                             <div className="grid grid-cols-2 gap-4">
@@ -329,6 +582,23 @@ const WebcamScannerPage: React.FC = () => {
                                     <input type="number" min="1" max="6" value={cols} onChange={(e) => setCols(parseInt(e.target.value) || 2)} className="w-full px-3 py-2 border rounded-md" />
                                 </div>
                             </div>
+                            {mode === "auto" && templates.length > 0 && (
+                                <div className="mt-4">
+                                    <label className="block text-sm font-medium text-slate-700 mb-1">Printed form</label>
+                                    <select value={templateId} onChange={(e) => setTemplateId(e.target.value)} className="w-full px-3 py-2 border rounded-md">
+                                        <option value="">None (use rows and cols)</option>
+                                        {templates.map((t) => (
+                                            <option key={t.id} value={t.id}>{t.name}</option>
+                                        ))}
+                                    </select>
+                                </div>
+                            )}
+                            {mode === "auto" && !templateId && (
+                                <label className="mt-4 flex items-center gap-2 text-sm text-slate-700">
+                                    <input type="checkbox" checked={multiSheet} onChange={(e) => setMultiSheet(e.target.checked)} />
+                                    Several sheets in one photo (one row per sheet)
+                                </label>
+                            )}
                         </div>
                     )}
                     
@@ -367,8 +637,8 @@ const WebcamScannerPage: React.FC = () => {
                         ) : (
                             <>
                                 <video ref={videoRef} autoPlay playsInline className="w-full h-full object-contain" />
-                                {/* Overlay for Auto Mode */}
-                                {mode === "auto" && (
+                                {/* Overlay for Auto and Live Modes */}
+                                {mode !== "manual" && (
                                     <div className="absolute inset-0 pointer-events-none flex items-center justify-center">
                                          <div className="w-2/3 h-2/3 border-4 border-green-400 rounded-lg shadow-[0_0_15px_rgba(74,222,128,0.5)]">
                                              {/* Grid Lines Visual */}
@@ -397,17 +667,49 @@ const WebcamScannerPage: React.FC = () => {
                         )}
                     </div>
 
+                    {/* Live Feedback */}
+                    {mode === "live" && (
+                        <div className="bg-white p-4 rounded-lg shadow-sm border border-slate-200 space-y-3">
+                            <div className="flex items-center justify-between text-sm">
+                                <span className="font-medium text-slate-700">
+                                    {liveStatus ? `Sheet ${liveStatus.sheet}: ${liveStatus.state}` : "Connecting..."}
+                                </span>
+                                {liveStatus?.reason && (
+                                    <span className="text-slate-500">{LIVE_HINTS[liveStatus.reason] || liveStatus.reason}</span>
+                                )}
+                            </div>
+                            {liveResults.length > 0 && (
+                                <ul className="text-sm font-mono text-slate-700 space-y-1">
+                                    {liveResults.map((r) => (
+                                        <li key={r.sheet}>#{r.sheet}: [{formatMarks(r.marks, r.confidence)}] = {r.total}</li>
+                                    ))}
+                                </ul>
+                            )}
+                        </div>
+                    )}
+
                     {/* Action Buttons */}
                     <div className="flex gap-4">
-                        {mode === "auto" ? (
+                        {mode === "live" ? null : mode === "auto" ? (
+                            <>
                              <button
-                                onClick={handleScanToExcel}
+                                onClick={() => handleScanToExcel()}
                                 disabled={loading}
                                 className="flex-1 px-6 py-3 bg-slate-800 text-white font-semibold rounded-lg shadow hover:bg-slate-900 transition flex items-center justify-center gap-2"
                             >
                                 <span className="w-2 h-2 rounded-full bg-red-500 animate-pulse" />
                                 Auto Scan Grid
                             </button>
+                            {state.examId && !multiSheet && (
+                                <button
+                                    onClick={() => handleScanToExam()}
+                                    disabled={loading}
+                                    className="flex-1 px-6 py-3 bg-blue-600 text-white font-semibold rounded-lg shadow hover:bg-blue-700 transition"
+                                >
+                                    Scan &amp; Save to Exam
+                                </button>
+                            )}
+                            </>
                         ) : (
                             <>
                                 {!capturedImage ? (